@@ -15,16 +15,22 @@ from app.routes.blog_category import blog_category_bp
 from app.routes.milk_production import milk_production_bp
 from app.routes.notification import notification_bp
 from app.routes.milk_freshness import milk_freshness_bp
+from app.routes.export_jobs import export_jobs_bp
+from app.routes.scheduler import scheduler_bp
 from app.socket import init_socketio
-from apscheduler.schedulers.background import BackgroundScheduler
-from app.services.notification import check_milk_expiry_and_notify
+from app.services.notification import check_milk_expiry_and_notify, cleanup_old_notifications, create_expiry_admin_summary, emit_queue, rate_limiter
+from app.services.notification_queue import notification_check_queue
+from app.services.export_jobs import export_jobs
+from app.services.notification_retention import notification_retention
+from app.services.expiry_scheduler import expiry_scheduler
+from app.services.rollup_refresher import rollup_refresher
+from app.services.job_scheduler import job_scheduler
+from app.commands import register_commands
 
+from datetime import datetime
 import os
 import logging
 
-# Global scheduler variable
-scheduler = None
-
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
@@ -44,26 +50,56 @@ def create_app():
     # Initialize Socket.IO
     socketio = init_socketio(app)
 
-    # Set up background scheduler for milk expiry checks
-    global scheduler
-    if scheduler is None or not scheduler.running:
-        scheduler = BackgroundScheduler()
-        
-        # Create a wrapper function that includes app context
-        def scheduled_check_milk_expiry():
-            with app.app_context():
-                check_milk_expiry_and_notify()
-        
-        # Add job with the wrapper function
-        scheduler.add_job(
-            func=scheduled_check_milk_expiry,
-            trigger="interval",
-            hours=1,
-            id='check_milk_expiry_job'
-        )
-        
-        scheduler.start()
-        logging.info("Background scheduler started for milk expiry checks")
+    # Notification rate limiter backend (memory or database)
+    rate_limiter.init_app(app)
+
+    # Non-blocking socket emits, coalesced per user
+    emit_queue.init_app(app)
+
+    # Debounced queue for notification checks triggered by milking session writes
+    notification_check_queue.init_app(app)
+
+    # Week/month rollups refreshed after summary writes commit, coalesced per period
+    rollup_refresher.init_app(app)
+
+    # Background export jobs with on-disk artifact cache
+    export_jobs.init_app(app)
+
+    # Chunked retention/archiving of old notifications
+    notification_retention.init_app(app)
+
+    # Per-batch expiry/warning timers (replaces hourly expiry polling when enabled)
+    expiry_scheduler.init_app(app)
+
+    # Flask CLI commands (flask summary ..., flask notifications retention, flask scheduler ...)
+    register_commands(app)
+
+    # Scheduled jobs: persisted in the database and run only by the worker
+    # holding the scheduler lease, however many processes load the app
+    job_scheduler.init_app(app)
+
+    def scheduled_check_milk_expiry():
+        if app.config['EXPIRY_SCHEDULER_ENABLED']:
+            # Warnings and expiries fire per batch from the expiry scheduler;
+            # the hourly job only sends the admin summary
+            create_expiry_admin_summary(datetime.utcnow())
+        else:
+            check_milk_expiry_and_notify()
+
+    job_scheduler.register('check_milk_expiry_job', scheduled_check_milk_expiry, 'interval', hours=1)
+    job_scheduler.register('notification_retention_job', cleanup_old_notifications, 'cron',
+                           hour=app.config['NOTIFICATION_RETENTION_SCHEDULE_HOUR'])
+
+    # Per-batch expiry timers run in every worker but only fire in the lease holder,
+    # which reloads them when it takes over
+    expiry_scheduler.leader_check = job_scheduler.is_leader
+    job_scheduler.add_leadership_listener(expiry_scheduler.request_resync)
+
+    if app.config['SCHEDULER_ENABLED']:
+        job_scheduler.start()
+        if app.config['EXPIRY_SCHEDULER_ENABLED']:
+            expiry_scheduler.start()
+        logging.info("Job scheduler started for milk expiry checks and notification retention")
 
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -78,5 +114,7 @@ def create_app():
     app.register_blueprint(milk_production_bp, url_prefix='/milk-production')
     app.register_blueprint(notification_bp, url_prefix='/notification')
     app.register_blueprint(milk_freshness_bp, url_prefix='/milk-freshness')
+    app.register_blueprint(export_jobs_bp, url_prefix='/export-jobs')
+    app.register_blueprint(scheduler_bp, url_prefix='/scheduler')
 
     return app, socketio
\ No newline at end of file
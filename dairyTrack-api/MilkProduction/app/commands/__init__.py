@@ -0,0 +1,9 @@
+from .summary import summary_cli
+from .notifications import notifications_cli
+from .scheduler import scheduler_cli
+
+def register_commands(app):
+    """Register the Flask CLI command groups"""
+    app.cli.add_command(summary_cli)
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(scheduler_cli)
@@ -0,0 +1,35 @@
+from flask.cli import AppGroup
+from app.services.notification_retention import RetentionAlreadyRunning, notification_retention
+import click
+
+notifications_cli = AppGroup('notifications', help='Maintain the notifications table.')
+
+@notifications_cli.command('retention')
+@click.option('--days', type=click.IntRange(min=0), help='Remove notifications older than this (default: config).')
+@click.option('--chunk-size', type=click.IntRange(min=1), help='Rows per transaction (default: config).')
+@click.option('--sleep', 'sleep_seconds', type=click.FloatRange(min=0), help='Seconds to pause between chunks.')
+@click.option('--archive', type=click.Choice(['none', 'table', 'file']), help='Copy rows here before deleting.')
+@click.option('--max-chunks', type=click.IntRange(min=1), help='Stop after this many chunks.')
+@click.option('--dry-run', is_flag=True, help='Only count the rows that would be removed.')
+def run_retention(days, chunk_size, sleep_seconds, archive, max_chunks, dry_run):
+    """Delete (and optionally archive) old notifications in primary-key-ordered chunks."""
+    def report(status):
+        click.echo(f"chunk {status['chunks']}: {status['deleted']} rows up to id {status['last_id']} "
+                   f"({status['rows_per_second']} rows/s)")
+
+    try:
+        result = notification_retention.run(days=days, chunk_size=chunk_size, sleep_seconds=sleep_seconds,
+                                            archive=archive, max_chunks=max_chunks, dry_run=dry_run,
+                                            progress=report)
+    except RetentionAlreadyRunning as e:
+        raise click.ClickException(str(e))
+
+    action = 'Would remove' if dry_run else 'Removed'
+    click.echo(f"{action} {result['deleted']} notifications created before {result['cutoff']} "
+               f"({result['archived']} archived) in {result['elapsed_seconds']:.2f}s")
+    if result.get('skipped'):
+        click.echo(f"{result['skipped']} notifications could not be archived and were kept (see the log)")
+    if result.get('archive_path'):
+        click.echo(f"Archive file: {result['archive_path']}")
+    if result['state'] == 'failed':
+        raise click.ClickException(result.get('error', 'Retention failed'))
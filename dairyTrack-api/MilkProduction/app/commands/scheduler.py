@@ -0,0 +1,53 @@
+from flask import current_app
+from flask.cli import AppGroup
+from app.services.expiry_scheduler import expiry_scheduler
+from app.services.job_scheduler import job_scheduler
+import click
+import time
+
+scheduler_cli = AppGroup('scheduler', help='Run and inspect the scheduled jobs.')
+
+@scheduler_cli.command('run')
+def run_scheduler():
+    """Compete for the scheduler lease and run the jobs until interrupted."""
+    job_scheduler.start()
+    if current_app.config['EXPIRY_SCHEDULER_ENABLED']:
+        expiry_scheduler.start()
+    click.echo(f"Worker {job_scheduler.worker_id} waiting for the scheduler lease (Ctrl+C to stop)")
+
+    leader = None
+    try:
+        while True:
+            if job_scheduler.is_leader() != leader:
+                leader = job_scheduler.is_leader()
+                click.echo("Holding the lease, running jobs" if leader else "Standing by")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        job_scheduler.stop()
+        click.echo("Scheduler stopped, lease released")
+
+@scheduler_cli.command('status')
+def scheduler_status():
+    """Show the lease holder and each job's next and last run."""
+    status = job_scheduler.status()
+    lease = status['lease']
+    if lease and lease['holder']:
+        click.echo(f"Lease held by {lease['holder']} until {lease['expires_at']} (since {lease['acquired_at']})")
+    else:
+        click.echo("Lease not held")
+    for job in status['jobs']:
+        last = job['last_run']
+        last_text = f"{last['status']} at {last['started_at']} ({last['duration_seconds']}s)" if last else "never"
+        click.echo(f"{job['id']}: {job['trigger']}, next {job['next_run_time'] or '-'}, last {last_text}")
+
+@scheduler_cli.command('history')
+@click.option('--job', 'job_id', help='Only runs of this job.')
+@click.option('--limit', type=click.IntRange(min=1), default=20, show_default=True, help='Runs to show.')
+def scheduler_history(job_id, limit):
+    """List recent job runs, newest first."""
+    for run in job_scheduler.history(job_id, limit):
+        duration = f"{run['duration_seconds']}s" if run['duration_seconds'] is not None else '-'
+        click.echo(f"{run['started_at']}  {run['job_id']}  {run['status']}  {duration}  {run['holder']}"
+                   + (f"  {run['error']}" if run['error'] else ''))
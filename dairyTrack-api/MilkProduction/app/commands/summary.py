@@ -0,0 +1,99 @@
+from flask.cli import AppGroup
+from app.database.database import db
+from app.services.milk_summary import apply_summary_corrections, iter_summary_diffs, session_date_range
+from app.services.milk_rollup import rebuild_rollups
+import click
+import time
+
+summary_cli = AppGroup('summary', help='Verify or rebuild daily_milk_summary and the milk rollups.')
+
+def _summary_options(command):
+    command = click.option('--start-date', type=click.DateTime(formats=['%Y-%m-%d']), help='First date to check (YYYY-MM-DD).')(command)
+    command = click.option('--end-date', type=click.DateTime(formats=['%Y-%m-%d']), help='Last date to check (YYYY-MM-DD).')(command)
+    command = click.option('--cow-id', 'cow_ids', type=int, multiple=True, help='Limit to these cows (repeatable).')(command)
+    command = click.option('--window-days', type=click.IntRange(min=1), default=31, show_default=True,
+                           help='Days recomputed per grouped query.')(command)
+    return command
+
+def _resolve_range(start_date, end_date, cow_ids):
+    """
+    Explicit dates, with a missing side taken from the data (or from the other
+    side when there is no data); (None, None) when nothing was given or found.
+    """
+    first, last = session_date_range(cow_ids)
+    start = start_date.date() if start_date else first
+    end = end_date.date() if end_date else last
+    start = start or end
+    end = end or start
+    if start is not None and start > end:
+        raise click.UsageError(f"--start-date {start} is after the end date {end}")
+    return start, end
+
+@summary_cli.command('verify')
+@_summary_options
+@click.option('--show/--no-show', default=True, help='Print every differing summary.')
+def verify_summaries(start_date, end_date, cow_ids, window_days, show):
+    """Report summaries that drifted from their milking sessions."""
+    start, end = _resolve_range(start_date, end_date, cow_ids)
+    if start is None:
+        click.echo('No milking sessions or summaries found.')
+        return
+
+    counts = {'missing': 0, 'mismatch': 0, 'orphan': 0}
+    for window_start, window_end, diffs in iter_summary_diffs(start, end, list(cow_ids), window_days):
+        for item in diffs:
+            counts[item['kind']] += 1
+            if show:
+                click.echo(f"{item['kind']:<8} cow={item['cow_id']} date={item['date']} "
+                           f"expected={item['expected']} actual={item['actual']}")
+        db.session.rollback()
+
+    click.echo(f"Checked {start} to {end}: {counts['missing']} missing, "
+               f"{counts['mismatch']} mismatched, {counts['orphan']} orphaned")
+    if any(counts.values()):
+        raise SystemExit(1)
+
+@summary_cli.command('rebuild')
+@_summary_options
+@click.option('--dry-run', is_flag=True, help='Only report what would be corrected.')
+def rebuild_summaries(start_date, end_date, cow_ids, window_days, dry_run):
+    """Recompute summaries from milking sessions and bulk-apply the corrections."""
+    start, end = _resolve_range(start_date, end_date, cow_ids)
+    if start is None:
+        click.echo('No milking sessions or summaries found.')
+        return
+
+    started = time.perf_counter()
+    written = deleted = 0
+    for window_start, window_end, diffs in iter_summary_diffs(start, end, list(cow_ids), window_days):
+        if dry_run:
+            db.session.rollback()
+            upserts = sum(1 for item in diffs if item['kind'] != 'orphan')
+            removed = len(diffs) - upserts
+        else:
+            upserts, removed = apply_summary_corrections(diffs)
+            db.session.commit()
+        written += upserts
+        deleted += removed
+        if diffs:
+            click.echo(f"{window_start} to {window_end}: {upserts} upserted, {removed} deleted")
+
+    action = 'Would correct' if dry_run else 'Corrected'
+    click.echo(f"{action} {start} to {end}: {written} upserted, {deleted} deleted "
+               f"in {time.perf_counter() - started:.2f}s")
+
+@summary_cli.command('rollups')
+@click.option('--start-date', type=click.DateTime(formats=['%Y-%m-%d']), help='First date to rebuild (YYYY-MM-DD).')
+@click.option('--end-date', type=click.DateTime(formats=['%Y-%m-%d']), help='Last date to rebuild (YYYY-MM-DD).')
+def rebuild_milk_rollups(start_date, end_date):
+    """Recompute the weekly and monthly rollups from daily_milk_summary."""
+    start, end = _resolve_range(start_date, end_date, ())
+    if start is None:
+        click.echo('No milking sessions or summaries found.')
+        return
+
+    started = time.perf_counter()
+    periods = rebuild_rollups(start, end)
+    db.session.commit()
+    click.echo(f"Rebuilt {periods} rollup periods from {start} to {end} "
+               f"in {time.perf_counter() - started:.2f}s")
@@ -10,3 +10,11 @@ from .milking_sessions import MilkingSession
 from .milk_batches import MilkBatch
 from .daily_milk_summary import DailyMilkSummary
 from .notification import Notification
+from .milk_rollup import MilkRollup
+from .batch_number_sequence import BatchNumberSequence
+from .notification_rate_limit import NotificationRateLimit
+from .socket_presence import SocketPresence
+from .notification_archive import NotificationArchive
+from .scheduler_lease import SchedulerLease
+from .scheduler_job_run import SchedulerJobRun
+from .data_version import DataVersion
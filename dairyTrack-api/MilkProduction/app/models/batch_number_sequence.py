@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, Date
+from app.database.database import db
+
+class BatchNumberSequence(db.Model):
+    """Last reserved batch sequence number per production day"""
+    __tablename__ = 'batch_number_sequences'
+
+    seq_date = Column(Date, primary_key=True)
+    last_value = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<BatchNumberSequence(seq_date={self.seq_date}, last_value={self.last_value})>"
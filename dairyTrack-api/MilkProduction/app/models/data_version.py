@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from app.database.database import db
+
+class DataVersion(db.Model):
+    """Write counter per table, bumped in the transaction that changes the table"""
+    __tablename__ = 'data_versions'
+
+    table_name = Column(String(64), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<DataVersion(table_name='{self.table_name}', version={self.version})>"
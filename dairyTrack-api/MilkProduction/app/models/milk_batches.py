@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Float, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -11,6 +11,10 @@ class MilkStatus(enum.Enum):
 
 class MilkBatch(db.Model):
     __tablename__ = 'milk_batches'
+    __table_args__ = (
+        # Freshness buckets and expiring-batch lookups filter on status, range on expiry_date
+        Index('ix_milk_batches_status_expiry', 'status', 'expiry_date'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     batch_number = Column(String(50), unique=True, nullable=False)
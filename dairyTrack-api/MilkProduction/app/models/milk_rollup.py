@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, UniqueConstraint
+from datetime import datetime
+from app.database.database import db
+
+class MilkRollup(db.Model):
+    """
+    Weekly/monthly milk totals per cow, plus one herd-wide row per period
+    (cow_id = 0). Maintained from daily_milk_summary by app.services.milk_rollup.
+    """
+    __tablename__ = 'milk_rollups'
+    __table_args__ = (
+        UniqueConstraint('period_type', 'period_start', 'cow_id', name='uq_milk_rollups_period_cow'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    period_type = Column(String(10), nullable=False)  # 'week' (starting Monday) or 'month'
+    period_start = Column(Date, nullable=False)
+    cow_id = Column(Integer, nullable=False, default=0)  # 0 = whole herd
+    morning_volume = Column(Float, default=0, nullable=False)
+    afternoon_volume = Column(Float, default=0, nullable=False)
+    evening_volume = Column(Float, default=0, nullable=False)
+    total_volume = Column(Float, default=0, nullable=False)
+    session_count = Column(Integer, default=0, nullable=False)
+    day_count = Column(Integer, default=0, nullable=False)
+    cow_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (f"<MilkRollup(period_type='{self.period_type}', period_start={self.period_start}, "
+                f"cow_id={self.cow_id}, total_volume={self.total_volume}, "
+                f"session_count={self.session_count}, day_count={self.day_count})>")
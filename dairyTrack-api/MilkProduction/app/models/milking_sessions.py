@@ -1,10 +1,18 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.database import db
 
 class MilkingSession(db.Model):
     __tablename__ = 'milking_sessions'
+    __table_args__ = (
+        # Keyset pagination on (milking_time, id), optionally narrowed to one cow or milker
+        Index('ix_milking_sessions_time_id', 'milking_time', 'id'),
+        Index('ix_milking_sessions_cow_time', 'cow_id', 'milking_time'),
+        Index('ix_milking_sessions_milker_time', 'milker_id', 'milking_time'),
+        # Client supplied key that makes session creation safe to retry
+        UniqueConstraint('idempotency_key', name='uq_milking_sessions_idempotency_key'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     cow_id = Column(Integer, ForeignKey('cows.id'), nullable=False)
@@ -13,6 +21,8 @@ class MilkingSession(db.Model):
     volume = Column(Float, nullable=False)
     milking_time = Column(DateTime, default=datetime.utcnow, nullable=False)
     notes = Column(String(255), nullable=True)
+    idempotency_key = Column(String(64), nullable=True)
+    idempotency_request_hash = Column(String(64), nullable=True)  # SHA-256 of the creating request body
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from app.database.database import db
 from datetime import datetime
@@ -9,12 +9,19 @@ def wib_now():
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Inbox: unread count and keyset pages on (created_at, id), with or without is_read
+        Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+        Index('ix_notifications_user_created', 'user_id', 'created_at'),
+        # Day-range statistics across all users
+        Index('ix_notifications_created', 'created_at'),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    cow_id = Column(Integer, ForeignKey('cows.id'), nullable=False)
+    cow_id = Column(Integer, ForeignKey('cows.id'), nullable=True)  # None for herd-wide admin notifications
     message = Column(Text, nullable=False)
-    type = Column(String(20), nullable=False)  # 'low_production', 'high_production'
+    type = Column(String(50), nullable=False)  # 'low_production', 'high_production', 'admin_...'
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     created_at_wib = Column(DateTime(timezone=True), default=wib_now)  #  timezone-aware
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, LargeBinary, Index
+from datetime import datetime
+from app.database.database import db
+
+class NotificationArchive(db.Model):
+    """Notifications removed by the retention job; the message is zlib-compressed"""
+    __tablename__ = 'notification_archive'
+    __table_args__ = (
+        Index('ix_notification_archive_user_created', 'user_id', 'created_at'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # id in notifications
+    user_id = Column(Integer, nullable=False)
+    cow_id = Column(Integer, nullable=True)  # None for herd-wide admin notifications
+    type = Column(String(50), nullable=False)
+    is_read = Column(Boolean, default=False)
+    created_at = Column(DateTime, nullable=True)
+    message_z = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (f"<NotificationArchive(id={self.id}, user_id={self.user_id}, "
+                f"type='{self.type}', created_at={self.created_at})>")
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String
+from app.database.database import db
+
+class NotificationRateLimit(db.Model):
+    """Notification count per rate-limit key and fixed window, shared by all workers"""
+    __tablename__ = 'notification_rate_limits'
+
+    key = Column(String(64), primary_key=True)
+    window_index = Column(Integer, primary_key=True, index=True)  # epoch seconds // window length
+    count = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<NotificationRateLimit(key='{self.key}', window_index={self.window_index}, count={self.count})>"
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Index
+from datetime import datetime
+from app.database.database import db
+
+class SchedulerJobRun(db.Model):
+    """One execution of a scheduled job, with the worker that ran it and its duration"""
+    __tablename__ = 'scheduler_job_runs'
+    __table_args__ = (
+        Index('ix_scheduler_job_runs_job_started', 'job_id', 'started_at'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String(100), nullable=False)
+    holder = Column(String(100), nullable=False)
+    status = Column(String(20), nullable=False)  # running, success, failed
+    started_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+    duration_seconds = Column(Float, nullable=True)
+    error = Column(Text, nullable=True)
+
+    def __repr__(self):
+        return (f"<SchedulerJobRun(id={self.id}, job_id='{self.job_id}', holder='{self.holder}', "
+                f"status='{self.status}', duration_seconds={self.duration_seconds})>")
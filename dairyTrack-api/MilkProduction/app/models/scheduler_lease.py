@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, DateTime
+from app.database.database import db
+
+class SchedulerLease(db.Model):
+    """Named leader lease; the holder runs the scheduled jobs until expires_at"""
+    __tablename__ = 'scheduler_leases'
+
+    name = Column(String(50), primary_key=True)
+    holder = Column(String(100), nullable=True)  # worker id (host:pid), None when released
+    acquired_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<SchedulerLease(name='{self.name}', holder='{self.holder}', expires_at={self.expires_at})>"
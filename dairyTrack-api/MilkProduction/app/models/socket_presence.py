@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from datetime import datetime
+from app.database.database import db
+
+class SocketPresence(db.Model):
+    """One row per registered Socket.IO connection, shared by all workers"""
+    __tablename__ = 'socket_presence'
+    __table_args__ = (
+        Index('ix_socket_presence_user_seen', 'user_id', 'last_seen'),
+        Index('ix_socket_presence_worker', 'worker_id'),
+    )
+
+    sid = Column(String(64), primary_key=True)
+    user_id = Column(String(32), nullable=False)
+    role_id = Column(String(32), nullable=True)
+    worker_id = Column(String(100), nullable=False)
+    connected_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_seen = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (f"<SocketPresence(sid='{self.sid}', user_id='{self.user_id}', "
+                f"role_id='{self.role_id}', worker_id='{self.worker_id}', last_seen={self.last_seen})>")
@@ -0,0 +1,72 @@
+from flask import Blueprint, request, jsonify, send_file
+from app.services.export_jobs import EXPORT_REPORTS, ExportQueueFull, JOB_DONE, JOB_FAILED, export_jobs
+import logging
+
+export_jobs_bp = Blueprint('export_jobs', __name__)
+
+@export_jobs_bp.route('/reports', methods=['GET'])
+def list_export_reports():
+    """Report types that can be exported in the background, with their filter params"""
+    return jsonify({
+        "success": True,
+        "reports": [{"report_type": name, "params": spec['params']} for name, spec in EXPORT_REPORTS.items()]
+    }), 200
+
+@export_jobs_bp.route('', methods=['POST'])
+def submit_export_job():
+    """
+    Submit a background export.
+    Body: {"report_type": "...", "params": {...}}. Returns 202 with the job id,
+    or 200 when a cached artifact for the same data is already available.
+    """
+    data = request.get_json(silent=True) or {}
+    report_type = data.get('report_type')
+    params = data.get('params') or {}
+
+    if report_type not in EXPORT_REPORTS:
+        return jsonify({
+            "success": False,
+            "error": f"Unknown report_type '{report_type}'. Use one of: {', '.join(EXPORT_REPORTS)}"
+        }), 400
+    if not isinstance(params, dict):
+        return jsonify({"success": False, "error": "params must be an object"}), 400
+
+    try:
+        job = export_jobs.submit(report_type, params)
+    except ExportQueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 503
+    except Exception as e:
+        logging.error(f"Error submitting export job: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+    return jsonify({"success": True, "job": job}), 200 if job['status'] == JOB_DONE else 202
+
+@export_jobs_bp.route('/<job_id>', methods=['GET'])
+def get_export_job(job_id):
+    """Poll the status of an export job"""
+    job = export_jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Export job not found"}), 404
+    return jsonify({"success": True, "job": job}), 200
+
+@export_jobs_bp.route('/<job_id>/download', methods=['GET'])
+def download_export_job(job_id):
+    """Download the artifact of a finished export job"""
+    job = export_jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Export job not found"}), 404
+    if job['status'] == JOB_FAILED:
+        return jsonify({"success": False, "error": job['error']}), 500
+    if job['status'] != JOB_DONE:
+        return jsonify({"success": False, "error": "Export job is not finished yet", "status": job['status']}), 409
+
+    path = export_jobs.artifact_file(job)
+    if not path:
+        return jsonify({"success": False, "error": "Export artifact expired, submit the job again"}), 410
+
+    return send_file(path, as_attachment=True, download_name=job['filename'], mimetype=job['mimetype'])
+
+@export_jobs_bp.route('/metrics', methods=['GET'])
+def export_job_metrics():
+    """Job counts by status for this worker process"""
+    return jsonify({"success": True, "metrics": export_jobs.metrics()}), 200
@@ -4,27 +4,127 @@ from app.models.milk_batches import MilkBatch, MilkStatus
 from app.models.daily_milk_summary import DailyMilkSummary
 from app.database.database import db
 from datetime import datetime, date, timedelta
-from sqlalchemy import func
+from sqlalchemy import and_, func, insert, or_
+from sqlalchemy.exc import IntegrityError
 from fpdf import FPDF
 from flask import send_file
 from io import BytesIO
 from app.services.notification import check_milk_expiry_and_notify, check_milk_production_and_notify
+from app.services.notification_queue import notification_check_queue
+from app.services.exports import (
+    EXPORT_FORMATS,
+    MILKING_SESSION_HEADERS,
+    milking_session_export_rows,
+    streamed_export_response
+)
+from app.utils.pagination import decode_cursor, encode_cursor, parse_id, parse_limit
+from app.services.milk_rollup import ROLLUP_PERIOD_TYPES, load_rollups
+from app.services.batch_numbers import batch_number_allocator
+from app.services.daily_kpis import daily_kpis
+from app.services.expiry_scheduler import EXPIRY_TRACKED, expiry_scheduler
+from app.services.idempotency import (
+    IDEMPOTENCY_HEADER,
+    REPLAYED_HEADER,
+    fingerprint_matches,
+    normalize_idempotency_key,
+    request_fingerprint,
+    session_idempotency_cache
+)
+from app.services.milk_summary import (
+    add_session_delta,
+    apply_summary_deltas,
+    has_afternoon_or_evening_volume,
+    session_period
+)
 import pandas as pd
 
 milk_production_bp = Blueprint('milk_production', __name__)
 
+# Bulk ingest limits
+BULK_MAX_SESSIONS = 2000
+BULK_INSERT_CHUNK_SIZE = 500
+
+# Milking session listing page sizes
+SESSIONS_PAGE_SIZE = 50
+SESSIONS_MAX_PAGE_SIZE = 500
+
+def _session_created_body(session_id, batch_id):
+    return {
+        "success": True,
+        "message": "Milking session added successfully with new batch",
+        "id": session_id,
+        "batch_id": batch_id
+    }
+
+# Error for an idempotency key reused with a different request body
+IDEMPOTENCY_MISMATCH_ERROR = "Idempotency key already used with a different request body"
+
+def _lookup_idempotent_sessions(keys):
+    """
+    Original creation results for already used idempotency keys, from the in-memory
+    cache first and then with one IN query for the rest. Returns
+    {key: (body, request fingerprint)}.
+    """
+    found = {}
+    missing = []
+    for key in keys:
+        cached = session_idempotency_cache.get(key)
+        if cached:
+            found[key] = (cached[0], cached[2])
+        else:
+            missing.append(key)
+
+    for start in range(0, len(missing), BULK_INSERT_CHUNK_SIZE):
+        chunk = missing[start:start + BULK_INSERT_CHUNK_SIZE]
+        existing = db.session.query(
+            MilkingSession.idempotency_key, MilkingSession.id, MilkingSession.milk_batch_id,
+            MilkingSession.idempotency_request_hash
+        ).filter(MilkingSession.idempotency_key.in_(chunk))
+        for key, session_id, batch_id, fingerprint in existing:
+            found[key] = (_session_created_body(session_id, batch_id), fingerprint)
+            session_idempotency_cache.set(key, found[key][0], 201, fingerprint)
+    return found
+
+def _replay_response(original, fingerprint):
+    """Original result of a retried request, or 422 when the key came with another body"""
+    body, stored_fingerprint = original
+    if not fingerprint_matches(stored_fingerprint, fingerprint):
+        return jsonify({"success": False, "error": IDEMPOTENCY_MISMATCH_ERROR}), 422
+    response = jsonify(body)
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response, 201
+
 # MilkingSession routes
 @milk_production_bp.route('/milking-sessions', methods=['POST'])
 def add_milking_session():
+    """
+    Add a milking session together with its auto-generated batch.
+    An Idempotency-Key header (or idempotency_key field) makes the request safe to
+    retry: a replay returns the original result with Idempotent-Replayed: true.
+    Reusing a key with a different request body is rejected with 422.
+    """
     data = request.json
-    
+
+    try:
+        idempotency_key = normalize_idempotency_key(request.headers.get(IDEMPOTENCY_HEADER) or data.get('idempotency_key'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+
+    fingerprint = request_fingerprint(data) if idempotency_key else None
+    if idempotency_key:
+        original = _lookup_idempotent_sessions([idempotency_key]).get(idempotency_key)
+        if original:
+            return _replay_response(original, fingerprint)
+
     try:
+        production_date = datetime.fromisoformat(data.get('milking_time', datetime.utcnow().isoformat()))
+
         # Create a new milk batch automatically
         new_batch = MilkBatch(
-            batch_number=f"BATCH-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}",
+            batch_number=batch_number_allocator.next(production_date),
             total_volume=data['volume'],
             status=MilkStatus.FRESH,
-            production_date=datetime.fromisoformat(data.get('milking_time', datetime.utcnow().isoformat())),
+            production_date=production_date,
             expiry_date=datetime.fromisoformat(data.get('milking_time', datetime.utcnow().isoformat())) + timedelta(hours=8),
             notes=f"Auto-generated batch from milking session. {data.get('notes', '')}"
         )
@@ -39,88 +139,346 @@ def add_milking_session():
             milk_batch_id=new_batch.id,  # Link to the new batch
             volume=data['volume'],
             milking_time=datetime.fromisoformat(data.get('milking_time', datetime.utcnow().isoformat())),
-            notes=data.get('notes')
+            notes=data.get('notes'),
+            idempotency_key=idempotency_key,
+            idempotency_request_hash=fingerprint
         )
         
         db.session.add(new_session)
         
-        # Update the daily milk summary
-        session_date = new_session.milking_time.date()
-        summary = DailyMilkSummary.query.filter_by(
-            cow_id=new_session.cow_id,
-            date=session_date
-        ).first()
-        
-        if not summary:
-            # Initialize with zero values when creating a new summary
-            summary = DailyMilkSummary(
-                cow_id=new_session.cow_id,
-                date=session_date,
-                morning_volume=0,    # Initialize with zero instead of None
-                afternoon_volume=0,  # Initialize with zero instead of None
-                evening_volume=0,    # Initialize with zero instead of None
-                total_volume=0       # Initialize with zero instead of None
-            )
-            db.session.add(summary)
-        
-        # Ensure values are initialized if they are None
-        if summary.morning_volume is None:
-            summary.morning_volume = 0
-        if summary.afternoon_volume is None:
-            summary.afternoon_volume = 0
-        if summary.evening_volume is None:
-            summary.evening_volume = 0
-        
-        # Determine time of day and update corresponding volume
-        hour = new_session.milking_time.hour
-        if hour < 12:
-            summary.morning_volume += float(new_session.volume)
-        elif hour < 18:
-            summary.afternoon_volume += float(new_session.volume)
-        else:
-            summary.evening_volume += float(new_session.volume)
-            
-        # Ensure total_volume is not None
-        if summary.total_volume is None:
-            summary.total_volume = 0
-        summary.total_volume = summary.morning_volume + summary.afternoon_volume + summary.evening_volume
-        
+        # Update the daily milk summary with a single atomic upsert
+        apply_summary_deltas(add_session_delta({}, new_session.cow_id, new_session.milking_time, new_session.volume))
+
         db.session.commit()
         #cek evening kosong apatidak
-        if summary.evening_volume > 0 or summary.afternoon_volume > 0:
-           check_milk_production_and_notify()
-           check_milk_expiry_and_notify()
+        if session_period(new_session.milking_time) != 'morning' or has_afternoon_or_evening_volume(new_session.cow_id, new_session.milking_time.date()):
+           notification_check_queue.enqueue('milking_session_created')
 
-        return jsonify({
-            "success": True, 
-            "message": "Milking session added successfully with new batch", 
-            "id": new_session.id,
-            "batch_id": new_batch.id
-        }), 201
-    
+        body = _session_created_body(new_session.id, new_batch.id)
+        if idempotency_key:
+            session_idempotency_cache.set(idempotency_key, body, 201, fingerprint)
+        return jsonify(body), 201
+
+    except IntegrityError as e:
+        db.session.rollback()
+        # A concurrent retry with the same key committed first
+        if idempotency_key:
+            original = _lookup_idempotent_sessions([idempotency_key]).get(idempotency_key)
+            if original:
+                return _replay_response(original, fingerprint)
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         db.session.rollback()   
         return jsonify({"success": False, "error": str(e)}), 400
 
+@milk_production_bp.route('/milking-sessions/bulk', methods=['POST'])
+def add_milking_sessions_bulk():
+    """
+    Add many milking sessions in one transaction.
+    Accepts {"sessions": [...]} (or a bare array) where every item has the same
+    fields as POST /milking-sessions, and returns one result per item. Items whose
+    idempotency_key was already used are not inserted again; their result is the
+    original one with "replayed": true, or an error when the key was used with
+    different item fields.
+    """
+    data = request.json
+    items = data.get('sessions') if isinstance(data, dict) else data
+
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "error": "Request body must contain a non-empty 'sessions' array"}), 400
+    if len(items) > BULK_MAX_SESSIONS:
+        return jsonify({"success": False, "error": f"A bulk request may contain at most {BULK_MAX_SESSIONS} sessions"}), 400
+
+    results = [None] * len(items)
+    rows = []
+
+    # Validate and normalize every item before touching the database
+    for index, item in enumerate(items):
+        try:
+            milking_time = item.get('milking_time')
+            rows.append({
+                'index': index,
+                'cow_id': int(item['cow_id']),
+                'milker_id': int(item['milker_id']),
+                'volume': float(item['volume']),
+                'milking_time': datetime.fromisoformat(milking_time) if milking_time else datetime.utcnow(),
+                'notes': item.get('notes'),
+                'idempotency_key': normalize_idempotency_key(item.get('idempotency_key')),
+                'request_hash': request_fingerprint(item)
+            })
+        except KeyError as e:
+            results[index] = {"index": index, "success": False, "error": f"Missing required field {e}"}
+        except (AttributeError, TypeError, ValueError) as e:
+            results[index] = {"index": index, "success": False, "error": str(e)}
+
+    try:
+        # Items already created by an earlier upload are answered from their original result
+        replayed = 0
+        duplicates = []
+        keys = list({row['idempotency_key'] for row in rows if row['idempotency_key']})
+        originals = _lookup_idempotent_sessions(keys) if keys else {}
+        first_by_key = {}
+        pending_rows = []
+        for row in rows:
+            key = row['idempotency_key']
+            if key and key in originals:
+                body, fingerprint = originals[key]
+                if fingerprint_matches(fingerprint, row['request_hash']):
+                    results[row['index']] = {
+                        "index": row['index'],
+                        "success": True,
+                        "id": body['id'],
+                        "batch_id": body['batch_id'],
+                        "replayed": True
+                    }
+                    replayed += 1
+                else:
+                    results[row['index']] = {"index": row['index'], "success": False, "error": IDEMPOTENCY_MISMATCH_ERROR}
+            elif key and key in first_by_key:
+                # Same key twice in one upload: resolved from the first item below
+                duplicates.append((row, first_by_key[key]))
+            else:
+                if key:
+                    first_by_key[key] = row
+                pending_rows.append(row)
+        rows = pending_rows
+
+        # Resolve referenced cows and milkers with one IN query each
+        from app.models.cows import Cow
+        from app.models.users import User
+        cow_ids = {row['cow_id'] for row in rows}
+        milker_ids = {row['milker_id'] for row in rows}
+        known_cows = {cow_id for (cow_id,) in db.session.query(Cow.id).filter(Cow.id.in_(cow_ids))} if cow_ids else set()
+        known_milkers = {user_id for (user_id,) in db.session.query(User.id).filter(User.id.in_(milker_ids))} if milker_ids else set()
+
+        valid_rows = []
+        for row in rows:
+            if row['cow_id'] not in known_cows:
+                results[row['index']] = {"index": row['index'], "success": False, "error": f"Cow {row['cow_id']} not found"}
+            elif row['milker_id'] not in known_milkers:
+                results[row['index']] = {"index": row['index'], "success": False, "error": f"Milker {row['milker_id']} not found"}
+            else:
+                valid_rows.append(row)
+
+        if valid_rows:
+            now = datetime.utcnow()
+            batch_numbers = batch_number_allocator.allocate([row['milking_time'] for row in valid_rows])
+
+            # One batch per session, inserted with multi-row INSERTs
+            batch_rows = []
+            for row, batch_number in zip(valid_rows, batch_numbers):
+                row['batch_number'] = batch_number
+                batch_rows.append({
+                    'batch_number': row['batch_number'],
+                    'total_volume': row['volume'],
+                    'status': MilkStatus.FRESH,
+                    'production_date': row['milking_time'],
+                    'expiry_date': row['milking_time'] + timedelta(hours=8),
+                    'notes': f"Auto-generated batch from milking session. {row['notes'] or ''}",
+                    'created_at': now,
+                    'updated_at': now
+                })
+            for start in range(0, len(batch_rows), BULK_INSERT_CHUNK_SIZE):
+                db.session.execute(
+                    insert(MilkBatch.__table__).values(batch_rows[start:start + BULK_INSERT_CHUNK_SIZE]),
+                    execution_options={EXPIRY_TRACKED: True}
+                )
+
+            batch_ids = {}
+            for start in range(0, len(batch_numbers), BULK_INSERT_CHUNK_SIZE):
+                chunk = batch_numbers[start:start + BULK_INSERT_CHUNK_SIZE]
+                batch_ids.update(db.session.query(MilkBatch.batch_number, MilkBatch.id).filter(MilkBatch.batch_number.in_(chunk)))
+
+            expiry_scheduler.stage(db.session, [
+                (batch_ids[batch['batch_number']], batch['expiry_date']) for batch in batch_rows
+            ])
+
+            session_rows = []
+            for row in valid_rows:
+                row['batch_id'] = batch_ids[row['batch_number']]
+                session_rows.append({
+                    'cow_id': row['cow_id'],
+                    'milker_id': row['milker_id'],
+                    'milk_batch_id': row['batch_id'],
+                    'volume': row['volume'],
+                    'milking_time': row['milking_time'],
+                    'notes': row['notes'],
+                    'idempotency_key': row['idempotency_key'],
+                    'idempotency_request_hash': row['request_hash'] if row['idempotency_key'] else None,
+                    'created_at': now,
+                    'updated_at': now
+                })
+            for start in range(0, len(session_rows), BULK_INSERT_CHUNK_SIZE):
+                db.session.execute(insert(MilkingSession.__table__).values(session_rows[start:start + BULK_INSERT_CHUNK_SIZE]))
+
+            # Every new session owns its batch, so the batch id identifies the session
+            session_ids = {}
+            all_batch_ids = [row['batch_id'] for row in valid_rows]
+            for start in range(0, len(all_batch_ids), BULK_INSERT_CHUNK_SIZE):
+                chunk = all_batch_ids[start:start + BULK_INSERT_CHUNK_SIZE]
+                session_ids.update(db.session.query(MilkingSession.milk_batch_id, MilkingSession.id).filter(MilkingSession.milk_batch_id.in_(chunk)))
+
+            # Update the daily milk summaries for every affected (cow, date) at once
+            deltas = {}
+            for row in valid_rows:
+                add_session_delta(deltas, row['cow_id'], row['milking_time'], row['volume'])
+            apply_summary_deltas(deltas)
+
+            db.session.commit()
+
+            for row in valid_rows:
+                row['id'] = session_ids[row['batch_id']]
+                results[row['index']] = {
+                    "index": row['index'],
+                    "success": True,
+                    "id": row['id'],
+                    "batch_id": row['batch_id']
+                }
+                if row['idempotency_key']:
+                    session_idempotency_cache.set(row['idempotency_key'], _session_created_body(row['id'], row['batch_id']),
+                                                  201, row['request_hash'])
+
+            if any(session_period(row['milking_time']) != 'morning' for row in valid_rows):
+                notification_check_queue.enqueue('milking_sessions_bulk_created')
+
+        for row, first in duplicates:
+            if row['request_hash'] != first['request_hash']:
+                results[row['index']] = {"index": row['index'], "success": False, "error": IDEMPOTENCY_MISMATCH_ERROR}
+            elif results[first['index']] and results[first['index']]['success']:
+                results[row['index']] = dict(results[first['index']], index=row['index'], replayed=True)
+                replayed += 1
+            else:
+                results[row['index']] = {
+                    "index": row['index'],
+                    "success": False,
+                    "error": f"Idempotency key already used by item {first['index']}, which failed"
+                }
+
+        created = len(valid_rows)
+        failed = len(items) - created - replayed
+        status_code = 201 if failed == 0 else (207 if created + replayed > 0 else 400)
+
+        return jsonify({
+            "success": failed == 0,
+            "message": f"{created} milking sessions added, {failed} failed",
+            "created": created,
+            "replayed": replayed,
+            "failed": failed,
+            "results": results
+        }), status_code
+
+    except IntegrityError:
+        db.session.rollback()
+        # Another upload inserted one of these idempotency keys concurrently; a retry replays it
+        return jsonify({"success": False, "error": "Conflicting concurrent upload, please retry"}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
+
 @milk_production_bp.route('/milking-sessions', methods=['GET'])
 def get_milking_sessions():
-    sessions = MilkingSession.query.all()
+    """
+    List milking sessions, newest first.
+
+    Filters: cow_id, milker_id, start_date, end_date (YYYY-MM-DD).
+    Pass limit and/or cursor for keyset pagination on (milking_time, id); the response
+    is then {"sessions": [...], "next_cursor": ...}. Without them the full filtered
+    list is returned as a bare array, as before. fields=id,cow_name,... limits the
+    returned keys.
+    """
+    from app.models.cows import Cow
+    from app.models.users import User
+
+    columns = {
+        "id": MilkingSession.id,
+        "cow_id": MilkingSession.cow_id,
+        "cow_name": Cow.name,
+        "milker_id": MilkingSession.milker_id,
+        "milker_name": User.name,
+        "milk_batch_id": MilkingSession.milk_batch_id,
+        "volume": MilkingSession.volume,
+        "milking_time": MilkingSession.milking_time,
+        "notes": MilkingSession.notes
+    }
+
+    fields = request.args.get('fields')
+    if fields:
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in columns]
+        if unknown:
+            return jsonify({
+                "success": False,
+                "error": f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(columns)}"
+            }), 400
+    else:
+        fields = list(columns)
+
+    paginated = 'limit' in request.args or 'cursor' in request.args
+
+    try:
+        limit = parse_limit(request.args.get('limit'), SESSIONS_PAGE_SIZE, SESSIONS_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        cursor_time, cursor_id = decode_cursor(cursor, datetime, int) if cursor else (None, None)
+        cow_id = parse_id(request.args.get('cow_id'), 'cow_id')
+        milker_id = parse_id(request.args.get('milker_id'), 'milker_id')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+        end_date = datetime.strptime(end_date, '%Y-%m-%d') if end_date else None
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid query parameter: {str(e)}"}), 400
+
+    if start_date and end_date and start_date > end_date:
+        return jsonify({"success": False, "error": "start_date cannot be later than end_date"}), 400
+
+    # The keyset columns are always selected; names come from outer joins, not lazy loads
+    selected = [columns[field].label(field) for field in fields if field not in ('id', 'milking_time')]
+    query = db.session.query(MilkingSession.id, MilkingSession.milking_time, *selected)
+    if 'cow_name' in fields:
+        query = query.outerjoin(Cow, Cow.id == MilkingSession.cow_id)
+    if 'milker_name' in fields:
+        query = query.outerjoin(User, User.id == MilkingSession.milker_id)
+
+    if cow_id:
+        query = query.filter(MilkingSession.cow_id == cow_id)
+    if milker_id:
+        query = query.filter(MilkingSession.milker_id == milker_id)
+    if start_date:
+        query = query.filter(MilkingSession.milking_time >= start_date)
+    if end_date:
+        query = query.filter(MilkingSession.milking_time < end_date + timedelta(days=1))
+    if cursor_time is not None:
+        query = query.filter(or_(
+            MilkingSession.milking_time < cursor_time,
+            and_(MilkingSession.milking_time == cursor_time, MilkingSession.id < cursor_id)
+        ))
+
+    query = query.order_by(MilkingSession.milking_time.desc(), MilkingSession.id.desc())
+    if paginated:
+        query = query.limit(limit + 1)
+
+    rows = query.all()
+    has_more = paginated and len(rows) > limit
+    rows = rows[:limit] if paginated else rows
+
     result = []
-    
-    for session in sessions:
-        result.append({
-            "id": session.id,
-            "cow_id": session.cow_id,
-            "cow_name": session.cow.name if session.cow else None,
-            "milker_id": session.milker_id,
-            "milker_name": session.milker.name if session.milker else None,
-            "milk_batch_id": session.milk_batch_id,
-            "volume": session.volume,
-            "milking_time": session.milking_time.isoformat(),
-            "notes": session.notes
-        })
-    
-    return jsonify(result), 200
+    for row in rows:
+        item = {}
+        for field in fields:
+            value = getattr(row, field)
+            item[field] = value.isoformat() if field == 'milking_time' else value
+        result.append(item)
+
+    if not paginated:
+        return jsonify(result), 200
+
+    return jsonify({
+        "success": True,
+        "sessions": result,
+        "count": len(result),
+        "has_more": has_more,
+        "next_cursor": encode_cursor(rows[-1].milking_time, rows[-1].id) if has_more else None
+    }), 200
 
 
 @milk_production_bp.route('/milk-batches', methods=['GET'])
@@ -246,6 +604,89 @@ def get_daily_summaries():
             "error": f"An error occurred while fetching daily summaries: {str(e)}"
         }), 500
 
+@milk_production_bp.route('/rollups', methods=['GET'])
+def get_milk_rollups():
+    """
+    Weekly or monthly milk totals from the pre-aggregated rollups.
+    Query params: period (week|month, default month), cow_id (herd-wide when omitted),
+    start_date, end_date (YYYY-MM-DD).
+    """
+    period_type = request.args.get('period', 'month').lower()
+    if period_type not in ROLLUP_PERIOD_TYPES:
+        return jsonify({
+            "success": False,
+            "error": f"Invalid period. Use one of: {', '.join(ROLLUP_PERIOD_TYPES)}"
+        }), 400
+
+    cow_id = request.args.get('cow_id')
+    if cow_id:
+        try:
+            cow_id = int(cow_id)
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "Invalid cow_id format. Must be an integer."
+            }), 400
+    else:
+        cow_id = None
+
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "Invalid date format. Use YYYY-MM-DD"
+        }), 400
+
+    if start_date and end_date and start_date > end_date:
+        return jsonify({
+            "success": False,
+            "error": "start_date cannot be later than end_date"
+        }), 400
+
+    try:
+        rollups = load_rollups(period_type, cow_id, start_date, end_date)
+        return jsonify({
+            "success": True,
+            "period": period_type,
+            "scope": "cow" if cow_id is not None else "herd",
+            "cow_id": cow_id,
+            "rollups": rollups,
+            "total_records": len(rollups)
+        }), 200
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"An error occurred while fetching rollups: {str(e)}"
+        }), 500
+
+
+@milk_production_bp.route('/daily-kpis', methods=['GET'])
+def get_daily_kpis():
+    """
+    Herd production, batch and notification KPIs for a day (?date=YYYY-MM-DD,
+    default today). Same memoized snapshot the admin summaries use.
+    """
+    try:
+        day = request.args.get('date')
+        day = datetime.strptime(day, '%Y-%m-%d').date() if day else None
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "Invalid date format. Use YYYY-MM-DD"
+        }), 400
+
+    try:
+        return jsonify({"success": True, "kpis": daily_kpis.get(day)}), 200
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"An error occurred while computing KPIs: {str(e)}"
+        }), 500
+
 
 @milk_production_bp.route('/export/pdf', methods=['GET'])
 def export_milking_sessions_pdf():
@@ -302,44 +743,34 @@ def export_milking_sessions_pdf():
 
 @milk_production_bp.route('/export/excel', methods=['GET'])
 def export_milking_sessions_excel():
+    """
+    Export milking sessions as an Excel workbook (default), or as CSV/NDJSON with
+    ?format=csv|ndjson. Optional filters: cow_id, milker_id, start_date, end_date.
+    The workbook is built in a temporary file and only sent once it is complete, so
+    large exports should use format=csv or format=ndjson, which stream row by row,
+    or a background export job.
+    """
+    export_format = request.args.get('format', 'xlsx').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Unsupported format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
     try:
-        sessions = MilkingSession.query.all()
-        sessions_list = []
-        for idx, session in enumerate(sessions, start=1):
-            hour = session.milking_time.hour
-            if hour < 12:
-                sesi = "Pagi"
-            elif hour < 18:
-                sesi = "Siang"
-            else:
-                sesi = "Sore"
-            sessions_list.append({
-                "NO": idx,
-                "Cow": f"{session.cow_id} - {session.cow.name}" if session.cow else str(session.cow_id),
-                "Milker": f"{session.milker_id} - {session.milker.name}" if session.milker else str(session.milker_id),
-                "Session": sesi,
-                "Volume": session.volume,
-                "Milking Time": session.milking_time.strftime('%Y-%m-%d %H:%M')
-            })
+        cow_id = parse_id(request.args.get('cow_id'), 'cow_id')
+        milker_id = parse_id(request.args.get('milker_id'), 'milker_id')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        df = pd.DataFrame(sessions_list)
-        buffer = BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='MilkingSessions')
-            workbook = writer.book
-            worksheet = writer.sheets['MilkingSessions']
-            from openpyxl.styles import Font, PatternFill
-            header_fill = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
-            header_font = Font(bold=True)
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-            for column_cells in worksheet.columns:
-                max_length = max(len(str(cell.value)) for cell in column_cells if cell.value)
-                adjusted_width = max_length + 2
-                worksheet.column_dimensions[column_cells[0].column_letter].width = adjusted_width
-        buffer.seek(0)
-        return send_file(buffer, as_attachment=True, download_name="milking_sessions.xlsx", mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        start_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+        end_date = datetime.strptime(end_date, '%Y-%m-%d') if end_date else None
+    except ValueError:
+        return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+
+    try:
+        rows = milking_session_export_rows(cow_id, milker_id, start_date, end_date)
+        return streamed_export_response(export_format, MILKING_SESSION_HEADERS, rows, "milking_sessions", 'MilkingSessions')
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -354,10 +785,10 @@ def delete_milking_session(session_id):
         
         # Store information before deletion for summary update
         cow_id = session.cow_id
-        session_date = session.milking_time.date()
+        milking_time = session.milking_time
         volume = session.volume
-        hour = session.milking_time.hour
         milk_batch_id = session.milk_batch_id
+        idempotency_key = session.idempotency_key
         
         # Delete the milking session
         db.session.delete(session)
@@ -374,31 +805,14 @@ def delete_milking_session(session_id):
             if batch.total_volume <= 0 or remaining_sessions == 0:
                 db.session.delete(batch)
         
-        # Update the daily summary
-        summary = DailyMilkSummary.query.filter_by(cow_id=cow_id, date=session_date).first()
-        if summary:
-            # Subtract the volume from the appropriate time period
-            if hour < 12:
-                summary.morning_volume -= volume
-                if summary.morning_volume < 0:  # Safeguard against negative values
-                    summary.morning_volume = 0
-            elif hour < 18:
-                summary.afternoon_volume -= volume
-                if summary.afternoon_volume < 0:
-                    summary.afternoon_volume = 0
-            else:
-                summary.evening_volume -= volume
-                if summary.evening_volume < 0:
-                    summary.evening_volume = 0
-                    
-            # Update total volume
-            summary.total_volume = summary.morning_volume + summary.afternoon_volume + summary.evening_volume
-            
-            # If there's no more milk recorded for this cow on this day, delete the summary
-            if summary.total_volume <= 0:
-                db.session.delete(summary)
+        # Subtract the volume from the daily summary in place; the summary is
+        # removed when no milk is left for this cow on this day
+        apply_summary_deltas(add_session_delta({}, cow_id, milking_time, -volume))
         
         db.session.commit()
+        # The key no longer refers to a session, so a retry must not replay it
+        if idempotency_key:
+            session_idempotency_cache.discard(idempotency_key)
         return jsonify({"success": True, "message": "Milking session deleted successfully"}), 200
         
     except Exception as e:
@@ -417,14 +831,11 @@ def update_milking_session(session_id):
         # Store old values for calculations
         old_volume = session.volume
         old_milking_time = session.milking_time
-        old_hour = old_milking_time.hour
-        old_date = old_milking_time.date()
         old_cow_id = session.cow_id
         
         # Store the new values for calculations
         new_volume = float(data.get('volume', old_volume))
         new_milking_time = datetime.fromisoformat(data.get('milking_time', old_milking_time.isoformat()))
-        new_hour = new_milking_time.hour
         new_date = new_milking_time.date()
         new_cow_id = int(data.get('cow_id', old_cow_id))
         
@@ -446,111 +857,17 @@ def update_milking_session(session_id):
                     batch.production_date = new_milking_time
                     batch.expiry_date = new_milking_time + timedelta(hours=8)
                 
-        # Handle daily milk summary updates
-        
-        # 1. If date or cow changed, we need to update two summaries
-        if old_date != new_date or old_cow_id != new_cow_id:
-            # First, update the old summary (subtract volume)
-            old_summary = DailyMilkSummary.query.filter_by(
-                cow_id=old_cow_id,
-                date=old_date
-            ).first()
-            
-            if old_summary:
-                # Subtract the old volume from the appropriate time period
-                if old_hour < 12:
-                    old_summary.morning_volume -= old_volume
-                    if old_summary.morning_volume < 0:
-                        old_summary.morning_volume = 0
-                elif old_hour < 18:
-                    old_summary.afternoon_volume -= old_volume
-                    if old_summary.afternoon_volume < 0:
-                        old_summary.afternoon_volume = 0
-                else:
-                    old_summary.evening_volume -= old_volume
-                    if old_summary.evening_volume < 0:
-                        old_summary.evening_volume = 0
-                        
-                # Update total volume
-                old_summary.total_volume = old_summary.morning_volume + old_summary.afternoon_volume + old_summary.evening_volume
-                
-                # If there's no more milk recorded for this cow on this day, delete the summary
-                if old_summary.total_volume <= 0:
-                    db.session.delete(old_summary)
-            
-            # Then, find or create new summary and add volume
-            new_summary = DailyMilkSummary.query.filter_by(
-                cow_id=new_cow_id,
-                date=new_date
-            ).first()
-            
-            if not new_summary:
-                new_summary = DailyMilkSummary(
-                    cow_id=new_cow_id,
-                    date=new_date,
-                    morning_volume=0,
-                    afternoon_volume=0,
-                    evening_volume=0,
-                    total_volume=0
-                )
-                db.session.add(new_summary)
-            
-            # Add the new volume to the appropriate time period
-            if new_hour < 12:
-                new_summary.morning_volume += new_volume
-            elif new_hour < 18:
-                new_summary.afternoon_volume += new_volume
-            else:
-                new_summary.evening_volume += new_volume
-                
-            # Update total volume
-            new_summary.total_volume = new_summary.morning_volume + new_summary.afternoon_volume + new_summary.evening_volume
-        
-        # 2. If only volume or time of day changed but date and cow are the same
-        elif old_volume != new_volume or (old_hour < 12 and new_hour >= 12) or (old_hour < 18 and new_hour >= 18) or (old_hour >= 18 and new_hour < 18):
-            summary = DailyMilkSummary.query.filter_by(
-                cow_id=new_cow_id,
-                date=new_date
-            ).first()
-            
-            if summary:
-                # Remove old volume from old time period
-                if old_hour < 12:
-                    summary.morning_volume -= old_volume
-                    if summary.morning_volume < 0:
-                        summary.morning_volume = 0
-                elif old_hour < 18:
-                    summary.afternoon_volume -= old_volume
-                    if summary.afternoon_volume < 0:
-                        summary.afternoon_volume = 0
-                else:
-                    summary.evening_volume -= old_volume
-                    if summary.evening_volume < 0:
-                        summary.evening_volume = 0
-                
-                # Add new volume to new time period
-                if new_hour < 12:
-                    summary.morning_volume += new_volume
-                elif new_hour < 18:
-                    summary.afternoon_volume += new_volume
-                else:
-                    summary.evening_volume += new_volume
-                
-                # Update total
-                summary.total_volume = summary.morning_volume + summary.afternoon_volume + summary.evening_volume
+        # Handle daily milk summary updates: move the old volume out of its
+        # (cow, date, period) and the new volume into its own, atomically
+        deltas = add_session_delta({}, old_cow_id, old_milking_time, -old_volume)
+        add_session_delta(deltas, new_cow_id, new_milking_time, new_volume)
+        apply_summary_deltas(deltas)
         
         db.session.commit()
         
-        # Get the latest summary data for notification checks
-        updated_summary = DailyMilkSummary.query.filter_by(
-            cow_id=new_cow_id,
-            date=new_date
-        ).first()
-        
         # Check if evening or afternoon volumes exist to trigger notifications
-        if updated_summary and (updated_summary.evening_volume != 0 or updated_summary.afternoon_volume != 0):
-            check_milk_production_and_notify()
-            check_milk_expiry_and_notify()
+        if has_afternoon_or_evening_volume(new_cow_id, new_date):
+            notification_check_queue.enqueue('milking_session_updated')
         
         return jsonify({
             "success": True,
@@ -1008,6 +1325,23 @@ def check_production():
         }), 500
 
 
+@milk_production_bp.route('/check-queue/metrics', methods=['GET'])
+def check_queue_metrics():
+    return jsonify({
+        'success': True,
+        'metrics': notification_check_queue.metrics()
+    }), 200
+
+
+@milk_production_bp.route('/expiry-scheduler/status', methods=['GET'])
+def expiry_scheduler_status():
+    """Tracked fresh batches and the next warning/expiry events"""
+    return jsonify({
+        'success': True,
+        'scheduler': expiry_scheduler.status()
+    }), 200
+
+
 @milk_production_bp.route('/check-expiry', methods=['POST'])
 def check_expiry():
     try:
@@ -1,12 +1,26 @@
 from flask import Blueprint, jsonify, request
 from app.models.notification import Notification
 from app.database.database import db
+from app.services.unread_counter import UNREAD_COUNTED, unread_counters
+from app.utils.pagination import decode_cursor, encode_cursor, parse_limit
+from datetime import datetime
 from pytz import timezone
+from sqlalchemy import and_, delete, or_, update
+import logging
 
 notification_bp = Blueprint('notification', __name__)
 
+# Notification inbox page sizes (keyset mode)
+NOTIFICATIONS_PAGE_SIZE = 20
+NOTIFICATIONS_MAX_PAGE_SIZE = 100
+
 @notification_bp.route('/', methods=['GET'])
 def get_notifications():
+    """
+    Notifications of a user, newest first; is_read=true/false filters.
+    Pass limit and/or cursor for keyset pagination on (created_at, id); the response
+    then carries next_cursor and the cached unread_count instead of total/pages.
+    """
     user_id = request.args.get('user_id', type=int)
     
     if not user_id:
@@ -16,6 +30,14 @@ def get_notifications():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     is_read = request.args.get('is_read', None)
+    paginated = 'limit' in request.args or 'cursor' in request.args
+
+    try:
+        limit = parse_limit(request.args.get('limit'), NOTIFICATIONS_PAGE_SIZE, NOTIFICATIONS_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        cursor_time, cursor_id = decode_cursor(cursor, datetime, int) if cursor else (None, None)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {str(e)}"}), 400
 
     # Build query
     query = Notification.query.filter_by(user_id=user_id)
@@ -24,26 +46,44 @@ def get_notifications():
         is_read = is_read.lower() == 'true'
         query = query.filter_by(is_read=is_read)
 
+    # Convert created_at ke Asia/Jakarta timezone
+    jakarta = timezone("Asia/Jakarta")
+
+    def serialize(n):
+        return {
+            'id': n.id,
+            'cow_id': n.cow_id,
+            'message': n.message,
+            'type': n.type,
+            'is_read': n.is_read,
+            'created_at': n.created_at.astimezone(jakarta).isoformat() if n.created_at else None
+        }
+
+    if paginated:
+        if cursor_time is not None:
+            query = query.filter(or_(
+                Notification.created_at < cursor_time,
+                and_(Notification.created_at == cursor_time, Notification.id < cursor_id)
+            ))
+        rows = query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return jsonify({
+            'notifications': [serialize(n) for n in rows],
+            'count': len(rows),
+            'has_more': has_more,
+            'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None,
+            'unread_count': unread_counters.get(user_id)
+        })
+
     # Order by newest first
     query = query.order_by(Notification.created_at.desc())
 
     # Paginate results
     notifications = query.paginate(page=page, per_page=per_page)
 
-    # Convert created_at ke Asia/Jakarta timezone
-    jakarta = timezone("Asia/Jakarta")
-
     result = {
-        'notifications': [
-            {
-                'id': n.id,
-                'cow_id': n.cow_id,
-                'message': n.message,
-                'type': n.type,
-                'is_read': n.is_read,
-                'created_at': n.created_at.astimezone(jakarta).isoformat() if n.created_at else None
-            } for n in notifications.items
-        ],
+        'notifications': [serialize(n) for n in notifications.items],
         'total': notifications.total,
         'pages': notifications.pages,
         'current_page': page
@@ -66,6 +106,143 @@ def mark_as_read(notification_id):
     return jsonify({'message': 'Notifikasi ditandai sudah dibaca'})
 
 
+def _bulk_filters(user_id, data):
+    """WHERE criteria for bulk operations; raises ValueError on a bad filter"""
+    criteria = [Notification.user_id == user_id]
+    if data.get('ids') is not None:
+        if not isinstance(data['ids'], list):
+            raise ValueError("ids must be a list")
+        criteria.append(Notification.id.in_([_json_int(value, 'ids') for value in data['ids']]))
+    if data.get('up_to_id') is not None:
+        criteria.append(Notification.id <= _json_int(data['up_to_id'], 'up_to_id'))
+    if data.get('before'):
+        criteria.append(Notification.created_at <= _naive_local(datetime.fromisoformat(data['before'])))
+    if data.get('type'):
+        criteria.append(Notification.type == data['type'])
+    if data.get('is_read') is not None:
+        criteria.append(Notification.is_read == _json_bool(data, 'is_read'))
+    return criteria
+
+
+def _json_bool(data, key):
+    """A JSON boolean from the body; the string "false" would otherwise read as true"""
+    value = data[key]
+    if not isinstance(value, bool):
+        raise ValueError(f"{key} must be true or false")
+    return value
+
+
+def _json_int(value, key):
+    """An id from the body; int(True) would otherwise read as id 1"""
+    if isinstance(value, bool):
+        raise ValueError(f"{key} must be an integer")
+    return int(value)
+
+
+def _naive_local(value):
+    """
+    created_at is stored as naive server-local time (and rendered from it), so an
+    aware timestamp such as 2026-10-18T09:00:00+07:00 is converted to that first
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def _push_unread_badge(user_id):
+    """Send the user's unread count once after a bulk change"""
+    from app.socket import emit_unread_count
+
+    unread_count = unread_counters.get(user_id)
+    try:
+        emit_unread_count(user_id, unread_count)
+    except Exception as e:
+        logging.error(f"Error pushing unread count to user {user_id}: {str(e)}")
+    return unread_count
+
+
+@notification_bp.route('/read-all', methods=['PUT'])
+def mark_all_as_read():
+    """
+    Mark a user's unread notifications as read with one UPDATE.
+    Optional body filters: up_to_id, before (ISO timestamp), type, ids.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "Missing user_id in request body"}), 400
+
+    try:
+        user_id = _json_int(user_id, 'user_id')
+        criteria = _bulk_filters(user_id, {**data, 'is_read': None})
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
+
+    try:
+        result = db.session.execute(
+            update(Notification)
+            .where(*criteria, Notification.is_read == False)
+            .values(is_read=True)
+            .execution_options(synchronize_session=False, **{UNREAD_COUNTED: True})
+        )
+        marked = result.rowcount
+        unread_counters.stage(db.session, {user_id: -marked})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        'message': f'{marked} notifikasi ditandai sudah dibaca',
+        'marked_count': marked,
+        'unread_count': _push_unread_badge(user_id)
+    })
+
+
+@notification_bp.route('/bulk', methods=['DELETE'])
+def delete_notifications_bulk():
+    """
+    Delete a user's notifications matching the body filters with one DELETE.
+    Filters: ids, up_to_id, before (ISO timestamp), type, is_read; at least one is required.
+    """
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "Missing user_id in request body"}), 400
+
+    try:
+        user_id = _json_int(user_id, 'user_id')
+        criteria = _bulk_filters(user_id, data)
+        delete_all = _json_bool(data, 'all') if data.get('all') is not None else False
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
+
+    if len(criteria) == 1 and not delete_all:
+        return jsonify({"error": "Provide at least one filter, or all=true to delete every notification"}), 400
+
+    try:
+        result = db.session.execute(
+            delete(Notification)
+            .where(*criteria)
+            .execution_options(synchronize_session=False, **{UNREAD_COUNTED: True})
+        )
+        deleted = result.rowcount
+        # Unknown how many of the deleted rows were unread: re-count on next read
+        unread_counters.stage_invalidate(db.session, [user_id])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        'message': f'{deleted} notifikasi dihapus',
+        'deleted_count': deleted,
+        'unread_count': _push_unread_badge(user_id)
+    })
+
+
 @notification_bp.route('/unread-count', methods=['GET'])
 def get_unread_count():
     user_id = request.args.get('user_id', type=int)
@@ -73,8 +250,7 @@ def get_unread_count():
     if not user_id:
         return jsonify({"error": "Missing user_id parameter"}), 400
     
-    count = Notification.query.filter_by(user_id=user_id, is_read=False).count()
-    return jsonify({'unread_count': count})
+    return jsonify({'unread_count': unread_counters.get(user_id)})
 
 
 @notification_bp.route('/<int:notification_id>', methods=['DELETE'])
@@ -89,3 +265,59 @@ def delete_notification(notification_id):
     db.session.commit()
     
     return jsonify({'message': 'Notifikasi dihapus'})
+
+
+@notification_bp.route('/stats', methods=['GET'])
+def get_stats():
+    """Notification counts for a day (?date=YYYY-MM-DD, default today) by type and hour"""
+    from app.services.notification_stats import notification_stats
+
+    day = request.args.get('date')
+    try:
+        day = datetime.strptime(day, '%Y-%m-%d').date() if day else None
+    except ValueError:
+        return jsonify({"error": "Invalid date, expected YYYY-MM-DD"}), 400
+
+    try:
+        return jsonify(notification_stats.get(day))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@notification_bp.route('/rate-limit/stats', methods=['GET'])
+def get_rate_limit_stats():
+    from app.services.notification import rate_limiter
+
+    return jsonify(rate_limiter.stats())
+
+
+@notification_bp.route('/retention/status', methods=['GET'])
+def get_retention_status():
+    """Progress of the running notification retention job, or the last result"""
+    from app.services.notification_retention import notification_retention
+
+    return jsonify(notification_retention.status())
+
+
+@notification_bp.route('/emit-queue/metrics', methods=['GET'])
+def get_emit_queue_metrics():
+    from app.services.notification import emit_queue
+
+    return jsonify(emit_queue.metrics())
+
+
+@notification_bp.route('/presence', methods=['GET'])
+def get_presence():
+    """Users with an open socket connection; ?user_id= checks a single user"""
+    from app.socket import presence
+
+    user_id = request.args.get('user_id')
+    if user_id:
+        sessions = presence.sessions_for(user_id)
+        return jsonify({'user_id': user_id, 'online': bool(sessions), 'connections': len(sessions)})
+
+    online = presence.online_users()
+    return jsonify({
+        'online_users': [{'user_id': key, 'connections': count} for key, count in online.items()],
+        'total_online': len(online)
+    })
@@ -0,0 +1,25 @@
+from flask import Blueprint, request, jsonify
+from app.services.job_scheduler import job_scheduler
+import logging
+
+scheduler_bp = Blueprint('scheduler', __name__)
+
+@scheduler_bp.route('/status', methods=['GET'])
+def scheduler_status():
+    """Lease holder, this worker's role, and each job's next run and last run"""
+    try:
+        return jsonify({"success": True, "scheduler": job_scheduler.status()}), 200
+    except Exception as e:
+        logging.error(f"Error getting scheduler status: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@scheduler_bp.route('/runs', methods=['GET'])
+def scheduler_runs():
+    """Recent job runs, newest first (?job_id=..., ?limit=20, max 200)"""
+    limit = min(max(request.args.get('limit', default=20, type=int), 1), 200)
+    try:
+        runs = job_scheduler.history(request.args.get('job_id'), limit)
+        return jsonify({"success": True, "runs": runs}), 200
+    except Exception as e:
+        logging.error(f"Error getting scheduler runs: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
@@ -0,0 +1,104 @@
+from app.models.batch_number_sequence import BatchNumberSequence
+from app.database.database import db
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+import threading
+
+# Sequence numbers reserved from the database per round trip
+BATCH_SEQUENCE_BLOCK_SIZE = 50
+
+sequence_table = BatchNumberSequence.__table__
+
+def format_batch_number(production_time, sequence):
+    """
+    BATCH-<production time>-<daily sequence>. The timestamp prefix keeps numbers
+    sortable by production time (and ordered after the old BATCH-<timestamp> ones);
+    the per-day sequence makes them unique.
+    """
+    return f"BATCH-{production_time.strftime('%Y%m%d%H%M%S')}-{sequence:06d}"
+
+class BatchNumberAllocator:
+    """
+    Hands out batch numbers from per-day sequences kept in batch_number_sequences.
+    Each process reserves blocks of BATCH_SEQUENCE_BLOCK_SIZE numbers with one
+    atomic upsert on its own short transaction, then serves numbers from memory.
+    Numbers are unique across processes; unused numbers of a block are skipped.
+    """
+
+    def __init__(self, block_size=BATCH_SEQUENCE_BLOCK_SIZE):
+        self.block_size = block_size
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def allocate(self, production_times):
+        """Batch numbers for batches produced at each of `production_times`, in order"""
+        by_day = {}
+        for index, production_time in enumerate(production_times):
+            by_day.setdefault(production_time.date(), []).append(index)
+
+        numbers = [None] * len(production_times)
+        for day, indexes in by_day.items():
+            for index, sequence in zip(indexes, self._take(day, len(indexes))):
+                numbers[index] = format_batch_number(production_times[index], sequence)
+        return numbers
+
+    def next(self, production_time):
+        """Batch number for one batch produced at `production_time`"""
+        return self.allocate([production_time])[0]
+
+    def _take(self, day, count):
+        sequences = []
+        with self._lock:
+            while len(sequences) < count:
+                next_value, end = self._blocks.pop(day, (0, 0))
+                if next_value >= end:
+                    wanted = max(self.block_size, count - len(sequences))
+                    last_value = self._reserve(day, wanted)
+                    next_value, end = last_value - wanted + 1, last_value + 1
+                take = min(end - next_value, count - len(sequences))
+                sequences.extend(range(next_value, next_value + take))
+                if next_value + take < end:
+                    self._blocks[day] = (next_value + take, end)
+        return sequences
+
+    def _reserve(self, day, size):
+        """Atomically advance the day's sequence by `size`; returns the last reserved value"""
+        # A separate connection commits the reservation at once, so the row lock is
+        # never held for the length of the caller's transaction
+        with db.engine.begin() as connection:
+            dialect = connection.dialect.name
+            if dialect == 'mysql':
+                stmt = mysql_insert(sequence_table).values(seq_date=day, last_value=size)
+                connection.execute(stmt.on_duplicate_key_update(last_value=sequence_table.c.last_value + size))
+            elif dialect == 'sqlite':
+                stmt = sqlite_insert(sequence_table).values(seq_date=day, last_value=size)
+                connection.execute(stmt.on_conflict_do_update(
+                    index_elements=['seq_date'],
+                    set_={'last_value': sequence_table.c.last_value + size}
+                ))
+            else:
+                result = connection.execute(
+                    update(sequence_table)
+                    .where(sequence_table.c.seq_date == day)
+                    .values(last_value=sequence_table.c.last_value + size)
+                )
+                if result.rowcount == 0:
+                    try:
+                        with connection.begin_nested():
+                            connection.execute(insert(sequence_table).values(seq_date=day, last_value=size))
+                    except IntegrityError:
+                        # Another process created the day's row first
+                        connection.execute(
+                            update(sequence_table)
+                            .where(sequence_table.c.seq_date == day)
+                            .values(last_value=sequence_table.c.last_value + size)
+                        )
+
+            return connection.execute(
+                select(sequence_table.c.last_value).where(sequence_table.c.seq_date == day)
+            ).scalar_one()
+
+# Global allocator
+batch_number_allocator = BatchNumberAllocator()
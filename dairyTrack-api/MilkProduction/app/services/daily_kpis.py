@@ -0,0 +1,203 @@
+from app.models.daily_milk_summary import DailyMilkSummary
+from app.models.milk_batches import MilkBatch, MilkStatus
+from app.models.cows import Cow
+from app.database.database import db
+from app.services.notification import NotificationConfig
+from app.services.notification_stats import day_range, notification_stats
+from datetime import date, datetime, timedelta
+from sqlalchemy import and_, case, event, func, or_, select
+from sqlalchemy.orm import Session
+import threading
+import time
+
+class KpiConfig:
+    TARGET_LITERS_PER_COW = 20  # Daily target used in the admin summary
+    SNAPSHOT_TTL_SECONDS = 300  # Bounds how long writes committed by other workers go unseen
+    CACHE_DAYS = 31
+
+# Writes to these tables invalidate every cached snapshot once committed
+KPI_SOURCE_TABLES = {'daily_milk_summary', 'milk_batches', 'cows'}
+
+_DIRTY_KEY = 'daily_kpis_dirty'
+
+def compute_daily_kpis(day, now=None):
+    """KPIs for `day` as of `now` (naive UTC, like the batch expiry dates)"""
+    now = now or datetime.utcnow()
+    return with_expiring_batches(day_snapshot(day, now), now)
+
+def day_snapshot(day, now):
+    """
+    Herd production, batch and notification KPIs for `day` from three aggregate
+    queries (production totals, out-of-range cows, batch volumes by state) plus the
+    cached notification statistics. Leaves out the batches expiring soon, which
+    move with the clock rather than with the data; see with_expiring_batches.
+    """
+    day_start, day_end = day_range(day)
+    low = NotificationConfig.LOW_PRODUCTION_LITERS
+    high = NotificationConfig.HIGH_PRODUCTION_LITERS
+
+    total_cows = select(func.count(Cow.id)).scalar_subquery()
+    production = db.session.execute(
+        select(
+            total_cows.label('total_cows'),
+            func.count(DailyMilkSummary.id).label('cows_milked'),
+            func.coalesce(func.sum(DailyMilkSummary.total_volume), 0).label('total_volume'),
+            func.coalesce(func.sum(DailyMilkSummary.morning_volume), 0).label('morning_volume'),
+            func.coalesce(func.sum(DailyMilkSummary.afternoon_volume), 0).label('afternoon_volume'),
+            func.coalesce(func.sum(DailyMilkSummary.evening_volume), 0).label('evening_volume'),
+            func.max(DailyMilkSummary.total_volume).label('max_volume'),
+            func.min(DailyMilkSummary.total_volume).label('min_volume')
+        ).where(DailyMilkSummary.date == day)
+    ).one()
+
+    outliers = db.session.execute(
+        select(DailyMilkSummary.cow_id, Cow.name.label('cow_name'), DailyMilkSummary.total_volume)
+        .join(Cow, Cow.id == DailyMilkSummary.cow_id)
+        .where(DailyMilkSummary.date == day,
+               or_(DailyMilkSummary.total_volume < low, DailyMilkSummary.total_volume > high))
+        .order_by(DailyMilkSummary.total_volume)
+    ).all()
+    low_cows = [{'cow_id': row.cow_id, 'cow_name': row.cow_name, 'total_volume': float(row.total_volume)}
+                for row in outliers if row.total_volume < low]
+    high_cows = [{'cow_id': row.cow_id, 'cow_name': row.cow_name, 'total_volume': float(row.total_volume)}
+                 for row in reversed(outliers) if row.total_volume > high]
+
+    fresh = MilkBatch.status == MilkStatus.FRESH
+    expired_today = and_(MilkBatch.status == MilkStatus.EXPIRED,
+                         MilkBatch.expiry_date >= day_start, MilkBatch.expiry_date < day_end)
+
+    def count_if(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    def volume_if(condition):
+        return func.coalesce(func.sum(case((condition, MilkBatch.total_volume), else_=0)), 0)
+
+    batches = db.session.execute(
+        select(
+            count_if(fresh).label('fresh_count'),
+            volume_if(fresh).label('fresh_volume'),
+            count_if(expired_today).label('expired_today_count'),
+            volume_if(expired_today).label('expired_today_volume')
+        ).where(or_(fresh, expired_today))
+    ).one()
+
+    total_volume = float(production.total_volume)
+    return {
+        'date': day.isoformat(),
+        'computed_at': now.isoformat(),
+        'production': {
+            'total_cows': production.total_cows,
+            'cows_milked': production.cows_milked,
+            'total_volume': total_volume,
+            'morning_volume': float(production.morning_volume),
+            'afternoon_volume': float(production.afternoon_volume),
+            'evening_volume': float(production.evening_volume),
+            'avg_per_cow': total_volume / production.total_cows if production.total_cows else 0,
+            'avg_per_milked_cow': total_volume / production.cows_milked if production.cows_milked else 0,
+            'max_volume': float(production.max_volume) if production.max_volume is not None else None,
+            'min_volume': float(production.min_volume) if production.min_volume is not None else None,
+            'target_volume': production.total_cows * KpiConfig.TARGET_LITERS_PER_COW,
+            'low_production_cows': low_cows,
+            'high_production_cows': high_cows
+        },
+        'batches': {
+            'fresh_count': int(batches.fresh_count),
+            'fresh_volume': float(batches.fresh_volume),
+            'expired_today_count': int(batches.expired_today_count),
+            'expired_today_volume': float(batches.expired_today_volume)
+        },
+        'notifications': {
+            key: value for key, value in notification_stats.get(day).items()
+            if key in ('total_today', 'unread_today', 'unread_count', 'by_type')
+        }
+    }
+
+def with_expiring_batches(snapshot, now):
+    """
+    Copy of a day snapshot with the count and volume of fresh batches expiring
+    within WARNING_HOURS of `now`, from one query on the (status, expiry_date) index
+    """
+    fresh = MilkBatch.status == MilkStatus.FRESH
+    expiring = db.session.execute(
+        select(func.count(MilkBatch.id).label('count'),
+               func.coalesce(func.sum(MilkBatch.total_volume), 0).label('volume'))
+        .where(fresh, MilkBatch.expiry_date > now,
+               MilkBatch.expiry_date <= now + timedelta(hours=NotificationConfig.WARNING_HOURS))
+    ).one()
+    return {
+        **snapshot,
+        'batches': {
+            **snapshot['batches'],
+            'expiring_count': int(expiring.count),
+            'expiring_volume': float(expiring.volume),
+            'expiring_within_hours': NotificationConfig.WARNING_HOURS
+        }
+    }
+
+class DailyKpiCache:
+    """
+    One KPI snapshot per day, shared by the admin summaries and the dashboard.
+    Dropped when this process commits a write to KPI_SOURCE_TABLES, and after
+    SNAPSHOT_TTL_SECONDS (writes from other workers). The batches expiring soon are
+    not part of the snapshot; they are counted against the clock on every get.
+    """
+
+    def __init__(self, ttl_seconds=KpiConfig.SNAPSHOT_TTL_SECONDS, max_days=KpiConfig.CACHE_DAYS):
+        self.ttl_seconds = ttl_seconds
+        self.max_days = max_days
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def get(self, day=None, now=None):
+        """KPIs for `day` as of `now` (naive UTC, defaults to the current time)"""
+        day = day or date.today()
+        now = now or datetime.utcnow()
+        monotonic_now = time.monotonic()
+        with self._lock:
+            entry = self._snapshots.get(day)
+            if entry and entry[0] > monotonic_now:
+                return with_expiring_batches(entry[1], now)
+            generation = self._generation
+
+        snapshot = day_snapshot(day, now)
+        with self._lock:
+            # Skip caching if a write was committed while computing
+            if generation == self._generation:
+                self._snapshots[day] = (monotonic_now + self.ttl_seconds, snapshot)
+                if len(self._snapshots) > self.max_days:
+                    del self._snapshots[min(self._snapshots, key=lambda key: self._snapshots[key][0])]
+        return with_expiring_batches(snapshot, now)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._snapshots.clear()
+
+# Global KPI snapshot cache
+daily_kpis = DailyKpiCache()
+
+@event.listens_for(Session, 'after_flush')
+def _mark_flushed_sources(session, flush_context):
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if getattr(type(instance), '__tablename__', None) in KPI_SOURCE_TABLES:
+            session.info[_DIRTY_KEY] = True
+            return
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_executed_sources(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    target = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(target, 'name', None) in KPI_SOURCE_TABLES:
+        orm_execute_state.session.info[_DIRTY_KEY] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        daily_kpis.invalidate()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rolled_back(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_DIRTY_KEY, None)
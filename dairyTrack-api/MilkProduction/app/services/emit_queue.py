@@ -0,0 +1,172 @@
+from app.socket import emit_notification
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+# Failed deliveries kept for inspection after their last attempt
+DEAD_LETTER_HISTORY = 100
+
+class NotificationEmitQueue:
+    """
+    Outbound socket emits, decoupled from the code that creates notifications.
+    Callers enqueue and return at once; a worker thread (a green thread under the
+    eventlet monkey patch in run.py) delivers them. Notifications for the same user
+    arriving within `coalesce_seconds` are delivered in one worker pass, still as one
+    `new_notification` event each, which is what the web client listens for. Failed
+    deliveries are retried (from the first unsent notification) with exponential
+    backoff and counted as dead letters after `max_attempts`.
+    """
+
+    def __init__(self, capacity=10000, coalesce_seconds=0.5, max_attempts=3, backoff_seconds=0.5):
+        self.capacity = capacity
+        self.coalesce_seconds = coalesce_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.app = None
+        self._condition = threading.Condition()
+        self._worker = None
+        self._batches = {}
+        self._schedule = []
+        self._sequence = itertools.count()
+        self._size = 0
+        self._dead_letters = deque(maxlen=DEAD_LETTER_HISTORY)
+        self._stats = {
+            'enqueued_total': 0,
+            'dropped_total': 0,
+            'emitted_events_total': 0,
+            'emitted_notifications_total': 0,
+            'coalesced_notifications_total': 0,
+            'retries_total': 0,
+            'dead_letter_total': 0
+        }
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['notification_emit_queue'] = self
+
+    def enqueue(self, user_id, notification_data):
+        """Queue a notification for delivery; returns False if it was dropped"""
+        with self._condition:
+            if self._size >= self.capacity:
+                self._stats['dropped_total'] += 1
+                self._stats['dead_letter_total'] += 1
+                self._dead_letters.append({'user_id': user_id, 'count': 1, 'reason': 'queue full',
+                                           'at': datetime.utcnow().isoformat()})
+                logging.warning("Emit queue full, dropped notification for user %s", user_id)
+                return False
+
+            batch = self._batches.get(user_id)
+            if batch is None:
+                batch = {'items': [], 'attempt': 0}
+                self._batches[user_id] = batch
+                self._push(time.monotonic() + self.coalesce_seconds, user_id)
+            batch['items'].append(notification_data)
+            self._size += 1
+            self._stats['enqueued_total'] += 1
+            self._ensure_worker()
+            self._condition.notify()
+        return True
+
+    def flush(self):
+        """Deliver everything queued now, ignoring coalesce and backoff delays"""
+        while True:
+            with self._condition:
+                if not self._schedule:
+                    return
+                _, _, user_id = heapq.heappop(self._schedule)
+                batch = self._take(user_id)
+            if batch:
+                self._deliver(user_id, batch)
+
+    def metrics(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['queue_depth'] = self._size
+            stats['pending_users'] = len(self._batches)
+            stats['capacity'] = self.capacity
+            stats['worker_alive'] = self._worker is not None and self._worker.is_alive()
+            stats['recent_dead_letters'] = list(self._dead_letters)
+        return stats
+
+    def _push(self, due, user_id):
+        heapq.heappush(self._schedule, (due, next(self._sequence), user_id))
+
+    def _take(self, user_id):
+        batch = self._batches.pop(user_id, None)
+        if batch:
+            self._size -= len(batch['items'])
+        return batch
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='notification-emit-queue', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._schedule:
+                    self._condition.wait()
+                due, _, user_id = self._schedule[0]
+                now = time.monotonic()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+                heapq.heappop(self._schedule)
+                batch = self._take(user_id)
+            if batch:
+                self._deliver(user_id, batch)
+
+    def _deliver(self, user_id, batch):
+        items = batch['items']
+        sent = 0
+        try:
+            with self.app.app_context() if self.app is not None else nullcontext():
+                for item in items:
+                    emit_notification(user_id, item)
+                    sent += 1
+        except Exception as e:
+            self._count_delivered(items[:sent])
+            self._retry(user_id, {'items': items[sent:], 'attempt': batch['attempt']}, e)
+            return
+
+        self._count_delivered(items)
+        logging.info("Notification emit to user %s delivered %d notification(s)", user_id, len(items))
+
+    def _count_delivered(self, items):
+        if not items:
+            return
+        with self._condition:
+            self._stats['emitted_events_total'] += len(items)
+            self._stats['emitted_notifications_total'] += len(items)
+            if len(items) > 1:
+                self._stats['coalesced_notifications_total'] += len(items)
+
+    def _retry(self, user_id, batch, error):
+        attempt = batch['attempt'] + 1
+        with self._condition:
+            if attempt >= self.max_attempts:
+                self._stats['dead_letter_total'] += len(batch['items'])
+                self._dead_letters.append({'user_id': user_id, 'count': len(batch['items']), 'reason': str(error),
+                                           'at': datetime.utcnow().isoformat()})
+                logging.error("Failed to emit notification after %d attempts: %s", attempt, str(error))
+                return
+
+            self._stats['retries_total'] += 1
+            delay = self.backoff_seconds * (2 ** (attempt - 1))
+            pending = self._batches.get(user_id)
+            if pending:
+                # Newer notifications for the user ride along with the retry
+                pending['items'][:0] = batch['items']
+                pending['attempt'] = max(pending['attempt'], attempt)
+            else:
+                self._batches[user_id] = {'items': batch['items'], 'attempt': attempt}
+                self._push(time.monotonic() + delay, user_id)
+            self._size += len(batch['items'])
+            self._condition.notify()
+        logging.warning(f"Emit attempt {attempt} failed: {error}, retrying in {delay:.1f}s")
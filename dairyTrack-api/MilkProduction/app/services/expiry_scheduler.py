@@ -0,0 +1,259 @@
+from app.models.milk_batches import MilkBatch, MilkStatus
+from app.database.database import db
+from datetime import datetime, timedelta
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+import heapq
+import itertools
+import logging
+import threading
+
+class ExpirySchedulerConfig:
+    RESYNC_MINUTES = 60  # Reload fresh batches from the database this often
+    RETRY_SECONDS = 60  # Delay before retrying events whose processing failed
+
+# Execution option for bulk milk_batches writes that register their own changes;
+# any other bulk write makes the scheduler resync from the database
+EXPIRY_TRACKED = 'expiry_tracked'
+
+_PENDING_KEY = 'expiry_scheduler_changes'
+_RESYNC = '*'
+
+WARNING = 'warning'
+EXPIRY = 'expiry'
+
+class ExpiryScheduler:
+    """
+    Fires per-batch warning and expiry events at their exact instants instead of
+    polling. Fresh batches are loaded once into a heap keyed on (warning time,
+    expiry time); batch inserts and status or expiry changes committed by this
+    process update it, and it is reloaded every RESYNC_MINUTES to pick up changes
+    made elsewhere. A worker thread (green under the eventlet monkey patch) sleeps
+    until the next instant and runs the existing warning/expiry processing for just
+    the batches that are due. Times are naive UTC, like milk_batches.expiry_date.
+    """
+
+    def __init__(self, warning_hours=4):
+        self.warning_hours = warning_hours
+        self.app = None
+        self._condition = threading.Condition()
+        self._heap = []
+        self._batches = {}  # batch_id -> expiry_date currently scheduled
+        self._sequence = itertools.count()
+        self._worker = None
+        self._resync_requested = False
+        self._next_resync = None
+        # Optional callable; events are only processed while it returns True
+        self.leader_check = None
+        self._stats = {'resyncs': 0, 'warning_events': 0, 'expiry_events': 0, 'notifications': 0, 'failures': 0,
+                       'skipped_events': 0}
+
+    def init_app(self, app):
+        from app.services.notification import NotificationConfig
+
+        self.warning_hours = NotificationConfig.WARNING_HOURS
+        app.config.setdefault('EXPIRY_SCHEDULER_ENABLED', True)
+        app.config.setdefault('EXPIRY_RESYNC_MINUTES', ExpirySchedulerConfig.RESYNC_MINUTES)
+        self.app = app
+        app.extensions['expiry_scheduler'] = self
+
+    def start(self):
+        """Load fresh batches and start the worker (no-op if already running)"""
+        with self._condition:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._resync_requested = True
+            self._worker = threading.Thread(target=self._run, name='milk-expiry-scheduler', daemon=True)
+            self._worker.start()
+
+    def track(self, batch_id, expiry_date):
+        """Schedule (or reschedule) the warning and expiry events of a fresh batch"""
+        with self._condition:
+            self._track(batch_id, expiry_date)
+            self._condition.notify()
+
+    def forget(self, batch_id):
+        """Stop tracking a batch that is no longer fresh"""
+        with self._condition:
+            # Heap entries of forgotten batches are skipped when they come up
+            self._batches.pop(batch_id, None)
+
+    def request_resync(self):
+        with self._condition:
+            self._resync_requested = True
+            self._condition.notify()
+
+    def stage(self, session, changes):
+        """Queue [(batch_id, expiry_date or None to forget)] to apply when `session` commits"""
+        session.info.setdefault(_PENDING_KEY, []).extend(changes)
+
+    def apply(self, changes):
+        with self._condition:
+            for batch_id, expiry_date in changes:
+                if batch_id == _RESYNC:
+                    self._resync_requested = True
+                elif expiry_date is None:
+                    self._batches.pop(batch_id, None)
+                else:
+                    self._track(batch_id, expiry_date)
+            self._condition.notify()
+
+    def resync(self):
+        """Reload every fresh batch from the database; returns how many are tracked"""
+        rows = db.session.execute(
+            select(MilkBatch.id, MilkBatch.expiry_date)
+            .where(MilkBatch.status == MilkStatus.FRESH, MilkBatch.expiry_date.isnot(None))
+        ).all()
+        db.session.rollback()
+        with self._condition:
+            self._heap = []
+            self._batches = {}
+            for batch_id, expiry_date in rows:
+                self._track(batch_id, expiry_date)
+            self._stats['resyncs'] += 1
+            self._next_resync = datetime.utcnow() + timedelta(minutes=self._resync_minutes())
+            self._condition.notify()
+        logging.info("Expiry scheduler tracking %d fresh batches", len(rows))
+        return len(rows)
+
+    def status(self):
+        with self._condition:
+            upcoming = sorted(
+                (fire_at, kind, batch_id) for fire_at, _, batch_id, kind, expiry_date in self._heap
+                if self._batches.get(batch_id) == expiry_date
+            )[:10]
+            return {
+                **self._stats,
+                'tracked_batches': len(self._batches),
+                'pending_events': len(self._heap),
+                'next_resync': self._next_resync.isoformat() if self._next_resync else None,
+                'worker_alive': self._worker is not None and self._worker.is_alive(),
+                'upcoming': [{'at': fire_at.isoformat(), 'kind': kind, 'batch_id': batch_id}
+                             for fire_at, kind, batch_id in upcoming]
+            }
+
+    def _resync_minutes(self):
+        if self.app is None:
+            return ExpirySchedulerConfig.RESYNC_MINUTES
+        return self.app.config.get('EXPIRY_RESYNC_MINUTES', ExpirySchedulerConfig.RESYNC_MINUTES)
+
+    def _track(self, batch_id, expiry_date):
+        if self._batches.get(batch_id) == expiry_date:
+            return
+        self._batches[batch_id] = expiry_date
+        warning_at = expiry_date - timedelta(hours=self.warning_hours)
+        heapq.heappush(self._heap, (warning_at, next(self._sequence), batch_id, WARNING, expiry_date))
+        heapq.heappush(self._heap, (expiry_date, next(self._sequence), batch_id, EXPIRY, expiry_date))
+
+    def _pop_due(self, now):
+        """Live events due by now, grouped by kind"""
+        due = {WARNING: set(), EXPIRY: set()}
+        while self._heap and self._heap[0][0] <= now:
+            _, _, batch_id, kind, expiry_date = heapq.heappop(self._heap)
+            if self._batches.get(batch_id) != expiry_date:
+                continue  # rescheduled or no longer fresh
+            if kind == EXPIRY:
+                del self._batches[batch_id]
+                due[EXPIRY].add(batch_id)
+            elif expiry_date > now:
+                due[WARNING].add(batch_id)
+        # A batch expiring in this round needs no warning
+        due[WARNING] -= due[EXPIRY]
+        return due
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = datetime.utcnow()
+                    resync = self._resync_requested or (self._next_resync is not None and now >= self._next_resync)
+                    if resync or (self._heap and self._heap[0][0] <= now):
+                        self._resync_requested = False
+                        break
+                    deadlines = [self._heap[0][0]] if self._heap else []
+                    if self._next_resync:
+                        deadlines.append(self._next_resync)
+                    self._condition.wait((min(deadlines) - now).total_seconds() if deadlines else None)
+
+            try:
+                with self.app.app_context():
+                    if resync:
+                        self.resync()
+                    with self._condition:
+                        due = self._pop_due(datetime.utcnow())
+                    if due[WARNING] or due[EXPIRY]:
+                        self._fire(due)
+            except Exception as e:
+                logging.error(f"Expiry scheduler error: {str(e)}")
+                with self._condition:
+                    self._stats['failures'] += 1
+                    # Events popped in the failed round are rebuilt by the resync
+                    self._next_resync = datetime.utcnow() + timedelta(seconds=ExpirySchedulerConfig.RETRY_SECONDS)
+
+    def _fire(self, due):
+        from app.services.notification import emit_notifications, process_expired_batches, process_warning_batches
+
+        if self.leader_check is not None and not self.leader_check():
+            # The worker holding the scheduler lease processes these; it resyncs on takeover
+            with self._condition:
+                self._stats['skipped_events'] += len(due[WARNING]) + len(due[EXPIRY])
+            return
+
+        now = datetime.utcnow()
+        try:
+            entries = []
+            if due[EXPIRY]:
+                entries += process_expired_batches(now, batch_ids=sorted(due[EXPIRY]))
+            if due[WARNING]:
+                entries += process_warning_batches(now, batch_ids=sorted(due[WARNING]))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        # Users only hear about notifications that were committed
+        emit_notifications(entries)
+        count = len(entries)
+        with self._condition:
+            self._stats['expiry_events'] += len(due[EXPIRY])
+            self._stats['warning_events'] += len(due[WARNING])
+            self._stats['notifications'] += count
+        logging.info("Expiry scheduler: %d expired, %d warned, %d notifications",
+                     len(due[EXPIRY]), len(due[WARNING]), count)
+
+# Global expiry scheduler (started in create_app)
+expiry_scheduler = ExpiryScheduler()
+
+@event.listens_for(Session, 'after_flush')
+def _stage_flushed_batches(session, flush_context):
+    changes = []
+    for instance in list(session.new) + list(session.dirty):
+        if isinstance(instance, MilkBatch) and instance.id is not None:
+            fresh = instance.status in (MilkStatus.FRESH, None) and instance.expiry_date is not None
+            changes.append((instance.id, instance.expiry_date if fresh else None))
+    for instance in session.deleted:
+        if isinstance(instance, MilkBatch):
+            changes.append((instance.id, None))
+    if changes:
+        expiry_scheduler.stage(session, changes)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _stage_bulk_batch_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    target = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(target, 'name', None) != MilkBatch.__tablename__:
+        return
+    if not orm_execute_state.execution_options.get(EXPIRY_TRACKED):
+        expiry_scheduler.stage(orm_execute_state.session, [(_RESYNC, None)])
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed_batches(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if changes:
+        expiry_scheduler.apply(changes)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_batches(session, previous_transaction):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if changes and previous_transaction.nested:
+        session.info[_PENDING_KEY] = [(_RESYNC, None)]
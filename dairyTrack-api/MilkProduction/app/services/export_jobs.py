@@ -0,0 +1,458 @@
+from app.models.data_version import DataVersion
+from app.database.database import db
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+class ExportJobConfig:
+    """Defaults for the background export subsystem (overridable via app.config)"""
+    WORKERS = 2
+    # Maximum queued + running jobs before new submissions are rejected
+    MAX_PENDING_JOBS = 20
+    # Artifacts older than this are rendered again even if the data version matches
+    CACHE_MAX_AGE_SECONDS = 24 * 60 * 60
+    # Finished job records are forgotten after this long
+    JOB_RETENTION_SECONDS = 6 * 60 * 60
+    # Committed writes are counted in data_versions in one batch per interval
+    VERSION_BUMP_INTERVAL_SECONDS = 0.5
+    ARTIFACT_DIR = os.path.join(tempfile.gettempdir(), 'dairytrack-exports')
+
+# Report type -> view endpoint that renders it, the tables it reads and the
+# query parameters that select its content. Params outside `params` are ignored
+# so they cannot fragment the cache.
+EXPORT_REPORTS = {
+    'milking-sessions-pdf': {
+        'endpoint': 'milk_production.export_milking_sessions_pdf',
+        'tables': ['milking_sessions', 'cows', 'users'],
+        'params': []
+    },
+    'milking-sessions-excel': {
+        'endpoint': 'milk_production.export_milking_sessions_excel',
+        'tables': ['milking_sessions', 'cows', 'users'],
+        'params': ['format', 'cow_id', 'milker_id', 'start_date', 'end_date']
+    },
+    'daily-summaries-pdf': {
+        'endpoint': 'milk_production.export_daily_summaries_pdf',
+        'tables': ['daily_milk_summary', 'cows'],
+        'params': ['cow_id', 'start_date', 'end_date']
+    },
+    'daily-summaries-excel': {
+        'endpoint': 'milk_production.export_daily_summaries_excel',
+        'tables': ['daily_milk_summary', 'cows'],
+        'params': ['cow_id', 'start_date', 'end_date']
+    },
+    'cows-pdf': {
+        'endpoint': 'cow.export_cows_pdf',
+        'tables': ['cows'],
+        'params': []
+    },
+    'cows-excel': {
+        'endpoint': 'cow.export_cows_excel',
+        'tables': ['cows'],
+        'params': []
+    },
+    'users-pdf': {
+        'endpoint': 'user.export_users_pdf',
+        'tables': ['users', 'roles'],
+        'params': []
+    },
+    'users-excel': {
+        'endpoint': 'user.export_users_excel',
+        'tables': ['users', 'roles'],
+        'params': []
+    },
+    'milk-freshness-pdf': {
+        'endpoint': 'milk_freshness.export_freshness_report_pdf',
+        'tables': ['milk_batches', 'milking_sessions', 'cows'],
+        'params': [],
+        # Remaining hours are computed at render time, so keep this one short
+        'max_age': 15 * 60
+    }
+}
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+class ExportQueueFull(Exception):
+    """Raised when the export queue already holds MAX_PENDING_JOBS jobs"""
+
+# Tables whose writes change a report's data version
+VERSIONED_TABLES = frozenset(name for spec in EXPORT_REPORTS.values() for name in spec['tables'])
+
+version_table = DataVersion.__table__
+_PENDING_KEY = 'export_changed_tables'
+
+def _stage_tables(session, table_names):
+    changed = {name for name in table_names if name in VERSIONED_TABLES}
+    if changed:
+        session.info.setdefault(_PENDING_KEY, set()).update(changed)
+
+@event.listens_for(Session, 'after_flush')
+def _track_flushed_tables(session, flush_context):
+    _stage_tables(session, {getattr(type(instance), '__tablename__', None)
+                            for instance in list(session.new) + list(session.dirty) + list(session.deleted)})
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_executed_tables(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    target = getattr(orm_execute_state.statement, 'table', None)
+    _stage_tables(orm_execute_state.session, [getattr(target, 'name', None)])
+
+def _bump_versions(connection, table_names, now):
+    """version = version + 1 for each table, creating missing rows"""
+    dialect = connection.dialect.name
+    for name in sorted(table_names):
+        values = {'table_name': name, 'version': 1, 'updated_at': now}
+        bumped = {'version': version_table.c.version + 1, 'updated_at': now}
+        if dialect == 'mysql':
+            stmt = mysql_insert(version_table).values(**values)
+            connection.execute(stmt.on_duplicate_key_update(**bumped))
+        elif dialect == 'sqlite':
+            stmt = sqlite_insert(version_table).values(**values)
+            connection.execute(stmt.on_conflict_do_update(index_elements=['table_name'], set_=bumped))
+        else:
+            bump = update(version_table).where(version_table.c.table_name == name).values(**bumped)
+            if connection.execute(bump).rowcount == 0:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(insert(version_table).values(**values))
+                except IntegrityError:
+                    connection.execute(bump)
+
+class VersionBumper:
+    """
+    Counts committed writes in data_versions from a background thread, in its own
+    short transaction, so the write path never waits on the shared version rows.
+    Tables changed by any number of commits within `interval_seconds` cost one
+    bump each. A failed bump (e.g. before the migration is applied) is only
+    logged; the row markers in data_version still see inserts and deletes.
+    """
+
+    def __init__(self, interval_seconds=ExportJobConfig.VERSION_BUMP_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.app = None
+        self._pending = set()
+        self._condition = threading.Condition()
+        self._worker = None
+
+    def init_app(self, app):
+        self.app = app
+
+    def add(self, table_names):
+        if self.app is None:
+            return
+        with self._condition:
+            self._pending.update(table_names)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='export-version-bumper', daemon=True)
+                self._worker.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+            # Let commits arriving shortly after share the bump
+            time.sleep(self.interval_seconds)
+            with self._condition:
+                changed, self._pending = self._pending, set()
+            self.flush(changed)
+
+    def flush(self, changed):
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    _bump_versions(connection, changed, datetime.utcnow())
+        except SQLAlchemyError as e:
+            logging.warning(f"Could not bump data versions of {sorted(changed)}: {str(e)}")
+
+# Global data version bumper
+version_bumper = VersionBumper()
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_tables(session):
+    changed = session.info.pop(_PENDING_KEY, None)
+    if changed:
+        version_bumper.add(changed)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rolled_back_tables(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING_KEY, None)
+
+def _table_markers(connection, table_name):
+    """COUNT, MAX(id) and MAX(updated_at) (when the table has it) of a table"""
+    model_table = db.metadata.tables[table_name]
+    columns = [func.count(), func.max(model_table.c.id)]
+    if 'updated_at' in model_table.c:
+        columns.append(func.max(model_table.c.updated_at))
+    return '/'.join(str(value) for value in connection.execute(select(*columns)).one())
+
+def data_version(table_names):
+    """
+    Version string for the data a report reads from: per-table row markers, which
+    every worker computes alike, plus the data_versions counters, which also catch
+    in-place updates of tables without updated_at shortly after they commit. Read on
+    a separate connection, off the caller's transaction.
+    """
+    with db.engine.connect() as connection:
+        markers = {name: _table_markers(connection, name) for name in table_names}
+        try:
+            versions = dict(connection.execute(
+                select(version_table.c.table_name, version_table.c.version)
+                .where(version_table.c.table_name.in_(table_names))
+            ).all())
+        except SQLAlchemyError as e:
+            logging.warning(f"Could not read data versions: {str(e)}")
+            versions = {}
+    parts = [f"{name}:{markers[name]}:{versions.get(name, 0)}" for name in table_names]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+def normalize_params(report_type, params):
+    """Keep only the params the report understands, as sorted string pairs"""
+    allowed = EXPORT_REPORTS[report_type]['params']
+    return {key: str(params[key]) for key in sorted(allowed) if params.get(key) not in (None, '')}
+
+def artifact_key(report_type, params, version):
+    """Cache key for (report type, filter params, data version)"""
+    payload = json.dumps([report_type, params, version], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ExportJobManager:
+    """
+    Runs report exports on a bounded worker pool and caches the rendered files
+    on disk. Reports are rendered by the existing export views, so the output is
+    identical to the synchronous routes. Job records are written next to the
+    artifacts so that any worker process sharing the directory can answer
+    status and download requests.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """Bind the manager to the Flask app and create the artifact directory"""
+        self.app = app
+        app.config.setdefault('EXPORT_JOB_WORKERS', ExportJobConfig.WORKERS)
+        app.config.setdefault('EXPORT_MAX_PENDING_JOBS', ExportJobConfig.MAX_PENDING_JOBS)
+        app.config.setdefault('EXPORT_CACHE_MAX_AGE', ExportJobConfig.CACHE_MAX_AGE_SECONDS)
+        app.config.setdefault('EXPORT_ARTIFACT_DIR', ExportJobConfig.ARTIFACT_DIR)
+        os.makedirs(self._jobs_dir(), exist_ok=True)
+        version_bumper.init_app(app)
+        app.extensions['export_jobs'] = self
+
+    @property
+    def artifact_dir(self):
+        return self.app.config['EXPORT_ARTIFACT_DIR']
+
+    def _jobs_dir(self):
+        return os.path.join(self.artifact_dir, 'jobs')
+
+    def _artifact_path(self, key):
+        return os.path.join(self.artifact_dir, f"{key}.bin")
+
+    def _meta_path(self, key):
+        return os.path.join(self.artifact_dir, f"{key}.json")
+
+    def _job_path(self, job_id):
+        return os.path.join(self._jobs_dir(), f"{job_id}.json")
+
+    def _ensure_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.app.config['EXPORT_JOB_WORKERS'],
+                thread_name_prefix='export-job'
+            )
+        return self._executor
+
+    def submit(self, report_type, params):
+        """
+        Submit an export job. Returns the job record; if a fresh artifact for the
+        same report, params and data version exists the job is done immediately.
+        """
+        if report_type not in EXPORT_REPORTS:
+            raise KeyError(report_type)
+
+        params = normalize_params(report_type, params)
+        version = data_version(EXPORT_REPORTS[report_type]['tables'])
+        key = artifact_key(report_type, params, version)
+        now = datetime.utcnow().isoformat()
+
+        job = {
+            'job_id': uuid.uuid4().hex,
+            'report_type': report_type,
+            'params': params,
+            'data_version': version,
+            'artifact_key': key,
+            'status': JOB_QUEUED,
+            'cached': False,
+            'error': None,
+            'filename': None,
+            'mimetype': None,
+            'size': None,
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None
+        }
+
+        meta = self._cached_artifact(report_type, key)
+        if meta:
+            job.update(status=JOB_DONE, cached=True, finished_at=now,
+                       filename=meta['filename'], mimetype=meta['mimetype'], size=meta['size'])
+            self._save_job(job)
+            return job
+
+        with self._lock:
+            self._prune_jobs()
+            pending = sum(1 for existing in self._jobs.values()
+                          if existing['status'] in (JOB_QUEUED, JOB_RUNNING))
+            if pending >= self.app.config['EXPORT_MAX_PENDING_JOBS']:
+                raise ExportQueueFull("Antrian ekspor penuh, coba lagi nanti")
+
+            # Identical job already queued or running: share it
+            for existing in self._jobs.values():
+                if existing['artifact_key'] == key and existing['status'] in (JOB_QUEUED, JOB_RUNNING):
+                    return dict(existing)
+
+            self._jobs[job['job_id']] = job
+        self._save_job(job)
+        self._ensure_executor().submit(self._run, job['job_id'])
+        return dict(job)
+
+    def get(self, job_id):
+        """Job record from memory, or from disk when another worker created it"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        try:
+            with open(self._job_path(job_id)) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def artifact_file(self, job):
+        """Path of a finished job's artifact, or None if it is not available"""
+        if job.get('status') != JOB_DONE:
+            return None
+        path = self._artifact_path(job['artifact_key'])
+        return path if os.path.exists(path) else None
+
+    def metrics(self):
+        """Counts of jobs by status in this process"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return {
+            'jobs': counts,
+            'workers': self.app.config['EXPORT_JOB_WORKERS'],
+            'max_pending_jobs': self.app.config['EXPORT_MAX_PENDING_JOBS']
+        }
+
+    def _cached_artifact(self, report_type, key):
+        max_age = EXPORT_REPORTS[report_type].get('max_age', self.app.config['EXPORT_CACHE_MAX_AGE'])
+        try:
+            with open(self._meta_path(key)) as handle:
+                meta = json.load(handle)
+            if time.time() - os.path.getmtime(self._artifact_path(key)) > max_age:
+                return None
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def _update(self, job_id, **changes):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(changes)
+            snapshot = dict(job)
+        self._save_job(snapshot)
+        return snapshot
+
+    def _save_job(self, job):
+        path = self._job_path(job['job_id'])
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w') as handle:
+                json.dump(job, handle)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not persist export job {job['job_id']}: {str(e)}")
+
+    def _prune_jobs(self):
+        cutoff = time.time() - ExportJobConfig.JOB_RETENTION_SECONDS
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['status'] in (JOB_DONE, JOB_FAILED) and job['finished_at']
+                   and datetime.fromisoformat(job['finished_at']).timestamp() < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+            try:
+                os.remove(self._job_path(job_id))
+            except OSError:
+                pass
+
+    def _run(self, job_id):
+        job = self._update(job_id, status=JOB_RUNNING, started_at=datetime.utcnow().isoformat())
+        spec = EXPORT_REPORTS[job['report_type']]
+        start_time = time.perf_counter()
+        try:
+            filename, mimetype, size = self._render(spec['endpoint'], job['params'], job['artifact_key'])
+            self._update(job_id, status=JOB_DONE, filename=filename, mimetype=mimetype, size=size,
+                         finished_at=datetime.utcnow().isoformat())
+            logging.info(f"Export job {job_id} ({job['report_type']}) finished in "
+                         f"{time.perf_counter() - start_time:.2f}s")
+        except Exception as e:
+            logging.error(f"Export job {job_id} ({job['report_type']}) failed: {str(e)}")
+            self._update(job_id, status=JOB_FAILED, error=str(e), finished_at=datetime.utcnow().isoformat())
+
+    def _render(self, endpoint, params, key):
+        """Call the export view in a synthetic request and store its body on disk"""
+        view = self.app.view_functions[endpoint]
+        with self.app.test_request_context(query_string=params):
+            try:
+                response = self.app.make_response(view())
+                if response.status_code != 200:
+                    body = response.get_json(silent=True) or {}
+                    raise RuntimeError(body.get('error') or f"Export returned HTTP {response.status_code}")
+
+                artifact_path = self._artifact_path(key)
+                tmp_path = f"{artifact_path}.{uuid.uuid4().hex}.tmp"
+                response.direct_passthrough = False
+                size = 0
+                with open(tmp_path, 'wb') as handle:
+                    for chunk in response.iter_encoded():
+                        handle.write(chunk)
+                        size += len(chunk)
+                response.close()
+                os.replace(tmp_path, artifact_path)
+            finally:
+                db.session.remove()
+
+        disposition = response.headers.get('Content-Disposition', '')
+        filename = disposition.split('filename=')[-1].strip('"') if 'filename=' in disposition else f"{key}.bin"
+        meta = {'filename': filename, 'mimetype': response.mimetype, 'size': size}
+        with open(self._meta_path(key), 'w') as handle:
+            json.dump(meta, handle)
+        return filename, response.mimetype, size
+
+# Global export job manager
+export_jobs = ExportJobManager()
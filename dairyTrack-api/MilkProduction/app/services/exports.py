@@ -0,0 +1,174 @@
+from app.models.milking_sessions import MilkingSession
+from app.models.cows import Cow
+from app.models.users import User
+from app.database.database import db
+from app.services.milk_summary import session_period
+from datetime import timedelta
+from flask import Response, stream_with_context
+from itertools import chain, islice
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from sqlalchemy import select
+import csv
+import io
+import json
+import tempfile
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_FETCH_SIZE = 1000
+# Rows inspected to estimate Excel column widths
+WIDTH_SAMPLE_SIZE = 200
+# Rows buffered before a CSV/NDJSON chunk is sent
+TEXT_CHUNK_ROWS = 500
+# Bytes per chunk when streaming a finished workbook
+FILE_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson')
+}
+
+SESSION_PERIOD_LABELS = {'morning': 'Pagi', 'afternoon': 'Siang', 'evening': 'Sore'}
+
+MILKING_SESSION_HEADERS = ["NO", "Cow", "Milker", "Session", "Volume", "Milking Time"]
+
+# Styles are built once and shared by every export
+HEADER_FILL = PatternFill(start_color="ADD8E6", end_color="ADD8E6", fill_type="solid")
+HEADER_FONT = Font(bold=True)
+
+def milking_session_export_rows(cow_id=None, milker_id=None, start_date=None, end_date=None):
+    """
+    Yield milking session export rows streamed from a server-side cursor, with cow and
+    milker names joined in SQL. Rows follow MILKING_SESSION_HEADERS.
+    """
+    query = (
+        select(
+            MilkingSession.cow_id,
+            Cow.name.label('cow_name'),
+            MilkingSession.milker_id,
+            User.name.label('milker_name'),
+            MilkingSession.volume,
+            MilkingSession.milking_time
+        )
+        .outerjoin(Cow, Cow.id == MilkingSession.cow_id)
+        .outerjoin(User, User.id == MilkingSession.milker_id)
+        .order_by(MilkingSession.id)
+        .execution_options(yield_per=EXPORT_FETCH_SIZE)
+    )
+    if cow_id:
+        query = query.where(MilkingSession.cow_id == cow_id)
+    if milker_id:
+        query = query.where(MilkingSession.milker_id == milker_id)
+    if start_date:
+        query = query.where(MilkingSession.milking_time >= start_date)
+    if end_date:
+        query = query.where(MilkingSession.milking_time < end_date + timedelta(days=1))
+
+    result = db.session.execute(query)
+    try:
+        for idx, row in enumerate(result, start=1):
+            yield (
+                idx,
+                f"{row.cow_id} - {row.cow_name}" if row.cow_name else str(row.cow_id),
+                f"{row.milker_id} - {row.milker_name}" if row.milker_name else str(row.milker_id),
+                SESSION_PERIOD_LABELS[session_period(row.milking_time)],
+                row.volume,
+                row.milking_time.strftime('%Y-%m-%d %H:%M')
+            )
+    finally:
+        result.close()
+
+def estimate_column_widths(headers, sample_rows):
+    """Column widths from the header and a sample of rows instead of every cell"""
+    widths = [len(str(header)) for header in headers]
+    for row in sample_rows:
+        for index, value in enumerate(row):
+            if value is not None:
+                widths[index] = max(widths[index], len(str(value)))
+    return [width + 2 for width in widths]
+
+def write_xlsx(headers, rows, target, sheet_name):
+    """
+    Write rows into a write-only openpyxl workbook saved to `target`.
+    Worksheet rows are spooled to disk as they are appended, so memory stays flat.
+    """
+    rows = iter(rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_SIZE))
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title=sheet_name)
+    for index, width in enumerate(estimate_column_widths(headers, sample), start=1):
+        worksheet.column_dimensions[get_column_letter(index)].width = width
+
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(worksheet, value=header)
+        cell.fill = HEADER_FILL
+        cell.font = HEADER_FONT
+        header_cells.append(cell)
+    worksheet.append(header_cells)
+
+    for row in chain(sample, rows):
+        worksheet.append(list(row))
+
+    workbook.save(target)
+
+def iter_xlsx(headers, rows, sheet_name):
+    """
+    Build the workbook in a temporary file and yield it in chunks. An xlsx file is
+    a zip archive that is only valid once complete, so nothing is sent until every
+    row has been written: memory stays flat, but the first byte waits for the whole
+    export. CSV and NDJSON stream as rows are read.
+    """
+    with tempfile.TemporaryFile() as target:
+        write_xlsx(headers, rows, target, sheet_name)
+        target.seek(0)
+        while True:
+            chunk = target.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def iter_csv(headers, rows):
+    """Yield CSV text in chunks of TEXT_CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % TEXT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def iter_ndjson(headers, rows):
+    """Yield one JSON object per line, keyed by the headers"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(headers, row)), default=str))
+        if len(lines) >= TEXT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def iter_export(export_format, headers, rows, sheet_name):
+    """Chunk generator for one of EXPORT_FORMATS"""
+    if export_format == 'csv':
+        return iter_csv(headers, rows)
+    if export_format == 'ndjson':
+        return iter_ndjson(headers, rows)
+    return iter_xlsx(headers, rows, sheet_name)
+
+def streamed_export_response(export_format, headers, rows, filename, sheet_name):
+    """Flask response that streams an export as it is produced"""
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(
+        stream_with_context(iter_export(export_format, headers, rows, sheet_name)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}.{extension}"'}
+    )
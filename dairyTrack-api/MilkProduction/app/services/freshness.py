@@ -0,0 +1,172 @@
+from app.models.milk_batches import MilkBatch, MilkStatus
+from app.models.milking_sessions import MilkingSession
+from app.models.cows import Cow
+from app.models.users import User
+from app.database.database import db
+from datetime import timedelta
+from sqlalchemy import and_, case, func, or_, select
+import numpy as np
+
+SHELF_LIFE_HOURS = 8
+CRITICAL_HOURS = 2  # Kritis (25% dari shelf life 8 jam)
+WARNING_HOURS = 4  # Peringatan (50% dari shelf life 8 jam)
+
+FRESHNESS_BUCKETS = ['expired', 'critical', 'warning', 'fresh', 'unknown']
+
+def freshness_bucket(now):
+    """
+    SQL CASE putting a batch in a FRESHNESS_BUCKETS bucket. Compares the stored
+    timestamps with bounds computed once in Python, so no date arithmetic runs per
+    row and the (status, expiry_date) index stays usable. Batches without an
+    expiry date fall back to production_date + SHELF_LIFE_HOURS.
+    """
+    shelf_life = timedelta(hours=SHELF_LIFE_HOURS)
+    return case(
+        (MilkBatch.expiry_date.isnot(None), case(
+            (MilkBatch.expiry_date <= now, 'expired'),
+            (MilkBatch.expiry_date < now + timedelta(hours=CRITICAL_HOURS), 'critical'),
+            (MilkBatch.expiry_date < now + timedelta(hours=WARNING_HOURS), 'warning'),
+            else_='fresh'
+        )),
+        (MilkBatch.production_date.isnot(None), case(
+            (MilkBatch.production_date <= now - shelf_life, 'expired'),
+            (MilkBatch.production_date < now - shelf_life + timedelta(hours=CRITICAL_HOURS), 'critical'),
+            (MilkBatch.production_date < now - shelf_life + timedelta(hours=WARNING_HOURS), 'warning'),
+            else_='fresh'
+        )),
+        else_='unknown'
+    )
+
+def expiring_within(now, hours):
+    """Fresh batches whose (estimated) expiry is before now + hours; index friendly"""
+    return and_(
+        MilkBatch.status == MilkStatus.FRESH,
+        or_(
+            MilkBatch.expiry_date < now + timedelta(hours=hours),
+            and_(MilkBatch.expiry_date.is_(None),
+                 MilkBatch.production_date < now - timedelta(hours=SHELF_LIFE_HOURS - hours))
+        )
+    )
+
+def freshness_stats(now):
+    """
+    Batch count and volume per status, fresh batches per freshness bucket and the
+    fresh batches expiring within CRITICAL_HOURS, from one grouped query.
+    """
+    bucket = freshness_bucket(now).label('bucket')
+    critical = and_(MilkBatch.status == MilkStatus.FRESH,
+                    MilkBatch.expiry_date < now + timedelta(hours=CRITICAL_HOURS))
+    rows = db.session.execute(
+        select(
+            MilkBatch.status,
+            bucket,
+            func.count(MilkBatch.id).label('count'),
+            func.coalesce(func.sum(MilkBatch.total_volume), 0).label('volume'),
+            func.coalesce(func.sum(case((critical, 1), else_=0)), 0).label('critical_count'),
+            func.coalesce(func.sum(case((critical, MilkBatch.total_volume), else_=0)), 0).label('critical_volume')
+        ).group_by(MilkBatch.status, bucket)
+    ).all()
+
+    by_status = {}
+    buckets = {name: {'batch_count': 0, 'total_volume': 0.0} for name in FRESHNESS_BUCKETS}
+    critical_totals = {'batch_count': 0, 'total_volume': 0.0}
+    for row in rows:
+        status = row.status.name if isinstance(row.status, MilkStatus) else row.status
+        entry = by_status.setdefault(status, {'batch_count': 0, 'total_volume': 0.0})
+        entry['batch_count'] += row.count
+        entry['total_volume'] += float(row.volume)
+        if row.status == MilkStatus.FRESH:
+            buckets[row.bucket]['batch_count'] += row.count
+            buckets[row.bucket]['total_volume'] += float(row.volume)
+        critical_totals['batch_count'] += int(row.critical_count)
+        critical_totals['total_volume'] += float(row.critical_volume)
+    return by_status, buckets, critical_totals
+
+def batch_query(*criteria):
+    """
+    Batches matching `criteria`, one row per batch ordered by expiry date, with
+    session_count and cow_count from a grouped subquery over milking_sessions
+    (joining sessions directly would repeat each batch and its volume per session).
+    """
+    sessions = select(
+        MilkingSession.milk_batch_id.label('batch_id'),
+        func.count(MilkingSession.id).label('session_count'),
+        func.count(func.distinct(MilkingSession.cow_id)).label('cow_count')
+    ).group_by(MilkingSession.milk_batch_id).subquery()
+    query = select(
+        MilkBatch.id, MilkBatch.batch_number, MilkBatch.total_volume, MilkBatch.status,
+        MilkBatch.production_date, MilkBatch.expiry_date,
+        func.coalesce(sessions.c.session_count, 0).label('session_count'),
+        func.coalesce(sessions.c.cow_count, 0).label('cow_count')
+    ).outerjoin(sessions, sessions.c.batch_id == MilkBatch.id)
+    return query.where(*criteria).order_by(MilkBatch.expiry_date, MilkBatch.id)
+
+def batch_rows(*criteria):
+    """Rows of batch_query(*criteria)"""
+    return db.session.execute(batch_query(*criteria)).all()
+
+def batch_contributors(*criteria):
+    """
+    Cows and milkers that contributed to the batches matching `criteria`, from one
+    query grouped by batch, cow and milker: {batch_id: {'cows': [...], 'milkers': [...]}}
+    with session count and volume per contributor, largest volume first.
+    """
+    rows = db.session.execute(
+        select(
+            MilkingSession.milk_batch_id.label('batch_id'),
+            MilkingSession.cow_id, Cow.name.label('cow_name'),
+            MilkingSession.milker_id, User.name.label('milker_name'),
+            func.count(MilkingSession.id).label('sessions'),
+            func.coalesce(func.sum(MilkingSession.volume), 0).label('volume')
+        )
+        .join(MilkBatch, MilkBatch.id == MilkingSession.milk_batch_id)
+        .outerjoin(Cow, Cow.id == MilkingSession.cow_id)
+        .outerjoin(User, User.id == MilkingSession.milker_id)
+        .where(*criteria)
+        .group_by(MilkingSession.milk_batch_id, MilkingSession.cow_id, Cow.name,
+                  MilkingSession.milker_id, User.name)
+    ).all()
+
+    grouped = {}
+    for row in rows:
+        entry = grouped.setdefault(row.batch_id, {'cows': {}, 'milkers': {}})
+        for key, item_id, name in (('cows', row.cow_id, row.cow_name), ('milkers', row.milker_id, row.milker_name)):
+            item = entry[key].setdefault(item_id, {'id': item_id, 'name': name, 'session_count': 0, 'volume': 0.0})
+            item['session_count'] += row.sessions
+            item['volume'] += float(row.volume)
+    return {
+        batch_id: {key: sorted(items.values(), key=lambda item: -item['volume']) for key, items in entry.items()}
+        for batch_id, entry in grouped.items()
+    }
+
+def freshness_metrics(rows, now):
+    """
+    Vectorized hours left, freshness percentage and status for rows with status,
+    expiry_date and production_date. Returns (hours_left, percentage, status,
+    effective_expiry) arrays; NaN/None where unknown.
+    """
+    count = len(rows)
+    expiry = np.array([row.expiry_date or (row.production_date + timedelta(hours=SHELF_LIFE_HOURS)
+                                           if row.production_date else None)
+                       for row in rows], dtype='datetime64[us]') if count else np.array([], dtype='datetime64[us]')
+    statuses = np.array([row.status.name if isinstance(row.status, MilkStatus) else str(row.status).upper()
+                         for row in rows], dtype=object)
+
+    hours_left = (expiry - np.datetime64(now, 'us')) / np.timedelta64(1, 'h')
+    hours_left = np.clip(hours_left, 0, None)
+    # Expired batches have none left; used batches are not tracked
+    hours_left = np.where(statuses == MilkStatus.EXPIRED.name, 0.0, hours_left)
+    hours_left = np.where(statuses == MilkStatus.USED.name, np.nan, hours_left)
+    percentage = np.clip(hours_left / SHELF_LIFE_HOURS * 100, 0, 100)
+
+    known = ~np.isnan(hours_left)
+    status = np.select(
+        [~known, hours_left <= 0, hours_left < CRITICAL_HOURS, hours_left < WARNING_HOURS],
+        ['unknown', 'expired', 'critical', 'warning'],
+        default='fresh'
+    )
+    return hours_left, percentage, status, expiry
+
+def rounded(value):
+    """Round a NumPy float to one decimal, or None for NaN"""
+    return None if np.isnan(value) else round(float(value), 1)
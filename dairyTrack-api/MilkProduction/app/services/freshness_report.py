@@ -0,0 +1,185 @@
+from app.models.milk_batches import MilkBatch, MilkStatus
+from app.database.database import db
+from app.services.export_jobs import EXPORT_REPORTS, data_version
+from app.services.exports import EXPORT_FETCH_SIZE, FILE_CHUNK_SIZE
+from app.services.freshness import SHELF_LIFE_HOURS, batch_contributors, batch_query, freshness_metrics
+from datetime import datetime, timedelta
+from fpdf import FPDF
+import io
+import logging
+import threading
+import time
+
+REPORT_FILENAME = "milk_freshness_report.pdf"
+# Tables the report reads; a write to any of them changes the data version
+REPORT_TABLES = EXPORT_REPORTS['milk-freshness-pdf']['tables']
+# Freshness colours move with the clock, so a cached report is also rebuilt after this
+REPORT_CACHE_SECONDS = EXPORT_REPORTS['milk-freshness-pdf']['max_age']
+
+ROW_HEIGHT = 10
+
+# Table layout and colours are built once and shared by every page and report:
+# (header, width, alignment)
+REPORT_COLUMNS = [
+    ("NO", 15, 'C'),
+    ("Batch", 30, 'L'),
+    ("Sapi", 35, 'L'),
+    ("Volume (L)", 30, 'R'),
+    ("Tanggal Produksi", 40, 'L'),
+    ("Kedaluarsa", 40, 'L')
+]
+HEADER_FILL_COLOR = (173, 216, 230)  # Light blue
+FRESHNESS_FILL_COLORS = {
+    "expired": (255, 150, 150),  # Light red for expired
+    "critical": (255, 200, 200),  # Light red for critical
+    "warning": (255, 255, 200),  # Light yellow for warning
+    "fresh": (255, 255, 255),  # White for fresh
+    "unknown": (220, 220, 220)  # Gray for unknown
+}
+
+def cow_label(contributors):
+    """Top contributing cow, plus how many others, for the report's single cow column"""
+    cows = contributors["cows"] if contributors else []
+    if not cows:
+        return "Unknown"
+    name = cows[0]["name"] or "Unknown"
+    return f"{name} +{len(cows) - 1}" if len(cows) > 1 else name
+
+def freshness_report_rows(now=None):
+    """
+    Yield (cells, freshness status) per fresh batch, ordered by expiry date. Batches
+    are read from a server-side cursor and their freshness computed per fetched chunk.
+    """
+    now = now or datetime.utcnow()
+    criteria = (MilkBatch.status == MilkStatus.FRESH,)
+    contributors = batch_contributors(*criteria)
+    result = db.session.execute(batch_query(*criteria).execution_options(yield_per=EXPORT_FETCH_SIZE))
+    try:
+        idx = 0
+        for chunk in result.partitions():
+            _, _, freshness, _ = freshness_metrics(chunk, now)
+            for row, status in zip(chunk, freshness):
+                idx += 1
+                # Display estimated expiry if no expiry date
+                expiry = row.expiry_date
+                if not expiry and row.production_date:
+                    expiry = row.production_date + timedelta(hours=SHELF_LIFE_HOURS)
+                yield (
+                    str(idx),
+                    row.batch_number,
+                    cow_label(contributors.get(row.id)),
+                    f"{row.total_volume:.1f}",
+                    row.production_date.strftime('%Y-%m-%d %H:%M') if row.production_date else "-",
+                    expiry.strftime('%Y-%m-%d %H:%M') if expiry else "Tidak diketahui"
+                ), str(status)
+    finally:
+        result.close()
+
+def _table_header(pdf):
+    pdf.set_fill_color(*HEADER_FILL_COLOR)
+    pdf.set_font("Arial", style="B", size=10)
+    for title, width, _ in REPORT_COLUMNS:
+        pdf.cell(width, ROW_HEIGHT, title, border=1, align='C', fill=True)
+    pdf.ln()
+    pdf.set_font("Arial", size=10)
+
+def render_freshness_report(rows, target, generated_at=None):
+    """
+    Write the report to the binary file `target`. Pages are filled one at a time:
+    each takes as many rows from the iterator as fit below its table header, so no
+    per-cell page-break checks are needed. Rows are read lazily, but fpdf2 keeps
+    the whole document in memory until pdf.output(), so peak memory grows with the
+    number of batches and nothing reaches `target` before the last page is done.
+    """
+    generated_at = generated_at or datetime.now()
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=False)
+
+    rows = iter(rows)
+    pending = next(rows, None)
+    first_page = True
+    while first_page or pending is not None:
+        pdf.add_page()
+        if first_page:
+            pdf.set_font("Arial", style="B", size=16)
+            pdf.cell(200, 10, txt="Laporan Kesegaran Susu", ln=True, align='C')
+            pdf.ln(5)
+            pdf.set_font("Arial", size=10)
+            pdf.cell(200, 10, txt=f"Tanggal Laporan: {generated_at.strftime('%Y-%m-%d %H:%M:%S')}", ln=True, align='C')
+            pdf.ln(10)
+            first_page = False
+        _table_header(pdf)
+
+        capacity = int((pdf.h - pdf.b_margin - pdf.get_y()) // ROW_HEIGHT)
+        for _ in range(capacity):
+            if pending is None:
+                break
+            cells, status = pending
+            pdf.set_fill_color(*FRESHNESS_FILL_COLORS[status])
+            for value, (_, width, align) in zip(cells, REPORT_COLUMNS):
+                pdf.cell(width, ROW_HEIGHT, value, border=1, align=align, fill=True)
+            pdf.ln()
+            pending = next(rows, None)
+
+    pdf.output(target)
+
+def iter_file(handle):
+    """Yield an open binary file from the start in chunks, closing it at the end"""
+    try:
+        handle.seek(0)
+        while True:
+            chunk = handle.read(FILE_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        handle.close()
+
+class FreshnessReportCache:
+    """
+    Last rendered report, keyed on the data version of REPORT_TABLES and kept for
+    at most REPORT_CACHE_SECONDS. Concurrent requests for a missing version wait
+    for a single render instead of each building the same document. The document
+    is held in memory as bytes, one per process.
+    """
+
+    def __init__(self, max_age=REPORT_CACHE_SECONDS):
+        self.max_age = max_age
+        self._entry = None  # (version, rendered_at monotonic, pdf bytes)
+        self._lock = threading.Lock()
+        self._render_lock = threading.Lock()
+
+    def _lookup(self, version):
+        with self._lock:
+            entry = self._entry
+        if entry and entry[0] == version and time.monotonic() - entry[1] <= self.max_age:
+            return entry[2]
+        return None
+
+    def get(self):
+        """(pdf bytes, data version, cached) for the current batch data"""
+        version = data_version(REPORT_TABLES)
+        document = self._lookup(version)
+        if document is not None:
+            return document, version, True
+
+        with self._render_lock:
+            document = self._lookup(version)
+            if document is not None:
+                return document, version, True
+            started = time.perf_counter()
+            target = io.BytesIO()
+            render_freshness_report(freshness_report_rows(), target)
+            document = target.getvalue()
+            with self._lock:
+                self._entry = (version, time.monotonic(), document)
+            logging.info("Freshness report %s rendered in %.2fs (%d bytes)",
+                         version, time.perf_counter() - started, len(document))
+        return document, version, False
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+
+# Global cached freshness report
+freshness_report_cache = FreshnessReportCache()
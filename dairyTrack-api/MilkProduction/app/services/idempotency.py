@@ -0,0 +1,85 @@
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+
+# How long a replayable response is kept in memory
+IDEMPOTENCY_TTL_SECONDS = 10 * 60
+# Maximum cached responses per process (least recently used are evicted first)
+IDEMPOTENCY_CACHE_SIZE = 10000
+# Must match the length of milking_sessions.idempotency_key
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+class IdempotencyCache:
+    """
+    Short-lived, per-process LRU of responses already produced for an idempotency
+    key, so that client retries are answered without touching the database.
+    The unique index on the stored key stays the source of truth across processes.
+    """
+
+    def __init__(self, ttl_seconds=IDEMPOTENCY_TTL_SECONDS, max_entries=IDEMPOTENCY_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached (body, status_code, request fingerprint) for the key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, body, status_code, fingerprint = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return body, status_code, fingerprint
+
+    def set(self, key, body, status_code, fingerprint=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, body, status_code, fingerprint)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        """Forget the key, e.g. once the resource it created is deleted"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def normalize_idempotency_key(value):
+    """Strip and validate a client supplied key; returns None when absent"""
+    if value is None:
+        return None
+    key = str(value).strip()
+    if not key:
+        return None
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise ValueError(f"Idempotency key must be at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+    return key
+
+def request_fingerprint(payload):
+    """
+    SHA-256 of a request body without its idempotency key, stored with the key so
+    that reusing the key for a different request can be rejected
+    """
+    if isinstance(payload, dict):
+        payload = {field: value for field, value in payload.items() if field != 'idempotency_key'}
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def fingerprint_matches(stored, fingerprint):
+    """Keys stored before fingerprints were recorded cannot be checked and are accepted"""
+    return stored is None or stored == fingerprint
+
+# Global cache for milking session creation
+session_idempotency_cache = IdempotencyCache()
@@ -0,0 +1,369 @@
+from app.models.scheduler_lease import SchedulerLease
+from app.models.scheduler_job_run import SchedulerJobRun
+from app.database.database import db
+from app.socket.presence import current_worker_id
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from datetime import datetime, timedelta
+from sqlalchemy import case, column, delete, func, insert, or_, select, table, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+import atexit
+import logging
+import threading
+import time
+
+class JobSchedulerConfig:
+    """Defaults for the scheduled jobs subsystem (overridable via app.config)"""
+    LEASE_NAME = 'scheduler'
+    # A leader that stops renewing is replaced after this long
+    LEASE_SECONDS = 30
+    # How often every worker renews (leader) or tries to take (others) the lease
+    RENEW_SECONDS = 10
+    # Runs missed while no worker held the lease are still made (once) within this window
+    MISFIRE_GRACE_SECONDS = 15 * 60
+    # Run history kept per job
+    HISTORY_DAYS = 30
+    JOBS_TABLE = 'scheduler_jobs'
+
+TRIGGERS = {
+    'interval': IntervalTrigger,
+    'cron': CronTrigger,
+    'date': DateTrigger
+}
+
+RUN_RUNNING = 'running'
+RUN_SUCCESS = 'success'
+RUN_FAILED = 'failed'
+
+lease_table = SchedulerLease.__table__
+runs_table = SchedulerJobRun.__table__
+
+def run_job(job_id):
+    """Entry point stored in the job store; resolves the job in this process"""
+    job_scheduler.run(job_id)
+
+class JobScheduler:
+    """
+    Runs the app's scheduled jobs in exactly one worker process. Every process
+    competes for a lease row in scheduler_leases: the holder renews it every
+    RENEW_SECONDS and runs an APScheduler BackgroundScheduler whose jobs (and next
+    run times) are persisted in the application database, so a worker taking over
+    after a crash or restart continues the schedule instead of starting it again.
+    Other processes keep their scheduler paused. Each run is recorded in
+    scheduler_job_runs with the worker that ran it and its duration. Lease times use
+    the workers' clocks (naive UTC), so these must be kept in sync.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.worker_id = current_worker_id()
+        self._jobs = {}  # job_id -> (func, trigger)
+        self._listeners = []
+        self._scheduler = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._leader = False
+        self._lease_until = None
+        self._stats = {'elections_won': 0, 'elections_lost': 0, 'runs': 0, 'failures': 0, 'skipped_runs': 0}
+
+    def init_app(self, app):
+        app.config.setdefault('SCHEDULER_ENABLED', True)
+        app.config.setdefault('SCHEDULER_LEASE_SECONDS', JobSchedulerConfig.LEASE_SECONDS)
+        app.config.setdefault('SCHEDULER_RENEW_SECONDS', JobSchedulerConfig.RENEW_SECONDS)
+        app.config.setdefault('SCHEDULER_MISFIRE_GRACE_SECONDS', JobSchedulerConfig.MISFIRE_GRACE_SECONDS)
+        app.config.setdefault('SCHEDULER_HISTORY_DAYS', JobSchedulerConfig.HISTORY_DAYS)
+        self.app = app
+        app.extensions['job_scheduler'] = self
+
+    def register(self, job_id, func, trigger, **trigger_args):
+        """
+        Schedule `func` (called in an app context) under `job_id` with an APScheduler
+        trigger ('interval', 'cron' or 'date'). Every process registers the same jobs;
+        the leader writes them to the job store.
+        """
+        self._jobs[job_id] = (func, TRIGGERS[trigger](**trigger_args))
+
+    def add_leadership_listener(self, callback):
+        """Call `callback()` whenever this process becomes the leader"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def start(self):
+        """Start competing for the lease (no-op if already running)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run_election, name='job-scheduler-lease', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop running jobs and release the lease so another worker takes over at once"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        if self._scheduler is not None and self._scheduler.running:
+            self._scheduler.shutdown(wait=False)
+        self._scheduler = None
+        if self._leader and self.app is not None:
+            try:
+                with self.app.app_context():
+                    self._release_lease()
+            except Exception as e:
+                logging.warning(f"Could not release scheduler lease: {str(e)}")
+        with self._lock:
+            self._leader = False
+            self._lease_until = None
+
+    def is_leader(self):
+        """Whether this process holds an unexpired lease (no database round trip)"""
+        with self._lock:
+            return self._leader and self._lease_until is not None and datetime.utcnow() < self._lease_until
+
+    def _setting(self, name, default):
+        if self.app is None:
+            return default
+        return self.app.config.get(name, default)
+
+    def _run_election(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self._set_leader(self._acquire_lease())
+            except Exception as e:
+                logging.error(f"Scheduler lease error: {str(e)}")
+                self._set_leader(False)
+            self._stop.wait(self._setting('SCHEDULER_RENEW_SECONDS', JobSchedulerConfig.RENEW_SECONDS))
+
+    def _acquire_lease(self):
+        """Take or renew the lease; returns True when this process holds it"""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self._setting('SCHEDULER_LEASE_SECONDS', JobSchedulerConfig.LEASE_SECONDS))
+        # A separate connection commits at once, independent of any request transaction
+        with db.engine.begin() as connection:
+            if not self._leader:
+                self._ensure_lease_row(connection)
+            result = connection.execute(
+                update(lease_table)
+                .where(
+                    lease_table.c.name == JobSchedulerConfig.LEASE_NAME,
+                    or_(lease_table.c.holder == self.worker_id,
+                        lease_table.c.holder.is_(None),
+                        lease_table.c.expires_at < now)
+                )
+                # acquired_at first: MySQL evaluates SET assignments left to right
+                .ordered_values(
+                    (lease_table.c.acquired_at,
+                     case((lease_table.c.holder == self.worker_id, lease_table.c.acquired_at), else_=now)),
+                    (lease_table.c.holder, self.worker_id),
+                    (lease_table.c.expires_at, expires_at)
+                )
+            )
+        if result.rowcount == 1:
+            with self._lock:
+                self._lease_until = expires_at
+            return True
+        return False
+
+    def _ensure_lease_row(self, connection):
+        values = {'name': JobSchedulerConfig.LEASE_NAME, 'holder': None, 'expires_at': datetime(1970, 1, 1)}
+        dialect = connection.dialect.name
+        if dialect == 'mysql':
+            stmt = mysql_insert(lease_table).values(**values)
+            connection.execute(stmt.on_duplicate_key_update(name=stmt.inserted.name))
+        elif dialect == 'sqlite':
+            connection.execute(sqlite_insert(lease_table).values(**values).on_conflict_do_nothing())
+        else:
+            exists = connection.execute(
+                select(lease_table.c.name).where(lease_table.c.name == JobSchedulerConfig.LEASE_NAME)
+            ).first()
+            if exists is None:
+                try:
+                    with connection.begin_nested():
+                        connection.execute(insert(lease_table).values(**values))
+                except IntegrityError:
+                    pass  # Another process created it first
+
+    def _release_lease(self):
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(lease_table)
+                .where(lease_table.c.name == JobSchedulerConfig.LEASE_NAME, lease_table.c.holder == self.worker_id)
+                .values(holder=None, expires_at=datetime.utcnow())
+            )
+
+    def _set_leader(self, leader):
+        with self._lock:
+            changed = leader != self._leader
+            self._leader = leader
+        if not changed:
+            return
+
+        if leader:
+            self._stats['elections_won'] += 1
+            logging.info("Worker %s is now running the scheduled jobs", self.worker_id)
+            scheduler = self._ensure_scheduler()
+            self._sync_jobs()
+            scheduler.resume()
+            for callback in self._listeners:
+                try:
+                    callback()
+                except Exception as e:
+                    logging.error(f"Scheduler leadership listener failed: {str(e)}")
+        else:
+            self._stats['elections_lost'] += 1
+            logging.info("Worker %s no longer holds the scheduler lease", self.worker_id)
+            if self._scheduler is not None and self._scheduler.running:
+                self._scheduler.pause()
+
+    def _ensure_scheduler(self):
+        if self._scheduler is None:
+            self._scheduler = BackgroundScheduler(
+                jobstores={'default': SQLAlchemyJobStore(engine=db.engine, tablename=JobSchedulerConfig.JOBS_TABLE)},
+                job_defaults={
+                    'coalesce': True,
+                    'max_instances': 1,
+                    'misfire_grace_time': self._setting('SCHEDULER_MISFIRE_GRACE_SECONDS',
+                                                        JobSchedulerConfig.MISFIRE_GRACE_SECONDS)
+                }
+            )
+            self._scheduler.start(paused=True)
+        return self._scheduler
+
+    def _sync_jobs(self):
+        """
+        Write the registered jobs to the job store. A stored job with the same
+        trigger is left alone, so its next run time survives restarts and takeovers.
+        """
+        stored = {job.id: job for job in self._scheduler.get_jobs()}
+        for job_id, (_, trigger) in self._jobs.items():
+            existing = stored.pop(job_id, None)
+            if existing is not None and str(existing.trigger) == str(trigger):
+                continue
+            self._scheduler.add_job(run_job, trigger=trigger, args=[job_id], id=job_id, name=job_id,
+                                    replace_existing=True)
+            logging.info("Scheduled job %s: %s", job_id, trigger)
+        for job_id in stored:
+            self._scheduler.remove_job(job_id)
+            logging.info("Removed scheduled job %s (no longer registered)", job_id)
+
+    def run(self, job_id):
+        """Run a job once, if this process still holds the lease, and record the run"""
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            logging.warning(f"Scheduled job {job_id} is not registered in this process")
+            return
+
+        with self.app.app_context():
+            # Confirm the lease against the database right before running
+            if not self._acquire_lease():
+                self._stats['skipped_runs'] += 1
+                self._set_leader(False)
+                logging.warning(f"Skipping job {job_id}: scheduler lease is held by another worker")
+                return
+
+            started_at = datetime.utcnow()
+            run_id = db.session.execute(
+                insert(runs_table).values(job_id=job_id, holder=self.worker_id, status=RUN_RUNNING,
+                                          started_at=started_at)
+            ).inserted_primary_key[0]
+            db.session.commit()
+
+            started = time.perf_counter()
+            status, error = RUN_SUCCESS, None
+            try:
+                entry[0]()
+            except Exception as e:
+                db.session.rollback()
+                status, error = RUN_FAILED, str(e)
+                self._stats['failures'] += 1
+                logging.error(f"Scheduled job {job_id} failed: {str(e)}")
+            duration = time.perf_counter() - started
+            self._stats['runs'] += 1
+
+            try:
+                db.session.execute(
+                    update(runs_table).where(runs_table.c.id == run_id)
+                    .values(status=status, finished_at=datetime.utcnow(), duration_seconds=round(duration, 3),
+                            error=error)
+                )
+                history_days = self._setting('SCHEDULER_HISTORY_DAYS', JobSchedulerConfig.HISTORY_DAYS)
+                db.session.execute(
+                    delete(runs_table).where(runs_table.c.job_id == job_id,
+                                             runs_table.c.started_at < started_at - timedelta(days=history_days))
+                )
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Could not record run of job {job_id}: {str(e)}")
+            logging.info("Scheduled job %s %s in %.2fs", job_id, status, duration)
+
+    def history(self, job_id=None, limit=20):
+        """Most recent runs, newest first"""
+        query = select(runs_table).order_by(runs_table.c.started_at.desc(), runs_table.c.id.desc()).limit(limit)
+        if job_id:
+            query = query.where(runs_table.c.job_id == job_id)
+        return [_run_dict(row) for row in db.session.execute(query).mappings()]
+
+    def status(self):
+        """Lease holder, registered jobs with their stored next run time and last run"""
+        lease = db.session.execute(
+            select(lease_table).where(lease_table.c.name == JobSchedulerConfig.LEASE_NAME)
+        ).mappings().first()
+
+        jobs_t = table(JobSchedulerConfig.JOBS_TABLE, column('id'), column('next_run_time'))
+        try:
+            next_runs = dict(db.session.execute(select(jobs_t.c.id, jobs_t.c.next_run_time)).all())
+        except Exception:
+            db.session.rollback()
+            next_runs = {}  # Job store table not created yet (no leader has started)
+
+        latest = select(func.max(runs_table.c.id)).group_by(runs_table.c.job_id).scalar_subquery()
+        last_runs = {row['job_id']: _run_dict(row)
+                     for row in db.session.execute(select(runs_table).where(runs_table.c.id.in_(latest))).mappings()}
+
+        with self._lock:
+            local = {
+                'worker_id': self.worker_id,
+                'is_leader': self._leader and self._lease_until is not None and datetime.utcnow() < self._lease_until,
+                'lease_until': self._lease_until.isoformat() if self._lease_until else None,
+                'running': self._thread is not None and self._thread.is_alive(),
+                **self._stats
+            }
+        return {
+            'worker': local,
+            'lease': {
+                'holder': lease['holder'],
+                'acquired_at': lease['acquired_at'].isoformat() if lease['acquired_at'] else None,
+                'expires_at': lease['expires_at'].isoformat() if lease['expires_at'] else None
+            } if lease else None,
+            'jobs': [{
+                'id': job_id,
+                'trigger': str(trigger),
+                'next_run_time': (datetime.utcfromtimestamp(next_runs[job_id]).isoformat()
+                                  if next_runs.get(job_id) is not None else None),
+                'last_run': last_runs.get(job_id)
+            } for job_id, (_, trigger) in self._jobs.items()]
+        }
+
+def _run_dict(row):
+    return {
+        'id': row['id'],
+        'job_id': row['job_id'],
+        'holder': row['holder'],
+        'status': row['status'],
+        'started_at': row['started_at'].isoformat() if row['started_at'] else None,
+        'finished_at': row['finished_at'].isoformat() if row['finished_at'] else None,
+        'duration_seconds': row['duration_seconds'],
+        'error': row['error']
+    }
+
+# Global job scheduler (jobs registered in create_app)
+job_scheduler = JobScheduler()
@@ -0,0 +1,269 @@
+from app.models.daily_milk_summary import DailyMilkSummary
+from app.models.milking_sessions import MilkingSession
+from app.models.milk_rollup import MilkRollup
+from app.database.database import db
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import delete, func, insert, select, tuple_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import logging
+
+ROLLUP_PERIOD_TYPES = ('week', 'month')
+
+# cow_id used for the herd-wide rollup row of a period
+HERD_COW_ID = 0
+
+ROLLUP_VALUE_COLUMNS = (
+    'morning_volume', 'afternoon_volume', 'evening_volume', 'total_volume',
+    'session_count', 'day_count', 'cow_count'
+)
+
+rollup_table = MilkRollup.__table__
+summary_table = DailyMilkSummary.__table__
+session_table = MilkingSession.__table__
+
+def period_start(period_type, day):
+    """First day of the week (Monday) or month containing `day`"""
+    if period_type == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+def period_end(period_type, start):
+    """First day after the period starting at `start`"""
+    if period_type == 'week':
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return date(start.year + 1, 1, 1)
+    return date(start.year, start.month + 1, 1)
+
+def iter_period_starts(period_type, start_date, end_date):
+    """Starts of every period overlapping [start_date, end_date]"""
+    current = period_start(period_type, start_date)
+    while current <= end_date:
+        yield current
+        current = period_end(period_type, current)
+
+def rollup_periods(summary_keys):
+    """{(period_type, period_start): cow_ids} of the rollups covering (cow_id, date) summaries"""
+    affected = {}
+    for cow_id, summary_date in summary_keys:
+        for period_type in ROLLUP_PERIOD_TYPES:
+            key = (period_type, period_start(period_type, summary_date))
+            affected.setdefault(key, set()).add(int(cow_id))
+    return affected
+
+def refresh_rollups(summary_keys):
+    """
+    Bring the week and month rollups up to date for changed (cow_id, date) summaries.
+    Only the affected cows' rows and the herd row of each touched period are
+    recomputed. Does not commit.
+    """
+    affected = rollup_periods(summary_keys)
+    for (period_type, start), cow_ids in sorted(affected.items()):
+        refresh_period(period_type, start, cow_ids)
+    return len(affected)
+
+def refresh_period(period_type, start, cow_ids=None, lock_herd=False):
+    """
+    Recompute the per-cow rollups of one period (all cows when `cow_ids` is None)
+    from daily_milk_summary and milking_sessions, then the herd-wide row. With
+    `lock_herd` the herd row is locked before anything is read, so concurrent
+    refreshes of the period run one after another.
+    """
+    end = period_end(period_type, start)
+    if lock_herd:
+        _lock_herd_row(period_type, start)
+
+    volumes = (
+        select(
+            summary_table.c.cow_id,
+            func.sum(summary_table.c.morning_volume).label('morning_volume'),
+            func.sum(summary_table.c.afternoon_volume).label('afternoon_volume'),
+            func.sum(summary_table.c.evening_volume).label('evening_volume'),
+            func.sum(summary_table.c.total_volume).label('total_volume'),
+            func.count().label('day_count')
+        )
+        .where(summary_table.c.date >= start, summary_table.c.date < end)
+        .group_by(summary_table.c.cow_id)
+    )
+    sessions = (
+        select(session_table.c.cow_id, func.count().label('session_count'))
+        .where(
+            session_table.c.milking_time >= datetime.combine(start, time.min),
+            session_table.c.milking_time < datetime.combine(end, time.min)
+        )
+        .group_by(session_table.c.cow_id)
+    )
+    if cow_ids:
+        volumes = volumes.where(summary_table.c.cow_id.in_(cow_ids))
+        sessions = sessions.where(session_table.c.cow_id.in_(cow_ids))
+
+    rows = {}
+    for row in db.session.execute(volumes):
+        rows[row.cow_id] = _rollup_row(
+            period_type, start, row.cow_id,
+            morning_volume=float(row.morning_volume or 0),
+            afternoon_volume=float(row.afternoon_volume or 0),
+            evening_volume=float(row.evening_volume or 0),
+            total_volume=float(row.total_volume or 0),
+            day_count=row.day_count,
+            cow_count=1
+        )
+    for row in db.session.execute(sessions):
+        rows.setdefault(row.cow_id, _rollup_row(period_type, start, row.cow_id, cow_count=1))
+        rows[row.cow_id]['session_count'] = row.session_count
+
+    # Drop rows for cows that no longer have any milk in the period
+    stale = delete(rollup_table).where(
+        rollup_table.c.period_type == period_type,
+        rollup_table.c.period_start == start,
+        rollup_table.c.cow_id != HERD_COW_ID
+    )
+    if cow_ids:
+        stale = stale.where(rollup_table.c.cow_id.in_(cow_ids))
+    if rows:
+        stale = stale.where(rollup_table.c.cow_id.notin_(list(rows)))
+    db.session.execute(stale)
+
+    if rows:
+        _upsert_rollups(list(rows.values()))
+
+    _refresh_herd_row(period_type, start, end)
+
+def _lock_herd_row(period_type, start):
+    # Insert-or-touch: always a row lock, never a gap lock on a missing row
+    values = _rollup_row(period_type, start, HERD_COW_ID)
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_insert(rollup_table).values(values)
+        db.session.execute(stmt.on_duplicate_key_update(cow_count=rollup_table.c.cow_count))
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(rollup_table).values(values)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['period_type', 'period_start', 'cow_id'],
+            set_={'cow_count': rollup_table.c.cow_count}
+        ))
+    else:
+        db.session.execute(
+            select(rollup_table.c.id).where(
+                rollup_table.c.period_type == period_type,
+                rollup_table.c.period_start == start,
+                rollup_table.c.cow_id == HERD_COW_ID
+            ).with_for_update()
+        )
+
+def _refresh_herd_row(period_type, start, end):
+    totals = db.session.execute(
+        select(
+            func.sum(rollup_table.c.morning_volume).label('morning_volume'),
+            func.sum(rollup_table.c.afternoon_volume).label('afternoon_volume'),
+            func.sum(rollup_table.c.evening_volume).label('evening_volume'),
+            func.sum(rollup_table.c.total_volume).label('total_volume'),
+            func.sum(rollup_table.c.session_count).label('session_count'),
+            func.count().label('cow_count')
+        ).where(
+            rollup_table.c.period_type == period_type,
+            rollup_table.c.period_start == start,
+            rollup_table.c.cow_id != HERD_COW_ID
+        )
+    ).one()
+
+    if not totals.cow_count:
+        db.session.execute(delete(rollup_table).where(
+            rollup_table.c.period_type == period_type,
+            rollup_table.c.period_start == start,
+            rollup_table.c.cow_id == HERD_COW_ID
+        ))
+        return
+
+    # Days on which any cow gave milk, for the herd's daily average
+    day_count = db.session.execute(
+        select(func.count(func.distinct(summary_table.c.date)))
+        .where(summary_table.c.date >= start, summary_table.c.date < end)
+    ).scalar()
+
+    _upsert_rollups([_rollup_row(
+        period_type, start, HERD_COW_ID,
+        morning_volume=float(totals.morning_volume or 0),
+        afternoon_volume=float(totals.afternoon_volume or 0),
+        evening_volume=float(totals.evening_volume or 0),
+        total_volume=float(totals.total_volume or 0),
+        session_count=int(totals.session_count or 0),
+        day_count=day_count or 0,
+        cow_count=totals.cow_count
+    )])
+
+def _rollup_row(period_type, start, cow_id, **values):
+    row = {'period_type': period_type, 'period_start': start, 'cow_id': cow_id}
+    row.update({name: 0 for name in ROLLUP_VALUE_COLUMNS})
+    row.update(values)
+    row['updated_at'] = datetime.utcnow()
+    return row
+
+def _upsert_rollups(rows):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_insert(rollup_table).values(rows)
+        stmt = stmt.on_duplicate_key_update(
+            updated_at=stmt.inserted.updated_at,
+            **{name: stmt.inserted[name] for name in ROLLUP_VALUE_COLUMNS}
+        )
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(rollup_table).values(rows)
+        set_ = {name: stmt.excluded[name] for name in ROLLUP_VALUE_COLUMNS}
+        set_['updated_at'] = stmt.excluded.updated_at
+        stmt = stmt.on_conflict_do_update(index_elements=['period_type', 'period_start', 'cow_id'], set_=set_)
+    else:
+        db.session.execute(delete(rollup_table).where(
+            tuple_(rollup_table.c.period_type, rollup_table.c.period_start, rollup_table.c.cow_id).in_(
+                [(row['period_type'], row['period_start'], row['cow_id']) for row in rows]
+            )
+        ))
+        stmt = insert(rollup_table).values(rows)
+    db.session.execute(stmt)
+
+def rebuild_rollups(start_date, end_date):
+    """Recompute every week and month rollup overlapping [start_date, end_date]. Does not commit."""
+    periods = 0
+    for period_type in ROLLUP_PERIOD_TYPES:
+        for start in iter_period_starts(period_type, start_date, end_date):
+            refresh_period(period_type, start)
+            periods += 1
+    logging.info("Rebuilt %d rollup periods from %s to %s", periods, start_date, end_date)
+    return periods
+
+def load_rollups(period_type, cow_id=None, start_date=None, end_date=None):
+    """
+    Rollup rows for one cow, or the herd when `cow_id` is None, ordered by period.
+    Periods are selected by their start date.
+    """
+    query = (
+        select(rollup_table)
+        .where(
+            rollup_table.c.period_type == period_type,
+            rollup_table.c.cow_id == (cow_id if cow_id is not None else HERD_COW_ID)
+        )
+        .order_by(rollup_table.c.period_start)
+    )
+    if start_date:
+        query = query.where(rollup_table.c.period_start >= period_start(period_type, start_date))
+    if end_date:
+        query = query.where(rollup_table.c.period_start <= end_date)
+
+    result = []
+    for row in db.session.execute(query):
+        total = float(row.total_volume or 0)
+        result.append({
+            "period_start": row.period_start.isoformat(),
+            "period_end": (period_end(period_type, row.period_start) - timedelta(days=1)).isoformat(),
+            "morning_volume": float(row.morning_volume or 0),
+            "afternoon_volume": float(row.afternoon_volume or 0),
+            "evening_volume": float(row.evening_volume or 0),
+            "total_volume": total,
+            "session_count": row.session_count,
+            "day_count": row.day_count,
+            "cow_count": row.cow_count,
+            "average_daily_volume": round(total / row.day_count, 2) if row.day_count else 0,
+            "average_session_volume": round(total / row.session_count, 2) if row.session_count else 0
+        })
+    return result
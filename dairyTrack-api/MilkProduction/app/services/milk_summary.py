@@ -0,0 +1,381 @@
+from app.models.daily_milk_summary import DailyMilkSummary
+from app.models.milking_sessions import MilkingSession
+from app.database.database import db
+from app.services.milk_rollup import refresh_rollups
+from app.services.rollup_refresher import stage_rollup_refresh
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import and_, bindparam, case, delete, extract, func, insert, select, tuple_, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import logging
+
+# Maximum number of rows sent in a single multi-row statement
+SUMMARY_CHUNK_SIZE = 500
+
+PERIODS = ('morning', 'afternoon', 'evening')
+
+summary_table = DailyMilkSummary.__table__
+
+def session_period(milking_time):
+    """Return the summary column bucket (morning/afternoon/evening) for a milking time"""
+    hour = milking_time.hour
+    if hour < 12:
+        return 'morning'
+    elif hour < 18:
+        return 'afternoon'
+    return 'evening'
+
+def add_session_delta(deltas, cow_id, milking_time, volume):
+    """
+    Accumulate a session volume into a {(cow_id, date): {period: volume}} delta map.
+    Pass a negative volume to remove a session from its summary.
+    """
+    key = (int(cow_id), milking_time.date())
+    bucket = deltas.setdefault(key, {'morning': 0.0, 'afternoon': 0.0, 'evening': 0.0})
+    bucket[session_period(milking_time)] += float(volume)
+    return deltas
+
+def has_afternoon_or_evening_volume(cow_id, summary_date):
+    """True when the cow's summary for the day already holds afternoon or evening milk"""
+    row = db.session.execute(
+        select(summary_table.c.afternoon_volume, summary_table.c.evening_volume)
+        .where(summary_table.c.cow_id == cow_id, summary_table.c.date == summary_date)
+    ).first()
+    return bool(row and (row.afternoon_volume > 0 or row.evening_volume > 0))
+
+def apply_summary_deltas(deltas):
+    """
+    Apply accumulated volume deltas to daily_milk_summary without reading the rows first.
+
+    Keys whose deltas only add volume are upserted (INSERT ... ON DUPLICATE KEY UPDATE on
+    MySQL, ON CONFLICT DO UPDATE on SQLite) so concurrent writers never lose an update.
+    Keys that remove volume are updated in place with each period clamped at zero, and
+    summaries left without any volume are deleted, matching the old per-route behaviour.
+    The weekly/monthly rollups of the touched periods are refreshed by the rollup
+    refresher once the transaction commits. Does not commit.
+    """
+    additions = []
+    removals = []
+    for (cow_id, summary_date), volumes in deltas.items():
+        if not any(volumes[period] for period in PERIODS):
+            continue
+        row = {
+            'cow_id': cow_id,
+            'date': summary_date,
+            'morning_volume': volumes['morning'],
+            'afternoon_volume': volumes['afternoon'],
+            'evening_volume': volumes['evening'],
+            'total_volume': volumes['morning'] + volumes['afternoon'] + volumes['evening']
+        }
+        if any(volumes[period] < 0 for period in PERIODS):
+            removals.append(row)
+        else:
+            additions.append(row)
+
+    dialect = db.session.get_bind().dialect.name
+
+    if additions:
+        if dialect in ('mysql', 'sqlite'):
+            _upsert_additions(additions, dialect)
+        else:
+            _insert_or_increment(additions)
+
+    if removals:
+        _apply_removals(removals, dialect)
+
+    if additions or removals:
+        stage_rollup_refresh(db.session, [(row['cow_id'], row['date']) for row in additions + removals])
+
+    logging.info("Applied summary deltas: %d added, %d removed", len(additions), len(removals))
+    return len(additions) + len(removals)
+
+def _greatest_zero(expression, dialect):
+    # SQLite spells GREATEST as the multi-argument scalar MAX
+    if dialect == 'sqlite':
+        return func.max(expression, 0)
+    return func.greatest(expression, 0)
+
+def _upsert_additions(rows, dialect):
+    for start in range(0, len(rows), SUMMARY_CHUNK_SIZE):
+        chunk = rows[start:start + SUMMARY_CHUNK_SIZE]
+        if dialect == 'mysql':
+            stmt = mysql_insert(summary_table).values(chunk)
+            incoming = stmt.inserted
+        else:
+            stmt = sqlite_insert(summary_table).values(chunk)
+            incoming = stmt.excluded
+
+        increments = {
+            'morning_volume': summary_table.c.morning_volume + incoming.morning_volume,
+            'afternoon_volume': summary_table.c.afternoon_volume + incoming.afternoon_volume,
+            'evening_volume': summary_table.c.evening_volume + incoming.evening_volume,
+            'total_volume': summary_table.c.total_volume + incoming.total_volume
+        }
+
+        if dialect == 'mysql':
+            stmt = stmt.on_duplicate_key_update(**increments)
+        else:
+            stmt = stmt.on_conflict_do_update(index_elements=['cow_id', 'date'], set_=increments)
+        db.session.execute(stmt)
+
+def _insert_or_increment(rows):
+    """Portable fallback for databases without an upsert statement we support"""
+    keys = [(row['cow_id'], row['date']) for row in rows]
+    existing = set()
+    for start in range(0, len(keys), SUMMARY_CHUNK_SIZE):
+        chunk = keys[start:start + SUMMARY_CHUNK_SIZE]
+        result = db.session.execute(
+            select(summary_table.c.cow_id, summary_table.c.date)
+            .where(tuple_(summary_table.c.cow_id, summary_table.c.date).in_(chunk))
+        )
+        existing.update((row.cow_id, row.date) for row in result)
+
+    updates = [{'b_' + name: value for name, value in row.items()}
+               for row in rows if (row['cow_id'], row['date']) in existing]
+    inserts = [row for row in rows if (row['cow_id'], row['date']) not in existing]
+
+    if updates:
+        db.session.execute(
+            update(summary_table)
+            .where(summary_table.c.cow_id == bindparam('b_cow_id'),
+                   summary_table.c.date == bindparam('b_date'))
+            .values(
+                morning_volume=summary_table.c.morning_volume + bindparam('b_morning_volume'),
+                afternoon_volume=summary_table.c.afternoon_volume + bindparam('b_afternoon_volume'),
+                evening_volume=summary_table.c.evening_volume + bindparam('b_evening_volume'),
+                total_volume=summary_table.c.total_volume + bindparam('b_total_volume')
+            ),
+            updates
+        )
+
+    for start in range(0, len(inserts), SUMMARY_CHUNK_SIZE):
+        db.session.execute(insert(summary_table).values(inserts[start:start + SUMMARY_CHUNK_SIZE]))
+
+def removal_statement(dialect):
+    """
+    UPDATE subtracting per-period volumes (bound as b_<column>) with each period
+    clamped at zero and the total recomputed from the clamped periods. MySQL
+    evaluates single-table SET assignments left to right, with later ones reading
+    the new values, so the total is assigned first, while the periods still hold
+    their old values; SQLite reads old values throughout, so both agree.
+    """
+    morning = _greatest_zero(summary_table.c.morning_volume + bindparam('b_morning_volume'), dialect)
+    afternoon = _greatest_zero(summary_table.c.afternoon_volume + bindparam('b_afternoon_volume'), dialect)
+    evening = _greatest_zero(summary_table.c.evening_volume + bindparam('b_evening_volume'), dialect)
+
+    return (
+        update(summary_table)
+        .where(summary_table.c.cow_id == bindparam('b_cow_id'),
+               summary_table.c.date == bindparam('b_date'))
+        .ordered_values(
+            (summary_table.c.total_volume, morning + afternoon + evening),
+            (summary_table.c.morning_volume, morning),
+            (summary_table.c.afternoon_volume, afternoon),
+            (summary_table.c.evening_volume, evening)
+        )
+    )
+
+def _apply_removals(rows, dialect):
+    db.session.execute(
+        removal_statement(dialect),
+        [{'b_' + name: value for name, value in row.items() if name != 'total_volume'} for row in rows]
+    )
+
+    # If there's no more milk recorded for a cow on a day, delete the summary
+    keys = [(row['cow_id'], row['date']) for row in rows]
+    for start in range(0, len(keys), SUMMARY_CHUNK_SIZE):
+        db.session.execute(
+            delete(summary_table).where(and_(
+                tuple_(summary_table.c.cow_id, summary_table.c.date).in_(keys[start:start + SUMMARY_CHUNK_SIZE]),
+                summary_table.c.total_volume <= 0
+            ))
+        )
+
+# Rebuild / verify
+
+VOLUME_TOLERANCE = 1e-6
+
+session_table = MilkingSession.__table__
+
+def _to_date(value):
+    # DATE() comes back as a string on SQLite and as a date on MySQL
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+def _as_date(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.date() if isinstance(value, datetime) else value
+
+def aggregate_sessions(start_date, end_date, cow_ids=None):
+    """
+    Recompute expected summaries for [start_date, end_date] with one grouped aggregate,
+    using the same morning (<12h) / afternoon (<18h) / evening buckets as session writes.
+    Returns {(cow_id, date): {'morning': v, 'afternoon': v, 'evening': v}}.
+    """
+    hour = extract('hour', session_table.c.milking_time)
+    session_date = func.date(session_table.c.milking_time)
+    query = (
+        select(
+            session_table.c.cow_id,
+            session_date.label('date'),
+            func.sum(case((hour < 12, session_table.c.volume), else_=0)).label('morning'),
+            func.sum(case((and_(hour >= 12, hour < 18), session_table.c.volume), else_=0)).label('afternoon'),
+            func.sum(case((hour >= 18, session_table.c.volume), else_=0)).label('evening')
+        )
+        .where(
+            session_table.c.milking_time >= datetime.combine(start_date, time.min),
+            session_table.c.milking_time < datetime.combine(end_date + timedelta(days=1), time.min)
+        )
+        .group_by(session_table.c.cow_id, session_date)
+    )
+    if cow_ids:
+        query = query.where(session_table.c.cow_id.in_(cow_ids))
+
+    return {
+        (row.cow_id, _to_date(row.date)): {
+            'morning': float(row.morning or 0),
+            'afternoon': float(row.afternoon or 0),
+            'evening': float(row.evening or 0)
+        }
+        for row in db.session.execute(query)
+    }
+
+def load_summaries(start_date, end_date, cow_ids=None):
+    """Current daily_milk_summary rows for the range, keyed like aggregate_sessions"""
+    query = select(
+        summary_table.c.cow_id,
+        summary_table.c.date,
+        summary_table.c.morning_volume,
+        summary_table.c.afternoon_volume,
+        summary_table.c.evening_volume,
+        summary_table.c.total_volume
+    ).where(summary_table.c.date >= start_date, summary_table.c.date <= end_date)
+    if cow_ids:
+        query = query.where(summary_table.c.cow_id.in_(cow_ids))
+
+    return {
+        (row.cow_id, row.date): {
+            'morning': float(row.morning_volume or 0),
+            'afternoon': float(row.afternoon_volume or 0),
+            'evening': float(row.evening_volume or 0),
+            'total': float(row.total_volume or 0)
+        }
+        for row in db.session.execute(query)
+    }
+
+def session_date_range(cow_ids=None):
+    """Earliest and latest dates covered by milking sessions or summaries"""
+    sessions = select(func.min(session_table.c.milking_time), func.max(session_table.c.milking_time))
+    summaries = select(func.min(summary_table.c.date), func.max(summary_table.c.date))
+    if cow_ids:
+        sessions = sessions.where(session_table.c.cow_id.in_(cow_ids))
+        summaries = summaries.where(summary_table.c.cow_id.in_(cow_ids))
+
+    first_session, last_session = db.session.execute(sessions).one()
+    first_summary, last_summary = db.session.execute(summaries).one()
+    starts = [value for value in (_as_date(first_session), _to_date(first_summary)) if value]
+    ends = [value for value in (_as_date(last_session), _to_date(last_summary)) if value]
+    if not starts:
+        return None, None
+    return min(starts), max(ends)
+
+def diff_summaries(expected, actual):
+    """
+    Compare recomputed and stored summaries. Yields dicts with kind
+    'missing' (sessions but no summary), 'mismatch' or 'orphan' (summary without sessions).
+    """
+    for key in sorted(set(expected) | set(actual)):
+        cow_id, summary_date = key
+        want = expected.get(key)
+        have = actual.get(key)
+        if want is None:
+            kind = 'orphan'
+        elif have is None:
+            kind = 'missing'
+        else:
+            want_total = want['morning'] + want['afternoon'] + want['evening']
+            if all(abs(want[period] - have[period]) <= VOLUME_TOLERANCE for period in PERIODS) \
+                    and abs(want_total - have['total']) <= VOLUME_TOLERANCE:
+                continue
+            kind = 'mismatch'
+        yield {'cow_id': cow_id, 'date': summary_date, 'kind': kind, 'expected': want, 'actual': have}
+
+def iter_summary_diffs(start_date, end_date, cow_ids=None, window_days=31):
+    """
+    Walk [start_date, end_date] in windows of `window_days`, yielding
+    (window_start, window_end, diffs) so large ranges stream in bounded memory.
+    """
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + timedelta(days=window_days - 1), end_date)
+        expected = aggregate_sessions(window_start, window_end, cow_ids)
+        actual = load_summaries(window_start, window_end, cow_ids)
+        yield window_start, window_end, list(diff_summaries(expected, actual))
+        window_start = window_end + timedelta(days=1)
+
+def apply_summary_corrections(diffs):
+    """
+    Write recomputed values for missing/mismatched summaries with bulk upserts,
+    delete orphaned ones with one DELETE per chunk and refresh the affected rollups.
+    Does not commit.
+    """
+    rows = []
+    orphans = []
+    for item in diffs:
+        if item['kind'] == 'orphan':
+            orphans.append((item['cow_id'], item['date']))
+            continue
+        volumes = item['expected']
+        rows.append({
+            'cow_id': item['cow_id'],
+            'date': item['date'],
+            'morning_volume': volumes['morning'],
+            'afternoon_volume': volumes['afternoon'],
+            'evening_volume': volumes['evening'],
+            'total_volume': volumes['morning'] + volumes['afternoon'] + volumes['evening']
+        })
+
+    if rows:
+        _replace_summaries(rows)
+
+    for start in range(0, len(orphans), SUMMARY_CHUNK_SIZE):
+        db.session.execute(
+            delete(summary_table).where(
+                tuple_(summary_table.c.cow_id, summary_table.c.date).in_(orphans[start:start + SUMMARY_CHUNK_SIZE])
+            )
+        )
+
+    if rows or orphans:
+        refresh_rollups([(row['cow_id'], row['date']) for row in rows] + orphans)
+
+    return len(rows), len(orphans)
+
+def _replace_summaries(rows):
+    """Upsert absolute summary values (as opposed to the increments in _upsert_additions)"""
+    dialect = db.session.get_bind().dialect.name
+    for start in range(0, len(rows), SUMMARY_CHUNK_SIZE):
+        chunk = rows[start:start + SUMMARY_CHUNK_SIZE]
+        if dialect == 'mysql':
+            stmt = mysql_insert(summary_table).values(chunk)
+            stmt = stmt.on_duplicate_key_update(
+                morning_volume=stmt.inserted.morning_volume,
+                afternoon_volume=stmt.inserted.afternoon_volume,
+                evening_volume=stmt.inserted.evening_volume,
+                total_volume=stmt.inserted.total_volume
+            )
+        elif dialect == 'sqlite':
+            stmt = sqlite_insert(summary_table).values(chunk)
+            stmt = stmt.on_conflict_do_update(index_elements=['cow_id', 'date'], set_={
+                'morning_volume': stmt.excluded.morning_volume,
+                'afternoon_volume': stmt.excluded.afternoon_volume,
+                'evening_volume': stmt.excluded.evening_volume,
+                'total_volume': stmt.excluded.total_volume
+            })
+        else:
+            db.session.execute(delete(summary_table).where(
+                tuple_(summary_table.c.cow_id, summary_table.c.date).in_([(row['cow_id'], row['date']) for row in chunk])
+            ))
+            stmt = insert(summary_table).values(chunk)
+        db.session.execute(stmt)
@@ -1,16 +1,21 @@
-from app.models.notification import Notification
+from app.models.notification import Notification, wib_now
 from app.models.daily_milk_summary import DailyMilkSummary
 from app.database.database import db
 from datetime import date, datetime, timedelta
 from app.models.cows import Cow
 from app.models.milk_batches import MilkBatch, MilkStatus
-from app.socket import emit_notification
+from app.models.milking_sessions import MilkingSession
 import logging
+import re
 import time
 from functools import wraps
 from flask import current_app
-from sqlalchemy import and_, func
+from sqlalchemy import and_, bindparam, case, func, insert, or_, update
 from app.models.user_cow_association import user_cow_association
+from app.services.rate_limiter import NotificationRateLimiter
+from app.services.emit_queue import NotificationEmitQueue
+from app.services.unread_counter import UNREAD_COUNTED, unread_counters
+from app.services.expiry_scheduler import EXPIRY_TRACKED, expiry_scheduler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,33 +29,30 @@ class NotificationConfig:
     MAX_RETRIES = 3
     SOCKET_TIMEOUT = 30
     WARNING_HOURS = 4  # Hours before expiry to send warning
+    CHECK_DEBOUNCE_SECONDS = 5  # Quiet period before queued checks run
+    CHECK_MAX_DELAY_SECONDS = 30  # Upper bound on how long queued checks wait
+    LOW_PRODUCTION_LITERS = 15  # Daily volume below this is low production
+    HIGH_PRODUCTION_LITERS = 25  # Daily volume above this is high production
+    EMIT_QUEUE_CAPACITY = 10000  # Pending socket emits before new ones are dropped
+    EMIT_COALESCE_SECONDS = 0.5  # Emits for one user within this window are delivered in one worker pass
+    EMIT_BACKOFF_SECONDS = 0.5  # First retry delay for a failed emit, doubled per attempt
 
-# Rate Limiter
-class NotificationRateLimiter:
-    def __init__(self):
-        self.user_limits = {}
-    
-    def is_rate_limited(self, user_id, limit=50, window_minutes=60):
-        """Check if user has exceeded notification rate limit"""
-        now = datetime.now()
-        
-        if user_id not in self.user_limits:
-            self.user_limits[user_id] = {'count': 0, 'reset_time': now + timedelta(minutes=window_minutes)}
-            
-        user_data = self.user_limits[user_id]
-        
-        if now > user_data['reset_time']:
-            user_data['count'] = 0
-            user_data['reset_time'] = now + timedelta(minutes=window_minutes)
-        
-        if user_data['count'] >= limit:
-            return True
-            
-        user_data['count'] += 1
-        return False
+# Batch number as written in batch notification messages ("Batch <number> dengan ...")
+BATCH_NUMBER_PATTERN = re.compile(r"Batch (\S+) ")
 
-# Global rate limiter instance
-rate_limiter = NotificationRateLimiter()
+# Global rate limiter instance (backend selected in create_app)
+rate_limiter = NotificationRateLimiter(
+    limit=NotificationConfig.RATE_LIMIT_PER_USER,
+    window_minutes=NotificationConfig.RATE_LIMIT_WINDOW_MINUTES
+)
+
+# Global outbound emit queue (worker started on first enqueue)
+emit_queue = NotificationEmitQueue(
+    capacity=NotificationConfig.EMIT_QUEUE_CAPACITY,
+    coalesce_seconds=NotificationConfig.EMIT_COALESCE_SECONDS,
+    max_attempts=NotificationConfig.MAX_RETRIES,
+    backoff_seconds=NotificationConfig.EMIT_BACKOFF_SECONDS
+)
 
 # Decorator for tracking metrics
 def track_notification_metrics(func):
@@ -89,6 +91,9 @@ def check_milk_production_and_notify():
     """
     Checks if milk production is within the standard range (15-25 liters/day)
     and notifies farmers accordingly. Updates existing notifications instead of creating duplicates.
+
+    Out-of-range cows and their managers come from one joined query, all notifications
+    are written with one bulk update/insert and committed once.
     """
     with current_app.app_context():
         today = date.today()
@@ -97,46 +102,75 @@ def check_milk_production_and_notify():
         logging.info("Starting milk production check for date: %s", today)
         
         try:
-            daily_summaries = DailyMilkSummary.query.filter_by(date=today).all()
-            logging.info("Found %d daily milk summaries for today", len(daily_summaries))
-            
+            from app.services.daily_kpis import daily_kpis
+
+            # Same snapshot the admin summary below reuses
+            summary_count = daily_kpis.get(today)['production']['cows_milked']
+            logging.info("Found %d daily milk summaries for today", summary_count)
+
+            # Classify out-of-range cows and resolve their managers in one query
+            production_type = case(
+                (DailyMilkSummary.total_volume < NotificationConfig.LOW_PRODUCTION_LITERS, 'low_production'),
+                else_='high_production'
+            ).label('notification_type')
+            rows = db.session.query(
+                DailyMilkSummary.cow_id,
+                Cow.name.label('cow_name'),
+                DailyMilkSummary.total_volume,
+                production_type,
+                user_cow_association.c.user_id
+            ).join(
+                Cow, Cow.id == DailyMilkSummary.cow_id
+            ).outerjoin(
+                user_cow_association, user_cow_association.c.cow_id == DailyMilkSummary.cow_id
+            ).filter(
+                DailyMilkSummary.date == today,
+                or_(DailyMilkSummary.total_volume < NotificationConfig.LOW_PRODUCTION_LITERS,
+                    DailyMilkSummary.total_volume > NotificationConfig.HIGH_PRODUCTION_LITERS)
+            ).order_by(DailyMilkSummary.cow_id, user_cow_association.c.user_id).all()
+
             # Collect data for admin summary
             low_production_cows = []
             high_production_cows = []
-            total_production = 0
-            
-            for summary in daily_summaries:
-                logging.info("Processing summary for cow ID: %d, total volume: %.2f", 
-                           summary.cow_id, summary.total_volume)
-                
-                total_production += summary.total_volume
-                message = None
-                notification_type = None
-                
-                if summary.total_volume < 15:
-                    message = f"Produksi susu rendah! Sapi #{summary.cow.id} ({summary.cow.name}) " \
-                              f"hanya memproduksi {summary.total_volume} liter hari ini (di bawah standar 15L)"
-                    notification_type = "low_production"
-                    low_production_cows.append(summary)
-                    
-                elif summary.total_volume > 25:
-                    message = f"Produksi susu tinggi! Sapi #{summary.cow.id} ({summary.cow.name}) " \
-                              f"memproduksi {summary.total_volume} liter hari ini (di atas standar 25L)"
-                    notification_type = "high_production"
-                    high_production_cows.append(summary)
-                
-                if message and notification_type:
-                    count = create_or_update_production_notifications(
-                        summary.cow_id, message, notification_type, today
-                    )
-                    notification_count += count
+            entries = []
+            seen_cows = set()
+
+            for row in rows:
+                if row.cow_id not in seen_cows:
+                    seen_cows.add(row.cow_id)
+                    if row.notification_type == 'low_production':
+                        low_production_cows.append(row)
+                    else:
+                        high_production_cows.append(row)
+
+                if row.user_id is None:
+                    logging.warning("No managers found for cow ID: %d", row.cow_id)
+                    continue
+
+                # Rate limiting check
+                if rate_limiter.is_rate_limited(row.user_id):
+                    logging.warning(f"Rate limit exceeded for user {row.user_id}")
+                    continue
+
+                if row.notification_type == 'low_production':
+                    message = f"Produksi susu rendah! Sapi #{row.cow_id} ({row.cow_name}) " \
+                              f"hanya memproduksi {row.total_volume} liter hari ini (di bawah standar 15L)"
+                else:
+                    message = f"Produksi susu tinggi! Sapi #{row.cow_id} ({row.cow_name}) " \
+                              f"memproduksi {row.total_volume} liter hari ini (di atas standar 25L)"
+                entries.append((row.user_id, row.cow_id, row.notification_type, message))
+
+            if entries:
+                upsert_production_notifications(entries, today)
+                db.session.commit()
+                notification_count += len(entries)
+
+                # Emit real-time notifications once the rows are committed
+                emit_notifications(entries)
             
             # Create admin summary for production
             if low_production_cows or high_production_cows:
-                admin_count = create_production_admin_summary(
-                    total_production, low_production_cows, high_production_cows, today
-                )
-                notification_count += admin_count
+                notification_count += create_production_admin_summary(today)
             
             logging.info("Milk production check completed. Total notifications processed: %d", notification_count)
             return notification_count
@@ -146,91 +180,91 @@ def check_milk_production_and_notify():
             db.session.rollback()
             return 0
 
-def create_or_update_production_notifications(cow_id, message, notification_type, date):
+def upsert_production_notifications(entries, day):
     """
-    Create notifications for users who manage the cow with improved error handling
+    Write production notifications for (user_id, cow_id, type, message) entries.
+    Today's existing notification for the same user, cow and type is updated with one
+    executemany UPDATE; the rest are inserted with multi-row INSERTs. Does not commit.
     """
-    try:
-        cow_managers = db.session.query(user_cow_association).filter_by(cow_id=cow_id).all()
-        
-        if not cow_managers:
-            logging.warning("No managers found for cow ID: %d", cow_id)
-            return 0
-        
-        notification_count = 0
-        
-        for manager_relation in cow_managers:
-            user_id = manager_relation.user_id
-            
-            # Rate limiting check
-            if rate_limiter.is_rate_limited(user_id):
-                logging.warning(f"Rate limit exceeded for user {user_id}")
-                continue
-            
-            # Check for existing notification today
-            today_start = datetime.combine(date, datetime.min.time())
-            existing_notification = Notification.query.filter_by(
-                user_id=user_id,
-                cow_id=cow_id,
-                type=notification_type
-            ).filter(
-                Notification.created_at >= today_start
-            ).first()
-            
-            if existing_notification:
-                # Update existing notification
-                existing_notification.message = sanitize_notification_message(message)
-                existing_notification.is_read = False
-                existing_notification.created_at = datetime.utcnow()
-                logging.info("Updated existing notification for user %d, cow %d", user_id, cow_id)
-            else:
-                # Create new notification
-                notification = Notification(
-                    user_id=user_id,
-                    cow_id=cow_id,
-                    message=sanitize_notification_message(message),
-                    type=notification_type,
-                    is_read=False
-                )
-                db.session.add(notification)
-                logging.info("Created new notification for user %d, cow %d", user_id, cow_id)
-            
-            # Emit real-time notification
-            emit_notification_safe(user_id, {
+    day_start = datetime.combine(day, datetime.min.time())
+    cow_ids = list({cow_id for _, cow_id, _, _ in entries})
+    types = list({notification_type for _, _, notification_type, _ in entries})
+
+    existing = {}
+    for start in range(0, len(cow_ids), NotificationConfig.NOTIFICATION_BATCH_SIZE):
+        chunk = cow_ids[start:start + NotificationConfig.NOTIFICATION_BATCH_SIZE]
+        found = db.session.query(
+            Notification.id, Notification.user_id, Notification.cow_id, Notification.type
+        ).filter(
+            Notification.cow_id.in_(chunk),
+            Notification.type.in_(types),
+            Notification.created_at >= day_start
+        ).order_by(Notification.id)
+        for notification_id, user_id, cow_id, notification_type in found:
+            existing.setdefault((user_id, cow_id, notification_type), notification_id)
+
+    updates = []
+    updated_users = set()
+    inserts = []
+    for user_id, cow_id, notification_type, message in entries:
+        notification_id = existing.get((user_id, cow_id, notification_type))
+        if notification_id:
+            updates.append({'b_id': notification_id, 'b_message': sanitize_notification_message(message)})
+            updated_users.add(user_id)
+        else:
+            inserts.append({
+                'user_id': user_id,
                 'cow_id': cow_id,
-                'message': message,
+                'message': sanitize_notification_message(message),
                 'type': notification_type,
                 'is_read': False,
-                'created_at': datetime.now().isoformat()
+                'created_at': datetime.now(),
+                'created_at_wib': wib_now()
             })
-            
-            notification_count += 1
-        
-        if notification_count > 0:
-            db.session.commit()
-        
-        return notification_count
-        
-    except Exception as e:
-        logging.error("Error creating production notifications: %s", str(e))
-        db.session.rollback()
-        return 0
+
+    notification_table = Notification.__table__
+    if updates:
+        db.session.execute(
+            update(notification_table)
+            .where(notification_table.c.id == bindparam('b_id'))
+            .values(message=bindparam('b_message'), is_read=False, created_at=datetime.utcnow()),
+            updates,
+            execution_options={UNREAD_COUNTED: True}
+        )
+        # Updated rows may or may not have been read already
+        unread_counters.stage_invalidate(db.session, updated_users)
+    for start in range(0, len(inserts), NotificationConfig.NOTIFICATION_BATCH_SIZE):
+        db.session.execute(
+            insert(notification_table).values(inserts[start:start + NotificationConfig.NOTIFICATION_BATCH_SIZE]),
+            execution_options={UNREAD_COUNTED: True}
+        )
+    stage_unread_inserts(inserts)
+
+    logging.info("Production notifications: %d updated, %d created", len(updates), len(inserts))
+    return len(updates) + len(inserts)
+
+def stage_unread_inserts(rows):
+    """Count bulk-inserted notification rows into the cached unread counters on commit"""
+    deltas = {}
+    for row in rows:
+        deltas[row['user_id']] = deltas.get(row['user_id'], 0) + 1
+    unread_counters.stage(db.session, deltas)
+
+def emit_notifications(entries):
+    """Queue committed (user_id, cow_id, type, message) notifications for socket delivery"""
+    for user_id, cow_id, notification_type, message in entries:
+        emit_notification_safe(user_id, {
+            'cow_id': cow_id,
+            'message': message,
+            'type': notification_type,
+            'is_read': False,
+            'created_at': datetime.now().isoformat()
+        })
 
 def emit_notification_safe(user_id, notification_data):
-    """Emit notification with error handling and retry"""
-    max_retries = NotificationConfig.MAX_RETRIES
-    
-    for attempt in range(max_retries):
-        try:
-            emit_notification(user_id, notification_data)
-            logging.info("Notification emitted successfully to user %d", user_id)
-            break
-        except Exception as e:
-            if attempt == max_retries - 1:
-                logging.error("Failed to emit notification after %d attempts: %s", max_retries, str(e))
-            else:
-                logging.warning(f"Emit attempt {attempt + 1} failed: {e}, retrying...")
-                time.sleep(1)
+    """Queue a notification for socket delivery; retries happen in the emit queue worker"""
+    if not emit_queue.enqueue(user_id, notification_data):
+        logging.warning("Notification for user %s dropped, emit queue is full", user_id)
 
 @track_notification_metrics
 def check_milk_expiry_and_notify():
@@ -245,21 +279,23 @@ def check_milk_expiry_and_notify():
         
         try:
             # Process expired batches
-            expired_count = process_expired_batches(current_time)
-            notification_count += expired_count
+            entries = process_expired_batches(current_time)
             
             # Process warning batches
-            warning_count = process_warning_batches(current_time)
-            notification_count += warning_count
+            entries += process_warning_batches(current_time)
+            notification_count += len(entries)
+
+            # Commit status changes and batch notifications before the admin summary,
+            # whose error handling rolls back the session
+            db.session.commit()
+            if entries:
+                logging.info("Milk expiry notifications committed to database")
+                emit_notifications(entries)
             
             # Create admin summary for expiry
             admin_count = create_expiry_admin_summary(current_time)
             notification_count += admin_count
             
-            if notification_count > 0:
-                db.session.commit()
-                logging.info("Milk expiry notifications committed to database")
-            
             logging.info("Milk expiry check completed. Total notifications created: %d", notification_count)
             return notification_count
             
@@ -268,227 +304,249 @@ def check_milk_expiry_and_notify():
             db.session.rollback()
             return 0
 
-def process_expired_batches(current_time):
-    """Process expired milk batches and notify managers"""
-    expired_batches = MilkBatch.query.filter(
-        MilkBatch.status == MilkStatus.FRESH,
-        MilkBatch.expiry_date < current_time
-    ).all()
-    
-    logging.info("Found %d expired milk batches", len(expired_batches))
-    notification_count = 0
-    
-    for batch in expired_batches:
-        try:
-            logging.info("Processing expired batch ID: %d", batch.id)
-            batch.status = MilkStatus.EXPIRED
-            
-            expiry_time = batch.expiry_date.strftime("%H:%M:%S on %d/%m/%Y")
-            sessions = batch.milking_sessions
-            
-            if not sessions:
-                logging.warning("No milking sessions found for batch ID: %d", batch.id)
-                continue
-                
-            cow_ids = set(session.cow_id for session in sessions)
-            
-            for cow_id in cow_ids:
-                cow = Cow.query.get(cow_id)
-                if not cow:
-                    logging.warning("Cow with ID %d not found", cow_id)
-                    continue
-                    
-                managers = cow.managers.all()
-                
-                for manager in managers:
-                    # Rate limiting check
-                    if rate_limiter.is_rate_limited(manager.id):
-                        continue
-                        
-                    message = f"Batch {batch.batch_number} dengan {batch.total_volume} liter dari sapi {cow.name} telah kadaluarsa pada {expiry_time}."
-                    
-                    notification = Notification(
-                        user_id=manager.id,
-                        cow_id=cow_id,
-                        message=sanitize_notification_message(message),
-                        type="milk_expiry",
-                        is_read=False
-                    )
-                    db.session.add(notification)
-                    
-                    emit_notification_safe(manager.id, {
-                        'cow_id': cow_id,
-                        'message': message,
-                        'type': "milk_expiry",
-                        'is_read': False,
-                        'created_at': datetime.now().isoformat()
-                    })
-                    
-                    notification_count += 1
-                    
-        except Exception as e:
-            logging.error(f"Error processing expired batch {batch.id}: {str(e)}")
+def fetch_batch_recipients(*criteria):
+    """
+    Batches matching `criteria` joined with the cows milked into them and those cows'
+    managers, in one query. Batches without sessions or managers come back with
+    NULL cow/user columns so they can still be counted and updated.
+    """
+    return db.session.query(
+        MilkBatch.id.label('batch_id'),
+        MilkBatch.batch_number,
+        MilkBatch.total_volume,
+        MilkBatch.expiry_date,
+        Cow.id.label('cow_id'),
+        Cow.name.label('cow_name'),
+        user_cow_association.c.user_id
+    ).outerjoin(
+        MilkingSession, MilkingSession.milk_batch_id == MilkBatch.id
+    ).outerjoin(
+        Cow, Cow.id == MilkingSession.cow_id
+    ).outerjoin(
+        user_cow_association, user_cow_association.c.cow_id == Cow.id
+    ).filter(*criteria).distinct().order_by(MilkBatch.id, Cow.id, user_cow_association.c.user_id).all()
+
+def existing_batch_notifications(cow_ids, notification_type, since):
+    """
+    (user_id, cow_id, batch_number) of `notification_type` notifications created since
+    `since` for the given cows, fetched with one IN query per chunk.
+    """
+    existing = set()
+    cow_ids = list(cow_ids)
+    for start in range(0, len(cow_ids), NotificationConfig.NOTIFICATION_BATCH_SIZE):
+        chunk = cow_ids[start:start + NotificationConfig.NOTIFICATION_BATCH_SIZE]
+        found = db.session.query(Notification.user_id, Notification.cow_id, Notification.message).filter(
+            Notification.cow_id.in_(chunk),
+            Notification.type == notification_type,
+            Notification.created_at >= since
+        )
+        for user_id, cow_id, message in found:
+            match = BATCH_NUMBER_PATTERN.search(message or '')
+            if match:
+                existing.add((user_id, cow_id, match.group(1)))
+    return existing
+
+def insert_batch_notifications(entries, notification_type):
+    """
+    Insert (user_id, cow_id, message) notifications with multi-row INSERTs. Does not
+    commit. Returns them as (user_id, cow_id, type, message) entries for
+    emit_notifications once the caller has committed.
+    """
+    rows = [{
+        'user_id': user_id,
+        'cow_id': cow_id,
+        'message': sanitize_notification_message(message),
+        'type': notification_type,
+        'is_read': False,
+        'created_at': datetime.now(),
+        'created_at_wib': wib_now()
+    } for user_id, cow_id, message in entries]
+
+    for start in range(0, len(rows), NotificationConfig.NOTIFICATION_BATCH_SIZE):
+        db.session.execute(
+            insert(Notification.__table__).values(rows[start:start + NotificationConfig.NOTIFICATION_BATCH_SIZE]),
+            execution_options={UNREAD_COUNTED: True}
+        )
+    stage_unread_inserts(rows)
+
+    return [(user_id, cow_id, notification_type, message) for user_id, cow_id, message in entries]
+
+def process_expired_batches(current_time, batch_ids=None):
+    """
+    Mark expired fresh batches as EXPIRED with one UPDATE and notify the managers of
+    every cow in them with one bulk insert, skipping notifications already sent today.
+    batch_ids limits the check to those batches (expiry scheduler events). Does not
+    commit; returns the notification entries to emit once committed.
+    """
+    criteria = [MilkBatch.status == MilkStatus.FRESH, MilkBatch.expiry_date < current_time]
+    if batch_ids is not None:
+        criteria.append(MilkBatch.id.in_(batch_ids))
+    rows = fetch_batch_recipients(*criteria)
+
+    batch_ids = sorted({row.batch_id for row in rows})
+    logging.info("Found %d expired milk batches", len(batch_ids))
+    if not batch_ids:
+        return []
+
+    for start in range(0, len(batch_ids), NotificationConfig.NOTIFICATION_BATCH_SIZE):
+        db.session.execute(
+            update(MilkBatch.__table__)
+            .where(
+                MilkBatch.__table__.c.id.in_(batch_ids[start:start + NotificationConfig.NOTIFICATION_BATCH_SIZE]),
+                MilkBatch.__table__.c.status == MilkStatus.FRESH
+            )
+            .values(status=MilkStatus.EXPIRED, updated_at=datetime.utcnow())
+            .execution_options(**{EXPIRY_TRACKED: True})
+        )
+    expiry_scheduler.stage(db.session, [(batch_id, None) for batch_id in batch_ids])
+
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    already_sent = existing_batch_notifications(
+        {row.cow_id for row in rows if row.cow_id is not None}, "milk_expiry", today_start
+    )
+
+    entries = []
+    for row in rows:
+        if row.cow_id is None:
+            logging.warning("No milking sessions found for batch ID: %d", row.batch_id)
+            continue
+        if row.user_id is None or (row.user_id, row.cow_id, row.batch_number) in already_sent:
+            continue
+        # Rate limiting check
+        if rate_limiter.is_rate_limited(row.user_id):
             continue
-    
-    return notification_count
 
-def process_warning_batches(current_time):
-    """Process batches that will expire soon and send warnings"""
+        expiry_time = row.expiry_date.strftime("%H:%M:%S on %d/%m/%Y")
+        message = f"Batch {row.batch_number} dengan {row.total_volume} liter dari sapi {row.cow_name} telah kadaluarsa pada {expiry_time}."
+        entries.append((row.user_id, row.cow_id, message))
+
+    return insert_batch_notifications(entries, "milk_expiry")
+
+def process_warning_batches(current_time, batch_ids=None):
+    """
+    Warn the managers of cows in batches that expire within WARNING_HOURS, at most
+    once per batch, manager and day, with one dedupe query and one bulk insert.
+    batch_ids limits the check to those batches (expiry scheduler events). Does not
+    commit; returns the notification entries to emit once committed.
+    """
     warning_time = current_time + timedelta(hours=NotificationConfig.WARNING_HOURS)
-    warning_batches = MilkBatch.query.filter(
+    criteria = [
         MilkBatch.status == MilkStatus.FRESH,
         MilkBatch.expiry_date <= warning_time,
         MilkBatch.expiry_date > current_time
-    ).all()
-    
-    logging.info("Found %d batches that will expire within %d hours", 
-                len(warning_batches), NotificationConfig.WARNING_HOURS)
-    notification_count = 0
-    
-    for batch in warning_batches:
-        try:
-            logging.info("Processing warning batch ID: %d", batch.id)
-            
-            time_remaining = batch.expiry_date - current_time
-            hours_remaining = time_remaining.total_seconds() / 3600
-            expiry_time = batch.expiry_date.strftime("%H:%M:%S on %d/%m/%Y")
-            
-            sessions = batch.milking_sessions
-            if not sessions:
-                logging.warning("No milking sessions found for batch ID: %d", batch.id)
-                continue
-                
-            cow_ids = set(session.cow_id for session in sessions)
-            
-            for cow_id in cow_ids:
-                cow = Cow.query.get(cow_id)
-                if not cow:
-                    logging.warning("Cow with ID %d not found", cow_id)
-                    continue
-                    
-                managers = cow.managers.all()
-                
-                for manager in managers:
-                    # Check if warning already sent today
-                    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-                    existing_notification = Notification.query.filter_by(
-                        user_id=manager.id,
-                        cow_id=cow_id,
-                        type="milk_warning"
-                    ).filter(
-                        Notification.message.contains(f"Batch {batch.batch_number}"),
-                        Notification.created_at >= today_start
-                    ).first()
-                    
-                    if existing_notification:
-                        logging.info("Warning notification already sent today for batch %s to manager %d", 
-                                   batch.batch_number, manager.id)
-                        continue
-                    
-                    # Rate limiting check
-                    if rate_limiter.is_rate_limited(manager.id):
-                        continue
-                    
-                    message = f"PERINGATAN: Batch {batch.batch_number} dengan {batch.total_volume} liter dari sapi {cow.name} akan kadaluarsa dalam {hours_remaining:.1f} jam pada {expiry_time}. Segera gunakan atau olah!"
-                    
-                    notification = Notification(
-                        user_id=manager.id,
-                        cow_id=cow_id,
-                        message=sanitize_notification_message(message),
-                        type="milk_warning",
-                        is_read=False
-                    )
-                    db.session.add(notification)
-                    
-                    emit_notification_safe(manager.id, {
-                        'cow_id': cow_id,
-                        'message': message,
-                        'type': "milk_warning",
-                        'is_read': False,
-                        'created_at': datetime.now().isoformat()
-                    })
-                    
-                    notification_count += 1
-                    
-        except Exception as e:
-            logging.error(f"Error processing warning batch {batch.id}: {str(e)}")
+    ]
+    if batch_ids is not None:
+        criteria.append(MilkBatch.id.in_(batch_ids))
+    rows = fetch_batch_recipients(*criteria)
+
+    logging.info("Found %d batches that will expire within %d hours",
+                len({row.batch_id for row in rows}), NotificationConfig.WARNING_HOURS)
+    if not rows:
+        return []
+
+    # Check if warning already sent today
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    already_sent = existing_batch_notifications(
+        {row.cow_id for row in rows if row.cow_id is not None}, "milk_warning", today_start
+    )
+
+    entries = []
+    for row in rows:
+        if row.cow_id is None:
+            logging.warning("No milking sessions found for batch ID: %d", row.batch_id)
             continue
-    
-    return notification_count
+        if row.user_id is None:
+            continue
+        if (row.user_id, row.cow_id, row.batch_number) in already_sent:
+            logging.info("Warning notification already sent today for batch %s to manager %d",
+                       row.batch_number, row.user_id)
+            continue
+        # Rate limiting check
+        if rate_limiter.is_rate_limited(row.user_id):
+            continue
+
+        hours_remaining = (row.expiry_date - current_time).total_seconds() / 3600
+        expiry_time = row.expiry_date.strftime("%H:%M:%S on %d/%m/%Y")
+        message = f"PERINGATAN: Batch {row.batch_number} dengan {row.total_volume} liter dari sapi {row.cow_name} akan kadaluarsa dalam {hours_remaining:.1f} jam pada {expiry_time}. Segera gunakan atau olah!"
+        entries.append((row.user_id, row.cow_id, message))
+
+    return insert_batch_notifications(entries, "milk_warning")
 
 def create_admin_notifications(message, notification_type, cow_id=None, priority="medium"):
     """
-    Create notifications for all admin users with enhanced error handling
+    Create notifications for all admin users (role named 'admin') and emit them
+    once committed
     """
     try:
-        from app.models.user import User
-        
-        admin_users = User.query.filter_by(role='admin').all()
+        from app.models.users import User
+        from app.models.roles import Role
+
+        admin_ids = [user_id for user_id, in db.session.query(User.id).join(
+            Role, Role.id == User.role_id
+        ).filter(func.lower(Role.name) == 'admin').order_by(User.id)]
         
-        if not admin_users:
+        if not admin_ids:
             logging.warning("No admin users found in system")
             return 0
         
-        notification_count = 0
+        full_message = sanitize_notification_message(f"[ADMIN] {message}")
+        recipients = []
         
-        for admin in admin_users:
-            try:
-                # Rate limiting for admin
-                if rate_limiter.is_rate_limited(admin.id, limit=100):  # Higher limit for admin
-                    continue
-                
-                notification = Notification(
-                    user_id=admin.id,
-                    cow_id=cow_id,
-                    message=sanitize_notification_message(f"[ADMIN] {message}"),
-                    type=f"admin_{notification_type}",
-                    is_read=False
-                )
-                db.session.add(notification)
-                
-                emit_notification_safe(admin.id, {
-                    'id': None,
-                    'user_id': admin.id,
-                    'cow_id': cow_id,
-                    'message': f"[ADMIN] {message}",
-                    'type': f"admin_{notification_type}",
-                    'priority': priority,
-                    'is_read': False,
-                    'created_at': datetime.now().isoformat()
-                })
-                
-                notification_count += 1
-                
-            except Exception as e:
-                logging.error(f"Error creating notification for admin {admin.id}: {str(e)}")
+        for admin_id in admin_ids:
+            # Rate limiting for admin
+            if rate_limiter.is_rate_limited(admin_id, limit=100):  # Higher limit for admin
                 continue
+            
+            db.session.add(Notification(
+                user_id=admin_id,
+                cow_id=cow_id,
+                message=full_message,
+                type=f"admin_{notification_type}",
+                is_read=False
+            ))
+            recipients.append(admin_id)
                 
-        if notification_count > 0:
+        if recipients:
             db.session.commit()
-            logging.info(f"Created {notification_count} admin notifications")
+            logging.info(f"Created {len(recipients)} admin notifications")
+
+        for admin_id in recipients:
+            emit_notification_safe(admin_id, {
+                'id': None,
+                'user_id': admin_id,
+                'cow_id': cow_id,
+                'message': full_message,
+                'type': f"admin_{notification_type}",
+                'priority': priority,
+                'is_read': False,
+                'created_at': datetime.now().isoformat()
+            })
             
-        return notification_count
+        return len(recipients)
         
     except Exception as e:
         logging.error(f"Error creating admin notifications: {str(e)}")
         db.session.rollback()
         return 0
 
-def create_production_admin_summary(total_production, low_production_cows, high_production_cows, today):
-    """Create admin summary for production data"""
+def create_production_admin_summary(today):
+    """Create admin summary for production data from the day's KPI snapshot"""
+    from app.services.daily_kpis import daily_kpis
+
     try:
-        total_cows = Cow.query.count()
-        avg_production = total_production / total_cows if total_cows > 0 else 0
+        production = daily_kpis.get(today)['production']
+        low_production_cows = production['low_production_cows']
+        high_production_cows = production['high_production_cows']
         
         summary_message = f"""
 📊 RINGKASAN PRODUKSI HARIAN ({today.strftime('%d/%m/%Y')})
 
-🐄 Total Sapi: {total_cows}
-🥛 Produksi Hari Ini: {total_production:.1f}L (Rata-rata: {avg_production:.1f}L/sapi)
+🐄 Total Sapi: {production['total_cows']}
+🥛 Produksi Hari Ini: {production['total_volume']:.1f}L (Rata-rata: {production['avg_per_cow']:.1f}L/sapi)
 
 ⚠️ Perhatian Produksi:
-• {len(low_production_cows)} sapi produksi rendah (<15L)
-• {len(high_production_cows)} sapi produksi tinggi (>25L)
+• {len(low_production_cows)} sapi produksi rendah (<{NotificationConfig.LOW_PRODUCTION_LITERS}L)
+• {len(high_production_cows)} sapi produksi tinggi (>{NotificationConfig.HIGH_PRODUCTION_LITERS}L)
 
 Detail Sapi Bermasalah:
 {get_cow_details_summary(low_production_cows, high_production_cows)}
@@ -507,39 +565,31 @@ Detail Sapi Bermasalah:
         return 0
 
 def create_expiry_admin_summary(current_time):
-    """Create admin summary for milk expiry data"""
+    """Create admin summary for milk expiry data from the day's KPI snapshot"""
+    from app.services.daily_kpis import daily_kpis
+
     try:
-        expired_batches = MilkBatch.query.filter(
-            MilkBatch.status == MilkStatus.EXPIRED,
-            func.date(MilkBatch.expiry_date) == current_time.date()
-        ).all()
-        
-        warning_time = current_time + timedelta(hours=NotificationConfig.WARNING_HOURS)
-        warning_batches = MilkBatch.query.filter(
-            MilkBatch.status == MilkStatus.FRESH,
-            MilkBatch.expiry_date <= warning_time,
-            MilkBatch.expiry_date > current_time
-        ).all()
+        batches = daily_kpis.get(current_time.date(), now=current_time)['batches']
+        expired_count = batches['expired_today_count']
+        warning_count = batches['expiring_count']
         
-        fresh_batches = MilkBatch.query.filter_by(status=MilkStatus.FRESH).count()
-        
-        if expired_batches or warning_batches:
-            expired_volume = sum(b.total_volume for b in expired_batches)
-            warning_volume = sum(b.total_volume for b in warning_batches)
+        if expired_count or warning_count:
+            expired_volume = batches['expired_today_volume']
+            warning_volume = batches['expiring_volume']
             
             summary_message = f"""
 🥛 RINGKASAN STATUS SUSU ({current_time.strftime('%d/%m/%Y %H:%M')})
 
 📊 Status Batch:
-• {fresh_batches} batch susu segar tersedia
-• {len(expired_batches)} batch KADALUARSA hari ini ({expired_volume:.1f}L)
-• {len(warning_batches)} batch AKAN KADALUARSA dalam {NotificationConfig.WARNING_HOURS} jam ({warning_volume:.1f}L)
+• {batches['fresh_count']} batch susu segar tersedia
+• {expired_count} batch KADALUARSA hari ini ({expired_volume:.1f}L)
+• {warning_count} batch AKAN KADALUARSA dalam {NotificationConfig.WARNING_HOURS} jam ({warning_volume:.1f}L)
 
 💰 Estimasi Kerugian: Rp {(expired_volume * 8000):,.0f}
-⚡ Tindakan Diperlukan: {len(warning_batches)} batch perlu segera diproses
+⚡ Tindakan Diperlukan: {warning_count} batch perlu segera diproses
             """.strip()
             
-            priority = "critical" if len(expired_batches) > 3 else "high"
+            priority = "critical" if expired_count > 3 else "high"
             
             return create_admin_notifications(
                 summary_message,
@@ -560,7 +610,7 @@ def get_cow_details_summary(low_production_cows, high_production_cows):
     if low_production_cows:
         details.append("Produksi Rendah:")
         for cow_summary in low_production_cows[:5]:  # Limit to 5
-            details.append(f"  • {cow_summary.cow.name}: {cow_summary.total_volume:.1f}L")
+            details.append(f"  • {cow_summary['cow_name']}: {cow_summary['total_volume']:.1f}L")
         if len(low_production_cows) > 5:
             details.append(f"  • ... dan {len(low_production_cows) - 5} sapi lainnya")
     
@@ -569,7 +619,7 @@ def get_cow_details_summary(low_production_cows, high_production_cows):
             details.append("")
         details.append("Produksi Tinggi:")
         for cow_summary in high_production_cows[:3]:  # Limit to 3
-            details.append(f"  • {cow_summary.cow.name}: {cow_summary.total_volume:.1f}L")
+            details.append(f"  • {cow_summary['cow_name']}: {cow_summary['total_volume']:.1f}L")
         if len(high_production_cows) > 3:
             details.append(f"  • ... dan {len(high_production_cows) - 3} sapi lainnya")
     
@@ -579,43 +629,32 @@ def create_daily_admin_summary():
     """
     Create comprehensive daily summary notification for admin
     """
+    from app.services.daily_kpis import daily_kpis
+
     try:
         today = date.today()
+        kpis = daily_kpis.get(today)
+        production = kpis['production']
+        batches = kpis['batches']
         
-        # Production data
-        daily_summaries = DailyMilkSummary.query.filter_by(date=today).all()
-        total_production = sum(s.total_volume for s in daily_summaries)
-        total_cows = Cow.query.count()
-        avg_production = total_production / total_cows if total_cows > 0 else 0
-        
-        low_production_cows = [s for s in daily_summaries if s.total_volume < 15]
-        high_production_cows = [s for s in daily_summaries if s.total_volume > 25]
-        
-        # Milk batches data
-        fresh_batches = MilkBatch.query.filter_by(status=MilkStatus.FRESH).count()
-        expired_today = MilkBatch.query.filter(
-            MilkBatch.status == MilkStatus.EXPIRED,
-            func.date(MilkBatch.expiry_date) == today
-        ).count()
-        
-        # System health metrics
-        total_notifications_today = Notification.query.filter(
-            func.date(Notification.created_at) == today
-        ).count()
+        low_production_cows = production['low_production_cows']
+        high_production_cows = production['high_production_cows']
+        expired_today = batches['expired_today_count']
+        total_notifications_today = kpis['notifications'].get('total_today', 0)
         
         summary_message = f"""
 📊 RINGKASAN HARIAN FARM ({today.strftime('%d %B %Y')})
 
 🐄 PRODUKSI SUSU:
-• Total Sapi: {total_cows}
-• Produksi Hari Ini: {total_production:.1f}L
-• Rata-rata per Sapi: {avg_production:.1f}L
-• Target Harian: {total_cows * 20:.1f}L
+• Total Sapi: {production['total_cows']}
+• Produksi Hari Ini: {production['total_volume']:.1f}L
+• Rata-rata per Sapi: {production['avg_per_cow']:.1f}L
+• Target Harian: {production['target_volume']:.1f}L
 
 ⚠️ MONITORING:
-• {len(low_production_cows)} sapi produksi rendah (<15L)
-• {len(high_production_cows)} sapi produksi tinggi (>25L)
-• {fresh_batches} batch susu segar
+• {len(low_production_cows)} sapi produksi rendah (<{NotificationConfig.LOW_PRODUCTION_LITERS}L)
+• {len(high_production_cows)} sapi produksi tinggi (>{NotificationConfig.HIGH_PRODUCTION_LITERS}L)
+• {batches['fresh_count']} batch susu segar
 • {expired_today} batch kadaluarsa hari ini
 
 📱 SISTEM:
@@ -763,41 +802,27 @@ def create_notifications_for_cow(cow_id, message, notification_type):
         return 0
 
 def cleanup_old_notifications():
-    """Remove notifications older than configured days"""
+    """Remove notifications older than configured days, in chunks (see notification_retention)"""
+    from app.services.notification_retention import RetentionAlreadyRunning, notification_retention
+
     try:
-        cutoff_date = datetime.now() - timedelta(days=NotificationConfig.CLEANUP_DAYS)
-        old_notifications = Notification.query.filter(
-            Notification.created_at < cutoff_date
-        ).delete()
-        db.session.commit()
-        logging.info(f"Cleaned up {old_notifications} old notifications")
-        return old_notifications
+        result = notification_retention.run()
+        logging.info(f"Cleaned up {result['deleted']} old notifications")
+        return result['deleted']
+    except RetentionAlreadyRunning as e:
+        logging.warning(str(e))
+        return 0
     except Exception as e:
         logging.error(f"Error cleaning up notifications: {str(e)}")
         db.session.rollback()
         return 0
 
-def get_notification_stats():
-    """Get notification statistics for monitoring"""
+def get_notification_stats(day=None):
+    """Get notification statistics for monitoring (one grouped query, cached briefly)"""
+    from app.services.notification_stats import notification_stats
+
     try:
-        today = date.today()
-        stats = {
-            'total_today': Notification.query.filter(
-                func.date(Notification.created_at) == today
-            ).count(),
-            'unread_count': Notification.query.filter_by(is_read=False).count(),
-            'by_type': {}
-        }
-        
-        # Count by type
-        types = ['milk_expiry', 'milk_warning', 'low_production', 'high_production']
-        for ntype in types:
-            stats['by_type'][ntype] = Notification.query.filter(
-                Notification.type == ntype,
-                func.date(Notification.created_at) == today
-            ).count()
-        
-        return stats
+        return notification_stats.get(day)
     except Exception as e:
         logging.error(f"Error getting notification stats: {str(e)}")
         return {}
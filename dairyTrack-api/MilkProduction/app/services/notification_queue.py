@@ -0,0 +1,130 @@
+from app.services.notification import (
+    NotificationConfig,
+    check_milk_expiry_and_notify,
+    check_milk_production_and_notify
+)
+from flask import current_app
+from datetime import datetime
+import logging
+import threading
+import time
+
+class NotificationCheckQueue:
+    """
+    Debounced in-process queue for the production/expiry notification checks.
+    Write paths enqueue a request and return immediately; a background worker
+    waits until requests stop arriving for `debounce_seconds` (or until
+    `max_delay_seconds` passed since the first pending request) and then runs
+    the checks once for all coalesced requests.
+    """
+
+    def __init__(self, debounce_seconds=None, max_delay_seconds=None):
+        self.debounce_seconds = debounce_seconds if debounce_seconds is not None else NotificationConfig.CHECK_DEBOUNCE_SECONDS
+        self.max_delay_seconds = max_delay_seconds if max_delay_seconds is not None else NotificationConfig.CHECK_MAX_DELAY_SECONDS
+        self.app = None
+        self._condition = threading.Condition()
+        self._worker = None
+        self._pending = 0
+        self._first_request_at = None
+        self._last_request_at = None
+        self._running = False
+        self._stats = {
+            'requests_total': 0,
+            'runs_total': 0,
+            'failures_total': 0,
+            'last_coalesced': 0,
+            'last_duration_seconds': None,
+            'max_duration_seconds': 0.0,
+            'total_duration_seconds': 0.0,
+            'last_run_at': None
+        }
+
+    def init_app(self, app):
+        """Bind the queue to the Flask app whose context the checks run in"""
+        self.app = app
+        app.extensions['notification_check_queue'] = self
+
+    def enqueue(self, reason=None):
+        """Request a notification check run; returns without waiting for it"""
+        if self.app is None:
+            self.app = current_app._get_current_object()
+
+        with self._condition:
+            now = time.monotonic()
+            self._pending += 1
+            self._stats['requests_total'] += 1
+            if self._first_request_at is None:
+                self._first_request_at = now
+            self._last_request_at = now
+            self._ensure_worker()
+            self._condition.notify()
+
+        logging.debug("Notification check requested (%s), queue depth %d", reason or "unspecified", self._pending)
+
+    def metrics(self):
+        """Snapshot of queue depth and check duration metrics"""
+        with self._condition:
+            stats = dict(self._stats)
+            runs = stats['runs_total']
+            stats['queue_depth'] = self._pending
+            stats['running'] = self._running
+            stats['worker_alive'] = self._worker is not None and self._worker.is_alive()
+            stats['avg_duration_seconds'] = stats['total_duration_seconds'] / runs if runs else None
+            stats['debounce_seconds'] = self.debounce_seconds
+            stats['max_delay_seconds'] = self.max_delay_seconds
+        return stats
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='notification-check-queue', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending == 0:
+                    self._condition.wait()
+
+                # Wait for a quiet period, but never longer than max_delay_seconds
+                while True:
+                    now = time.monotonic()
+                    deadline = min(self._last_request_at + self.debounce_seconds,
+                                   self._first_request_at + self.max_delay_seconds)
+                    if now >= deadline:
+                        break
+                    self._condition.wait(deadline - now)
+
+                coalesced = self._pending
+                self._pending = 0
+                self._first_request_at = None
+                self._last_request_at = None
+                self._running = True
+
+            self._execute(coalesced)
+
+    def _execute(self, coalesced):
+        start_time = time.perf_counter()
+        failed = False
+        try:
+            with self.app.app_context():
+                check_milk_production_and_notify()
+                check_milk_expiry_and_notify()
+        except Exception as e:
+            failed = True
+            logging.error("Queued notification check failed: %s", str(e))
+        finally:
+            duration = time.perf_counter() - start_time
+            with self._condition:
+                self._running = False
+                self._stats['runs_total'] += 1
+                if failed:
+                    self._stats['failures_total'] += 1
+                self._stats['last_coalesced'] = coalesced
+                self._stats['last_duration_seconds'] = duration
+                self._stats['max_duration_seconds'] = max(self._stats['max_duration_seconds'], duration)
+                self._stats['total_duration_seconds'] += duration
+                self._stats['last_run_at'] = datetime.utcnow().isoformat()
+            logging.info("Notification check ran for %d coalesced requests in %.2fs", coalesced, duration)
+
+# Global queue instance
+notification_check_queue = NotificationCheckQueue()
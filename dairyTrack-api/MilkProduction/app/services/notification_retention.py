@@ -0,0 +1,241 @@
+from app.models.notification import Notification
+from app.models.notification_archive import NotificationArchive
+from app.database.database import db
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+
+class RetentionConfig:
+    DAYS = 30  # Notifications older than this are removed
+    CHUNK_SIZE = 1000  # Rows deleted (and archived) per transaction
+    SLEEP_SECONDS = 0.5  # Pause between chunks so other writers get the table
+    ARCHIVE = 'none'  # 'none', 'table' (notification_archive) or 'file' (gzip JSON lines)
+    ARCHIVE_DIR = os.path.join('instance', 'notification_archive')
+    SCHEDULE_HOUR = 2  # Daily run at this hour (server time)
+
+notification_table = Notification.__table__
+archive_table = NotificationArchive.__table__
+
+class RetentionAlreadyRunning(Exception):
+    """Raised when a retention run is started while another one is in progress"""
+
+class NotificationRetention:
+    """
+    Removes old notifications in primary-key-ordered chunks, one short transaction
+    per chunk with a sleep in between, optionally copying each chunk to the archive
+    table or a gzip file first. Progress of the current or last run is kept in
+    status() and logged per chunk.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._run_lock = threading.Lock()
+        self._status_lock = threading.Lock()
+        self._status = {'state': 'idle'}
+
+    def init_app(self, app):
+        app.config.setdefault('NOTIFICATION_RETENTION_DAYS', RetentionConfig.DAYS)
+        app.config.setdefault('NOTIFICATION_RETENTION_CHUNK_SIZE', RetentionConfig.CHUNK_SIZE)
+        app.config.setdefault('NOTIFICATION_RETENTION_SLEEP_SECONDS', RetentionConfig.SLEEP_SECONDS)
+        app.config.setdefault('NOTIFICATION_RETENTION_ARCHIVE', RetentionConfig.ARCHIVE)
+        app.config.setdefault('NOTIFICATION_ARCHIVE_DIR', RetentionConfig.ARCHIVE_DIR)
+        app.config.setdefault('NOTIFICATION_RETENTION_SCHEDULE_HOUR', RetentionConfig.SCHEDULE_HOUR)
+        self.app = app
+        app.extensions['notification_retention'] = self
+
+    def _setting(self, name, default):
+        if self.app is None:
+            return default
+        return self.app.config.get(name, default)
+
+    def run(self, days=None, chunk_size=None, sleep_seconds=None, archive=None, max_chunks=None,
+            dry_run=False, progress=None):
+        """
+        Delete notifications created before now - `days`. `progress(status)` is called
+        after every chunk. Returns the final status dict. Must run in an app context.
+        """
+        days = days if days is not None else self._setting('NOTIFICATION_RETENTION_DAYS', RetentionConfig.DAYS)
+        chunk_size = chunk_size or self._setting('NOTIFICATION_RETENTION_CHUNK_SIZE', RetentionConfig.CHUNK_SIZE)
+        sleep_seconds = (sleep_seconds if sleep_seconds is not None
+                         else self._setting('NOTIFICATION_RETENTION_SLEEP_SECONDS', RetentionConfig.SLEEP_SECONDS))
+        archive = archive or self._setting('NOTIFICATION_RETENTION_ARCHIVE', RetentionConfig.ARCHIVE)
+        if archive not in ('none', 'table', 'file'):
+            raise ValueError(f"Unknown notification archive target '{archive}'")
+
+        if not self._run_lock.acquire(blocking=False):
+            raise RetentionAlreadyRunning("A notification retention run is already in progress")
+        try:
+            return self._run(datetime.now() - timedelta(days=days), chunk_size, sleep_seconds, archive,
+                             max_chunks, dry_run, progress)
+        finally:
+            self._run_lock.release()
+
+    def _run(self, cutoff, chunk_size, sleep_seconds, archive, max_chunks, dry_run, progress):
+        started = time.perf_counter()
+        status = {
+            'state': 'running',
+            'cutoff': cutoff.isoformat(),
+            'archive': archive,
+            'dry_run': dry_run,
+            'chunks': 0,
+            'deleted': 0,
+            'archived': 0,
+            'skipped': 0,
+            'last_id': 0,
+            'started_at': datetime.utcnow().isoformat(),
+            'elapsed_seconds': 0.0,
+            'rows_per_second': 0.0
+        }
+        self._set_status(status)
+
+        archive_file = None
+        if archive == 'file' and not dry_run:
+            archive_dir = self._setting('NOTIFICATION_ARCHIVE_DIR', RetentionConfig.ARCHIVE_DIR)
+            os.makedirs(archive_dir, exist_ok=True)
+            status['archive_path'] = os.path.join(
+                archive_dir, f"notifications-{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+            )
+            archive_file = gzip.open(status['archive_path'], 'at', encoding='utf-8')
+
+        try:
+            last_id = 0
+            while max_chunks is None or status['chunks'] < max_chunks:
+                rows = db.session.execute(
+                    select(notification_table)
+                    .where(notification_table.c.id > last_id, notification_table.c.created_at < cutoff)
+                    .order_by(notification_table.c.id)
+                    .limit(chunk_size)
+                ).mappings().all()
+                if not rows:
+                    db.session.rollback()
+                    break
+
+                ids = [row['id'] for row in rows]
+                last_id = ids[-1]
+                if dry_run:
+                    db.session.rollback()
+                    deleted = len(rows)
+                else:
+                    skipped = set()
+                    if archive == 'table':
+                        skipped = self._archive_to_table(rows)
+                    elif archive == 'file':
+                        self._archive_to_file(archive_file, rows)
+                    # Rows the archive could not take stay in notifications for a later run
+                    kept = [row_id for row_id in ids if row_id not in skipped]
+                    if kept:
+                        db.session.execute(delete(notification_table).where(notification_table.c.id.in_(kept)))
+                    db.session.commit()
+                    deleted = len(kept)
+                    status['skipped'] += len(skipped)
+                    if archive != 'none':
+                        status['archived'] += deleted
+
+                status['chunks'] += 1
+                status['deleted'] += deleted
+                status['last_id'] = last_id
+                elapsed = time.perf_counter() - started
+                status['elapsed_seconds'] = round(elapsed, 3)
+                status['rows_per_second'] = round(status['deleted'] / elapsed, 1) if elapsed else 0.0
+                self._set_status(status)
+                logging.info("Notification retention chunk %d: %d rows up to id %d (%d total, %.1f rows/s)",
+                             status['chunks'], deleted, last_id, status['deleted'], status['rows_per_second'])
+                if progress:
+                    progress(dict(status))
+
+                if len(rows) < chunk_size:
+                    break
+                if sleep_seconds:
+                    time.sleep(sleep_seconds)
+
+            status['state'] = 'finished'
+        except Exception as e:
+            db.session.rollback()
+            status['state'] = 'failed'
+            status['error'] = str(e)
+            logging.error(f"Notification retention failed after {status['deleted']} rows: {str(e)}")
+        finally:
+            if archive_file is not None:
+                archive_file.close()
+
+        elapsed = time.perf_counter() - started
+        status['elapsed_seconds'] = round(elapsed, 3)
+        status['rows_per_second'] = round(status['deleted'] / elapsed, 1) if elapsed else 0.0
+        status['finished_at'] = datetime.utcnow().isoformat()
+        self._set_status(status)
+        logging.info("Notification retention %s: %d rows in %d chunks, %.2fs",
+                     status['state'], status['deleted'], status['chunks'], elapsed)
+        return dict(status)
+
+    def _archive_to_table(self, rows):
+        """
+        Copy a chunk into notification_archive in the chunk's transaction. If the
+        chunk cannot be inserted as a whole, rows are inserted one at a time and
+        those the archive rejects are logged and skipped; returns their ids.
+        """
+        archived_at = datetime.utcnow()
+        # Rows already archived by an earlier, interrupted run are skipped
+        existing = set(db.session.execute(
+            select(archive_table.c.id).where(archive_table.c.id.in_([row['id'] for row in rows]))
+        ).scalars())
+        values = [{
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'cow_id': row['cow_id'],
+            'type': row['type'],
+            'is_read': row['is_read'],
+            'created_at': row['created_at'],
+            'message_z': zlib.compress(row['message'].encode('utf-8')),
+            'archived_at': archived_at
+        } for row in rows if row['id'] not in existing]
+        if not values:
+            return set()
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(archive_table), values)
+            return set()
+        except SQLAlchemyError:
+            pass
+
+        skipped = set()
+        for value in values:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(archive_table), [value])
+            except SQLAlchemyError as e:
+                skipped.add(value['id'])
+                logging.error(f"Notification {value['id']} not archived, kept for a later run: {str(e)}")
+        return skipped
+
+    def _archive_to_file(self, archive_file, rows):
+        """Append a chunk to the gzip JSON lines file before it is deleted"""
+        for row in rows:
+            archive_file.write(json.dumps({
+                'id': row['id'],
+                'user_id': row['user_id'],
+                'cow_id': row['cow_id'],
+                'type': row['type'],
+                'is_read': row['is_read'],
+                'message': row['message'],
+                'created_at': row['created_at'].isoformat() if row['created_at'] else None
+            }) + '\n')
+        archive_file.flush()
+
+    def _set_status(self, status):
+        with self._status_lock:
+            self._status = dict(status)
+
+    def status(self):
+        """Progress of the running job, or the result of the last one"""
+        with self._status_lock:
+            return dict(self._status)
+
+# Global retention job
+notification_retention = NotificationRetention()
@@ -0,0 +1,83 @@
+from app.models.notification import Notification
+from app.database.database import db
+from app.services.unread_counter import unread_counters
+from datetime import date, datetime, timedelta
+from sqlalchemy import extract, func, select
+import threading
+import time
+
+# How long computed statistics are served from memory
+STATS_TTL_SECONDS = 30
+# Days kept in the cache
+STATS_CACHE_DAYS = 31
+# Types always present in by_type, even with a zero count
+NOTIFICATION_TYPES = ['milk_expiry', 'milk_warning', 'low_production', 'high_production']
+
+def day_range(day):
+    """[start, end) datetimes of a calendar day, usable with an index on created_at"""
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+def compute_notification_stats(day):
+    """Counts for one day from a single query grouped by type, hour and read state"""
+    start, end = day_range(day)
+    hour = extract('hour', Notification.created_at)
+    rows = db.session.execute(
+        select(Notification.type, hour.label('hour'), Notification.is_read, func.count())
+        .where(Notification.created_at >= start, Notification.created_at < end)
+        .group_by(Notification.type, hour, Notification.is_read)
+    ).all()
+
+    by_type = {notification_type: 0 for notification_type in NOTIFICATION_TYPES}
+    by_hour = [0] * 24
+    total = unread = 0
+    for notification_type, row_hour, is_read, count in rows:
+        total += count
+        if not is_read:
+            unread += count
+        by_type[notification_type] = by_type.get(notification_type, 0) + count
+        by_hour[int(row_hour)] += count
+
+    return {
+        'date': day.isoformat(),
+        'total_today': total,
+        'unread_today': unread,
+        'by_type': by_type,
+        'by_hour': [{'hour': index, 'count': count} for index, count in enumerate(by_hour)],
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
+class NotificationStatsCache:
+    """
+    Per-day statistics kept for `ttl_seconds` so dashboards can poll cheaply, plus
+    the all-time unread_count of every user from the shared unread counter
+    """
+
+    def __init__(self, ttl_seconds=STATS_TTL_SECONDS, max_days=STATS_CACHE_DAYS):
+        self.ttl_seconds = ttl_seconds
+        self.max_days = max_days
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, day=None):
+        """Statistics for `day` (today by default); the dict includes cached: true/false"""
+        day = day or date.today()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(day)
+            if entry and entry[0] > now:
+                return {**entry[1], 'unread_count': unread_counters.total(), 'cached': True}
+
+        stats = compute_notification_stats(day)
+        with self._lock:
+            self._entries[day] = (now + self.ttl_seconds, stats)
+            if len(self._entries) > self.max_days:
+                del self._entries[min(self._entries, key=lambda key: self._entries[key][0])]
+        return {**stats, 'unread_count': unread_counters.total(), 'cached': False}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Global statistics cache
+notification_stats = NotificationStatsCache()
@@ -0,0 +1,218 @@
+from app.models.notification_rate_limit import NotificationRateLimit
+from app.database.database import db
+from collections import Counter, OrderedDict
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+import logging
+import threading
+import time
+
+# Keys tracked by the in-memory backend before the least recently used are evicted
+MEMORY_MAX_KEYS = 10000
+# How long the database backend remembers locally that a key is over its limit
+DENY_CACHE_SECONDS = 5
+# Database backend: delete windows older than the previous one every N hits
+CLEANUP_EVERY_HITS = 500
+# Users listed in the suppressed-by-user counters
+TOP_SUPPRESSED_USERS = 10
+
+rate_limit_table = NotificationRateLimit.__table__
+
+def sliding_window_estimate(previous_count, current_count, now, window_seconds):
+    """
+    Sliding window counter: the previous fixed window's count weighted by how much
+    of it still overlaps the sliding window, plus the current window's count.
+    """
+    elapsed = (now % window_seconds) / window_seconds
+    return previous_count * (1 - elapsed) + current_count
+
+class MemoryRateLimitBackend:
+    """Per-process sliding window counters in an LRU bounded to `max_keys` keys"""
+
+    name = 'memory'
+
+    def __init__(self, max_keys=MEMORY_MAX_KEYS):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window_seconds, now):
+        """Count one event for `key` if it is under `limit`; returns True when allowed"""
+        window_index = int(now // window_seconds)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = [window_index, 0, 0]
+            elif entry[0] != window_index:
+                # Roll over: the old current window becomes the previous one if adjacent
+                previous = entry[1] if entry[0] == window_index - 1 else 0
+                entry = [window_index, 0, previous]
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+            if sliding_window_estimate(entry[2], entry[1], now, window_seconds) >= limit:
+                return False
+            entry[1] += 1
+            return True
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+class DatabaseRateLimitBackend:
+    """
+    Sliding window counters in the notification_rate_limits table, so every worker
+    process shares the same quota. Runs inside the caller's transaction: a hit is
+    rolled back together with the notification it was counted for. Keys found over
+    their limit are remembered locally for DENY_CACHE_SECONDS to keep hot loops cheap.
+    """
+
+    name = 'database'
+
+    def __init__(self):
+        self._denied_until = {}
+        self._hits = 0
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window_seconds, now):
+        with self._lock:
+            denied_until = self._denied_until.get(key)
+            if denied_until and denied_until > now:
+                return False
+            self._denied_until.pop(key, None)
+            self._hits += 1
+            cleanup = self._hits % CLEANUP_EVERY_HITS == 0
+
+        window_index = int(now // window_seconds)
+        counts = dict(db.session.execute(
+            select(rate_limit_table.c.window_index, rate_limit_table.c.count).where(
+                rate_limit_table.c.key == key,
+                rate_limit_table.c.window_index.in_([window_index, window_index - 1])
+            )
+        ).all())
+
+        estimate = sliding_window_estimate(counts.get(window_index - 1, 0), counts.get(window_index, 0), now, window_seconds)
+        if estimate >= limit:
+            with self._lock:
+                self._denied_until[key] = now + DENY_CACHE_SECONDS
+            return False
+
+        self._increment(key, window_index)
+        if cleanup:
+            db.session.execute(delete(rate_limit_table).where(rate_limit_table.c.window_index < window_index - 1))
+        return True
+
+    def _increment(self, key, window_index):
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'mysql':
+            stmt = mysql_insert(rate_limit_table).values(key=key, window_index=window_index, count=1)
+            db.session.execute(stmt.on_duplicate_key_update(count=rate_limit_table.c.count + 1))
+        elif dialect == 'sqlite':
+            stmt = sqlite_insert(rate_limit_table).values(key=key, window_index=window_index, count=1)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=['key', 'window_index'],
+                set_={'count': rate_limit_table.c.count + 1}
+            ))
+        else:
+            result = db.session.execute(
+                update(rate_limit_table)
+                .where(rate_limit_table.c.key == key, rate_limit_table.c.window_index == window_index)
+                .values(count=rate_limit_table.c.count + 1)
+            )
+            if result.rowcount == 0:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(insert(rate_limit_table).values(key=key, window_index=window_index, count=1))
+                except IntegrityError:
+                    db.session.execute(
+                        update(rate_limit_table)
+                        .where(rate_limit_table.c.key == key, rate_limit_table.c.window_index == window_index)
+                        .values(count=rate_limit_table.c.count + 1)
+                    )
+
+    def size(self):
+        return db.session.execute(select(func.count()).select_from(rate_limit_table)).scalar()
+
+    def reset(self):
+        with self._lock:
+            self._denied_until.clear()
+
+RATE_LIMIT_BACKENDS = {
+    'memory': MemoryRateLimitBackend,
+    'database': DatabaseRateLimitBackend
+}
+
+class NotificationRateLimiter:
+    """
+    Per-user notification rate limiter with a pluggable backend ('memory' or
+    'database', chosen by NOTIFICATION_RATE_LIMIT_BACKEND). Keeps per-process
+    counters of allowed and suppressed notifications.
+    """
+
+    def __init__(self, limit=50, window_minutes=60, backend=None):
+        self.default_limit = limit
+        self.default_window_minutes = window_minutes
+        self.backend = backend or MemoryRateLimitBackend()
+        self._stats_lock = threading.Lock()
+        self._allowed = 0
+        self._suppressed = 0
+        self._suppressed_by_user = Counter()
+
+    def init_app(self, app):
+        """Select the backend configured for the app"""
+        name = app.config.setdefault('NOTIFICATION_RATE_LIMIT_BACKEND', 'memory')
+        if name not in RATE_LIMIT_BACKENDS:
+            raise ValueError(f"Unknown notification rate limit backend '{name}'")
+        if self.backend.name != name:
+            self.backend = RATE_LIMIT_BACKENDS[name]()
+        app.extensions['notification_rate_limiter'] = self
+        logging.info("Notification rate limiter using %s backend", name)
+
+    def is_rate_limited(self, user_id, limit=None, window_minutes=None):
+        """Check if user has exceeded notification rate limit; counts the notification if not"""
+        limit = limit or self.default_limit
+        window_seconds = (window_minutes or self.default_window_minutes) * 60
+
+        try:
+            allowed = self.backend.hit(str(user_id), limit, window_seconds, time.time())
+        except Exception as e:
+            # Never block notifications because the limiter itself failed
+            logging.error(f"Rate limiter backend error for user {user_id}: {str(e)}")
+            allowed = True
+
+        with self._stats_lock:
+            if allowed:
+                self._allowed += 1
+            else:
+                self._suppressed += 1
+                self._suppressed_by_user[user_id] += 1
+        return not allowed
+
+    def stats(self):
+        """Allowed/suppressed counters for this process"""
+        with self._stats_lock:
+            return {
+                'backend': self.backend.name,
+                'allowed_total': self._allowed,
+                'suppressed_total': self._suppressed,
+                'top_suppressed_users': [
+                    {'user_id': user_id, 'suppressed': count}
+                    for user_id, count in self._suppressed_by_user.most_common(TOP_SUPPRESSED_USERS)
+                ]
+            }
+
+    def reset(self):
+        """Clear counters and limits held by this process"""
+        self.backend.reset()
+        with self._stats_lock:
+            self._allowed = 0
+            self._suppressed = 0
+            self._suppressed_by_user.clear()
@@ -0,0 +1,99 @@
+from app.services.milk_rollup import refresh_period, rollup_periods
+from app.database.database import db
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import logging
+import threading
+import time
+
+# Writes to a period within this window share one refresh
+ROLLUP_REFRESH_DELAY_SECONDS = 2.0
+
+_PENDING_KEY = 'rollup_refresh_keys'
+
+class RollupRefresher:
+    """
+    Keeps the week and month rollups up to date off the write path. Summary
+    writes stage the (cow_id, date) keys they touch; once the transaction commits
+    the keys are queued here, and a worker thread recomputes the affected cow rows
+    and the herd row of each period in its own transaction, once per
+    `delay_seconds` however many writes touched it. The herd row is locked first,
+    so refreshes of one period from several processes apply one after another and
+    each sees every cow row committed before it. A key is queued only after its
+    write committed, so a refresh started later always includes it. Queued keys
+    are lost if the process dies; `flask summary rollups` rebuilds them.
+    """
+
+    def __init__(self, delay_seconds=ROLLUP_REFRESH_DELAY_SECONDS):
+        self.delay_seconds = delay_seconds
+        self.app = None
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._worker = None
+        self._stats = {'refreshes_total': 0, 'periods_total': 0, 'failures_total': 0}
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['rollup_refresher'] = self
+
+    def add(self, summary_keys):
+        """Queue the rollups of committed (cow_id, date) summaries for a refresh"""
+        if self.app is None:
+            self.app = current_app._get_current_object()
+        with self._condition:
+            for period, cow_ids in rollup_periods(summary_keys).items():
+                self._pending.setdefault(period, set()).update(cow_ids)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='rollup-refresher', daemon=True)
+                self._worker.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+            # Let writes arriving shortly after share the refresh
+            time.sleep(self.delay_seconds)
+            with self._condition:
+                pending, self._pending = self._pending, {}
+            self.refresh(pending)
+
+    def refresh(self, pending):
+        """Recompute {(period_type, period_start): cow_ids}, one transaction per period"""
+        with self.app.app_context():
+            for (period_type, start), cow_ids in sorted(pending.items()):
+                try:
+                    refresh_period(period_type, start, cow_ids, lock_herd=True)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    with self._condition:
+                        self._stats['failures_total'] += 1
+                    logging.error(f"Rollup refresh of {period_type} {start} failed: {str(e)}")
+        with self._condition:
+            self._stats['refreshes_total'] += 1
+            self._stats['periods_total'] += len(pending)
+
+    def metrics(self):
+        with self._condition:
+            return {**self._stats, 'pending_periods': len(self._pending)}
+
+# Global rollup refresher
+rollup_refresher = RollupRefresher()
+
+def stage_rollup_refresh(session, summary_keys):
+    """Queue the rollups of (cow_id, date) summaries for a refresh once `session` commits"""
+    session.info.setdefault(_PENDING_KEY, set()).update(summary_keys)
+
+@event.listens_for(Session, 'after_commit')
+def _queue_committed_keys(session):
+    keys = session.info.pop(_PENDING_KEY, None)
+    if keys:
+        rollup_refresher.add(keys)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rolled_back_keys(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,166 @@
+from app.models.notification import Notification
+from app.database.database import db
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+import threading
+import time
+
+# Cached counts are re-read from the database after this long, which bounds drift
+# from notifications written by other worker processes
+UNREAD_COUNT_TTL_SECONDS = 60
+# Users whose count is kept per process
+UNREAD_COUNT_MAX_USERS = 10000
+
+# Execution option for bulk notification writes that stage their own deltas;
+# any other bulk write to the table drops every cached count
+UNREAD_COUNTED = 'unread_counted'
+
+_PENDING_KEY = 'unread_count_deltas'
+_INVALIDATE_ALL = '*'
+# Cache key of the count over all users (user_id can be NULL, so not None)
+_ALL_USERS = '__all__'
+
+class UnreadCounterCache:
+    """
+    Per-user unread notification counts. A miss costs one COUNT over the
+    (user_id, is_read, created_at) index; after that, notification inserts and
+    is_read changes committed by this process adjust the cached value in place.
+    Deltas are staged on the session and applied only when it commits.
+    """
+
+    def __init__(self, ttl_seconds=UNREAD_COUNT_TTL_SECONDS, max_users=UNREAD_COUNT_MAX_USERS):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, user_id):
+        """Unread notifications for the user"""
+        return self._get(user_id, Notification.user_id == user_id)
+
+    def total(self):
+        """Unread notifications of all users, kept up to date by the same deltas"""
+        return self._get(_ALL_USERS)
+
+    def _get(self, key, *criteria):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._counts.get(key)
+            if entry and entry[1] > now:
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+
+        count = db.session.execute(
+            select(func.count()).select_from(Notification)
+            .where(*criteria, Notification.is_read == False)
+        ).scalar()
+        with self._lock:
+            if len(self._counts) >= self.max_users:
+                self._evict_expired(now)
+            if len(self._counts) < self.max_users:
+                self._counts[key] = [count, now + self.ttl_seconds]
+        return count
+
+    def stage(self, session, deltas):
+        """Queue {user_id: delta} to apply to cached counts when `session` commits"""
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        for user_id, delta in deltas.items():
+            if delta and user_id in pending and pending[user_id] is None:
+                continue  # already dropped from the cache on commit
+            if delta:
+                pending[user_id] = pending.get(user_id, 0) + delta
+
+    def stage_invalidate(self, session, user_ids=None):
+        """Queue cached counts (all of them when user_ids is None) to be dropped on commit"""
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        if user_ids is None:
+            pending[_INVALIDATE_ALL] = True
+        else:
+            for user_id in user_ids:
+                pending[user_id] = None
+
+    def apply(self, deltas):
+        with self._lock:
+            if deltas.get(_INVALIDATE_ALL):
+                self._counts.clear()
+                return
+            for user_id, delta in deltas.items():
+                entry = self._counts.get(user_id)
+                if entry is None:
+                    continue
+                if delta is None:
+                    del self._counts[user_id]
+                else:
+                    entry[0] = max(0, entry[0] + delta)
+
+            total = self._counts.get(_ALL_USERS)
+            if total is not None:
+                if any(delta is None for delta in deltas.values()):
+                    del self._counts[_ALL_USERS]
+                else:
+                    total[0] = max(0, total[0] + sum(deltas.values()))
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._counts.clear()
+            else:
+                self._counts.pop(user_id, None)
+                self._counts.pop(_ALL_USERS, None)
+
+    def stats(self):
+        with self._lock:
+            return {'cached_users': len(self._counts), 'hits': self._hits, 'misses': self._misses}
+
+    def _evict_expired(self, now):
+        for user_id in [key for key, entry in self._counts.items() if entry[1] <= now]:
+            del self._counts[user_id]
+
+# Global unread counter cache
+unread_counters = UnreadCounterCache()
+
+@event.listens_for(Session, 'after_flush')
+def _stage_flushed_notifications(session, flush_context):
+    deltas = {}
+    for instance in session.new:
+        if isinstance(instance, Notification) and not instance.is_read:
+            deltas[instance.user_id] = deltas.get(instance.user_id, 0) + 1
+    for instance in session.dirty:
+        if isinstance(instance, Notification):
+            history = inspect(instance).attrs.is_read.history
+            if history.has_changes():
+                was_read = bool(history.deleted[0]) if history.deleted else False
+                if was_read != bool(instance.is_read):
+                    deltas[instance.user_id] = deltas.get(instance.user_id, 0) + (-1 if instance.is_read else 1)
+    for instance in session.deleted:
+        if isinstance(instance, Notification) and not instance.is_read:
+            deltas[instance.user_id] = deltas.get(instance.user_id, 0) - 1
+    if deltas:
+        unread_counters.stage(session, deltas)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _stage_bulk_notification_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    target = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(target, 'name', None) != Notification.__tablename__:
+        return
+    if not orm_execute_state.execution_options.get(UNREAD_COUNTED):
+        unread_counters.stage_invalidate(orm_execute_state.session)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_committed_deltas(session):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas:
+        unread_counters.apply(deltas)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_rolled_back_deltas(session, previous_transaction):
+    deltas = session.info.pop(_PENDING_KEY, None)
+    if deltas and previous_transaction.nested:
+        # A savepoint rolled back: the outer transaction may still commit, so fall
+        # back to re-reading the affected users
+        unread_counters.stage_invalidate(session, None if deltas.get(_INVALIDATE_ALL) else list(deltas))
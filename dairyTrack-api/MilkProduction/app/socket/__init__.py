@@ -1,4 +1,6 @@
-from .manager import socketio, init_socketio, emit_notification
+from .manager import socketio, init_socketio, emit_notification, emit_role_notification, emit_unread_count
+from .fanout import fanout
+from .presence import presence
 from . import events  # Import to register event handlers
 
-__all__ = ['socketio', 'init_socketio', 'emit_notification']
\ No newline at end of file
+__all__ = ['socketio', 'init_socketio', 'emit_notification', 'emit_role_notification', 'emit_unread_count', 'fanout', 'presence']
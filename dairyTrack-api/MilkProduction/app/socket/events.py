@@ -1,10 +1,8 @@
 from flask_socketio import emit, join_room, leave_room
 from flask import request
-from .manager import socketio, user_clients
+from .manager import socketio, emit_notification
+from .presence import presence
 import logging
-from datetime import datetime  # Correct import
-
-connected_users = {}
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +16,8 @@ def handle_connect(auth):
 def handle_disconnect():
     """Handle user disconnect"""
     session_id = request.sid
-    if session_id in connected_users:
-        user_data = connected_users[session_id]
+    user_data = presence.remove(session_id)
+    if user_data:
         user_id = user_data['user_id']
         role_id = user_data.get('role_id')
         
@@ -28,9 +26,6 @@ def handle_disconnect():
         if role_id:
             leave_room(f"role_{role_id}")
         
-        # Remove from connected users
-        del connected_users[session_id]
-        
         logging.info(f"User {user_id} disconnected")
 
 @socketio.on('register')
@@ -42,12 +37,8 @@ def handle_register(data):
         session_id = request.sid
         
         if user_id:
-            # Store user connection
-            connected_users[session_id] = {
-                'user_id': user_id,
-                'role_id': role_id,
-                'connected_at': datetime.utcnow().isoformat()
-            }
+            # Store user connection (visible to every worker with the database backend)
+            presence.add(session_id, user_id, role_id)
             
             # Join user-specific room
             join_room(f"user_{user_id}")
@@ -70,17 +61,20 @@ def handle_register(data):
 def handle_unregister(data):
     """Unregister a client for a specific user"""
     user_id = str(data.get('user_id', ''))
+    user_data = presence.get(request.sid)
     
-    if user_id in user_clients and request.sid in user_clients[user_id]:
-        user_clients[user_id].remove(request.sid)
+    if user_data and user_data['user_id'] == user_id:
+        presence.remove(request.sid)
         leave_room(f"user_{user_id}")
+        if user_data.get('role_id'):
+            leave_room(f"role_{user_data['role_id']}")
         logger.info(f"Client {request.sid} left room user_{user_id}")
         print(f"Client {request.sid} left room user_{user_id}")
 
 def send_notification_to_user(user_id, notification_data):
     """Send notification to specific user"""
     try:
-        socketio.emit('new_notification', notification_data, room=f"user_{user_id}")
+        emit_notification(user_id, notification_data)
         logging.info(f"Notification sent to user {user_id}")
     except Exception as e:
         logging.error(f"Error sending notification to user {user_id}: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,100 @@
+from collections import deque
+import logging
+import threading
+
+# Messages kept by the local broker for inspection in tests
+LOCAL_BROKER_HISTORY = 1000
+
+class SocketIOBroker:
+    """
+    Publishes through Flask-SocketIO. When SOCKETIO_MESSAGE_QUEUE is configured
+    (redis://..., amqp://...), Flask-SocketIO relays every emit through that queue so
+    clients connected to any worker receive it.
+    """
+
+    name = 'socketio'
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+
+    def publish(self, event, data, room):
+        self.socketio.emit(event, data, room=room)
+
+class LocalBroker:
+    """
+    In-process broker: delivers each message to every subscriber synchronously and
+    keeps the last LOCAL_BROKER_HISTORY messages. Subscribing several callbacks
+    stands in for several workers in tests.
+    """
+
+    name = 'local'
+
+    def __init__(self, history=LOCAL_BROKER_HISTORY):
+        self.subscribers = []
+        self.history = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Register callback(event, data, room); returns it for use as a decorator"""
+        with self._lock:
+            self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self.subscribers:
+                self.subscribers.remove(callback)
+
+    def publish(self, event, data, room):
+        with self._lock:
+            self.history.append({'event': event, 'data': data, 'room': room})
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            try:
+                callback(event, data, room)
+            except Exception as e:
+                logging.error(f"Local broker subscriber failed for {event} to {room}: {str(e)}")
+
+    def messages(self, room=None, event=None):
+        """Published messages, optionally filtered by room and event"""
+        with self._lock:
+            return [message for message in self.history
+                    if (room is None or message['room'] == room) and (event is None or message['event'] == event)]
+
+    def clear(self):
+        with self._lock:
+            self.history.clear()
+
+class NotificationFanout:
+    """Room-addressed emits (user_<id>, role_<id>) through the configured broker"""
+
+    def __init__(self):
+        self.broker = None
+
+    def init_app(self, app, socketio):
+        """Pick the broker from SOCKET_FANOUT_BROKER ('socketio' or 'local')"""
+        name = app.config.setdefault('SOCKET_FANOUT_BROKER', 'socketio')
+        if name == 'local':
+            self.broker = LocalBroker()
+            # Deliver to clients connected to this process as well
+            self.broker.subscribe(lambda event, data, room: socketio.emit(event, data, room=room))
+        elif name == 'socketio':
+            self.broker = SocketIOBroker(socketio)
+        else:
+            raise ValueError(f"Unknown socket fan-out broker '{name}'")
+        app.extensions['socket_fanout'] = self
+        logging.info("Socket fan-out using %s broker", name)
+
+    def emit_to_room(self, room, event, data):
+        if self.broker is None:
+            raise RuntimeError("Socket fan-out is not initialised; call init_socketio(app) first")
+        self.broker.publish(event, data, room)
+
+    def emit_to_user(self, user_id, event, data):
+        self.emit_to_room(f"user_{user_id}", event, data)
+
+    def emit_to_role(self, role_id, event, data):
+        self.emit_to_room(f"role_{role_id}", event, data)
+
+# Global fan-out instance
+fanout = NotificationFanout()
@@ -1,17 +1,26 @@
 from flask_socketio import SocketIO
+from .fanout import fanout
+from .presence import presence
 
 # Create SocketIO instance
 socketio = SocketIO(cors_allowed_origins="*", async_mode='eventlet')
 
-# Connected clients tracking
-user_clients = {}
-
 def init_socketio(app):
     """Initialize SocketIO with the Flask app"""
-    socketio.init_app(app)
+    # With a message queue every worker can emit to clients connected to any other worker
+    socketio.init_app(app, message_queue=app.config.get('SOCKETIO_MESSAGE_QUEUE'))
+    fanout.init_app(app, socketio)
+    presence.init_app(app, socketio)
     return socketio
 
 def emit_notification(user_id, notification):
     """Emit notification to specific user"""
-    room = f"user_{user_id}"
-    socketio.emit('new_notification', notification, room=room)
\ No newline at end of file
+    fanout.emit_to_user(user_id, 'new_notification', notification)
+
+def emit_role_notification(role_id, notification):
+    """Emit notification to every user with the role"""
+    fanout.emit_to_role(role_id, 'new_notification', notification)
+
+def emit_unread_count(user_id, unread_count):
+    """Push the unread badge count to a user"""
+    fanout.emit_to_user(user_id, 'unread_count', {'unread_count': unread_count})
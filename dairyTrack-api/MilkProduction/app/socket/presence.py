@@ -0,0 +1,199 @@
+from app.models.socket_presence import SocketPresence
+from app.database.database import db
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, update
+import logging
+import os
+import socket
+import threading
+
+# How often each worker refreshes last_seen for its connections
+PRESENCE_HEARTBEAT_SECONDS = 60
+# Connections not refreshed for this long are treated as gone (crashed worker)
+PRESENCE_TTL_SECONDS = 3 * PRESENCE_HEARTBEAT_SECONDS
+
+presence_table = SocketPresence.__table__
+
+def current_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class MemoryPresenceRegistry:
+    """Connections registered with this process only"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def add(self, sid, user_id, role_id=None):
+        with self._lock:
+            self._connections[sid] = {
+                'user_id': str(user_id),
+                'role_id': str(role_id) if role_id else None,
+                'connected_at': datetime.utcnow().isoformat()
+            }
+
+    def remove(self, sid):
+        """Forget a connection; returns its record or None"""
+        with self._lock:
+            return self._connections.pop(sid, None)
+
+    def get(self, sid):
+        with self._lock:
+            return self._connections.get(sid)
+
+    def sessions_for(self, user_id):
+        with self._lock:
+            return [sid for sid, record in self._connections.items() if record['user_id'] == str(user_id)]
+
+    def is_online(self, user_id):
+        return bool(self.sessions_for(user_id))
+
+    def online_users(self):
+        """{user_id: number of connections}"""
+        with self._lock:
+            counts = {}
+            for record in self._connections.values():
+                counts[record['user_id']] = counts.get(record['user_id'], 0) + 1
+            return counts
+
+    def heartbeat(self):
+        return 0
+
+class DatabasePresenceRegistry:
+    """
+    Connections of every worker in the socket_presence table. Each worker refreshes
+    last_seen for its own rows every PRESENCE_HEARTBEAT_SECONDS; rows older than
+    PRESENCE_TTL_SECONDS (a worker that died) are ignored and pruned.
+    """
+
+    name = 'database'
+
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id or current_worker_id()
+
+    def add(self, sid, user_id, role_id=None):
+        now = datetime.utcnow()
+        db.session.execute(delete(presence_table).where(presence_table.c.sid == sid))
+        db.session.execute(presence_table.insert().values(
+            sid=sid,
+            user_id=str(user_id),
+            role_id=str(role_id) if role_id else None,
+            worker_id=self.worker_id,
+            connected_at=now,
+            last_seen=now
+        ))
+        db.session.commit()
+
+    def remove(self, sid):
+        record = self.get(sid)
+        if record:
+            db.session.execute(delete(presence_table).where(presence_table.c.sid == sid))
+            db.session.commit()
+        return record
+
+    def get(self, sid):
+        row = db.session.execute(
+            select(presence_table.c.user_id, presence_table.c.role_id, presence_table.c.connected_at)
+            .where(presence_table.c.sid == sid)
+        ).first()
+        if not row:
+            return None
+        return {'user_id': row.user_id, 'role_id': row.role_id, 'connected_at': row.connected_at.isoformat()}
+
+    def _live(self):
+        return presence_table.c.last_seen >= datetime.utcnow() - timedelta(seconds=PRESENCE_TTL_SECONDS)
+
+    def sessions_for(self, user_id):
+        return list(db.session.execute(
+            select(presence_table.c.sid).where(presence_table.c.user_id == str(user_id), self._live())
+        ).scalars())
+
+    def is_online(self, user_id):
+        return bool(self.sessions_for(user_id))
+
+    def online_users(self):
+        rows = db.session.execute(
+            select(presence_table.c.user_id, func.count())
+            .where(self._live())
+            .group_by(presence_table.c.user_id)
+        )
+        return {user_id: count for user_id, count in rows}
+
+    def heartbeat(self):
+        """Refresh this worker's rows and prune expired ones; returns rows refreshed"""
+        now = datetime.utcnow()
+        refreshed = db.session.execute(
+            update(presence_table).where(presence_table.c.worker_id == self.worker_id).values(last_seen=now)
+        ).rowcount
+        db.session.execute(
+            delete(presence_table).where(presence_table.c.last_seen < now - timedelta(seconds=PRESENCE_TTL_SECONDS))
+        )
+        db.session.commit()
+        return refreshed
+
+    def clear_worker(self):
+        """Drop rows left by a previous process with the same worker id"""
+        db.session.execute(delete(presence_table).where(presence_table.c.worker_id == self.worker_id))
+        db.session.commit()
+
+class PresenceRegistry:
+    """Facade over the configured presence backend (SOCKET_PRESENCE_BACKEND)"""
+
+    def __init__(self):
+        self.backend = MemoryPresenceRegistry()
+        self.app = None
+        self._heartbeat_started = False
+
+    def init_app(self, app, socketio):
+        name = app.config.setdefault('SOCKET_PRESENCE_BACKEND', 'memory')
+        if name == 'database':
+            self.backend = DatabasePresenceRegistry()
+        elif name != 'memory':
+            raise ValueError(f"Unknown socket presence backend '{name}'")
+        else:
+            self.backend = MemoryPresenceRegistry()
+        self.app = app
+        app.extensions['socket_presence'] = self
+
+        if name == 'database' and not self._heartbeat_started:
+            self._heartbeat_started = True
+            socketio.start_background_task(self._heartbeat_loop, socketio)
+
+    def _heartbeat_loop(self, socketio):
+        with self.app.app_context():
+            try:
+                self.backend.clear_worker()
+            except Exception as e:
+                logging.error(f"Could not clear stale presence rows: {str(e)}")
+                db.session.rollback()
+        while True:
+            socketio.sleep(PRESENCE_HEARTBEAT_SECONDS)
+            with self.app.app_context():
+                try:
+                    self.backend.heartbeat()
+                except Exception as e:
+                    logging.error(f"Presence heartbeat failed: {str(e)}")
+                    db.session.rollback()
+
+    def add(self, sid, user_id, role_id=None):
+        self.backend.add(sid, user_id, role_id)
+
+    def remove(self, sid):
+        return self.backend.remove(sid)
+
+    def get(self, sid):
+        return self.backend.get(sid)
+
+    def sessions_for(self, user_id):
+        return self.backend.sessions_for(user_id)
+
+    def is_online(self, user_id):
+        return self.backend.is_online(user_id)
+
+    def online_users(self):
+        return self.backend.online_users()
+
+# Global presence registry
+presence = PresenceRegistry()
@@ -0,0 +1,50 @@
+from datetime import datetime
+import base64
+import json
+
+def encode_cursor(*values):
+    """Encode keyset values (datetimes, ints, strings) into an opaque URL-safe cursor"""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, *types):
+    """
+    Decode a cursor produced by encode_cursor, converting each value with `types`
+    (datetime values are parsed from ISO format). Raises ValueError on a bad cursor.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+
+    decoded = []
+    try:
+        for value, value_type in zip(values, types):
+            if value_type is datetime:
+                decoded.append(datetime.fromisoformat(value))
+            else:
+                decoded.append(value_type(value))
+    except (TypeError, ValueError, KeyError):
+        # Well-formed JSON of the wrong shape, e.g. a number where a date belongs
+        raise ValueError("Invalid cursor")
+    return decoded
+
+def parse_limit(value, default, maximum):
+    """Parse a page size query parameter, clamped to [1, maximum]"""
+    if value is None:
+        return default
+    limit = int(value)
+    return max(1, min(limit, maximum))
+
+def parse_id(value, name):
+    """Parse an optional integer id filter; raises ValueError instead of ignoring a bad value"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
@@ -15,4 +15,25 @@ class Config:
 
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # 'memory' (per worker) or 'database' (shared by all workers)
+    NOTIFICATION_RATE_LIMIT_BACKEND = os.environ.get('NOTIFICATION_RATE_LIMIT_BACKEND') or 'memory'
+
+    # Socket.IO fan-out across workers, e.g. redis://127.0.0.1:6379/0 (needs the redis package)
+    SOCKETIO_MESSAGE_QUEUE = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+    # 'socketio' (emit through Flask-SocketIO) or 'local' (in-process broker for tests)
+    SOCKET_FANOUT_BROKER = os.environ.get('SOCKET_FANOUT_BROKER') or 'socketio'
+    # 'memory' (per worker) or 'database' (connected users visible to all workers)
+    SOCKET_PRESENCE_BACKEND = os.environ.get('SOCKET_PRESENCE_BACKEND') or 'memory'
+
+    # Notification retention: 'none', 'table' (notification_archive) or 'file' (gzip under NOTIFICATION_ARCHIVE_DIR)
+    NOTIFICATION_RETENTION_ARCHIVE = os.environ.get('NOTIFICATION_RETENTION_ARCHIVE') or 'none'
+    NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS') or 30)
+
+    # Fire milk expiry warnings per batch from in-memory timers instead of hourly polling
+    EXPIRY_SCHEDULER_ENABLED = (os.environ.get('EXPIRY_SCHEDULER_ENABLED') or 'true').lower() == 'true'
+
+    # Compete for the scheduler lease and run scheduled jobs in this process; set to
+    # false in web workers when a dedicated `flask scheduler run` process is used
+    SCHEDULER_ENABLED = (os.environ.get('SCHEDULER_ENABLED') or 'true').lower() == 'true'
     JSON_SORT_KEYS = False
\ No newline at end of file
@@ -0,0 +1,38 @@
+"""Allow herd-wide admin notifications
+
+Revision ID: 1b8e5f3c7d92
+Revises: 0a6d4e8b2c71
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1b8e5f3c7d92'
+down_revision = '0a6d4e8b2c71'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.alter_column('cow_id',
+               existing_type=sa.Integer(),
+               nullable=True)
+        batch_op.alter_column('type',
+               existing_type=sa.String(length=20),
+               type_=sa.String(length=50),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.alter_column('type',
+               existing_type=sa.String(length=50),
+               type_=sa.String(length=20),
+               existing_nullable=False)
+        batch_op.alter_column('cow_id',
+               existing_type=sa.Integer(),
+               nullable=False)
@@ -0,0 +1,26 @@
+"""Add milk_batches (status, expiry_date) index
+
+Revision ID: 2c4f7a9d1e36
+Revises: 1b8e5f3c7d92
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c4f7a9d1e36'
+down_revision = '1b8e5f3c7d92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('milk_batches', schema=None) as batch_op:
+        batch_op.create_index('ix_milk_batches_status_expiry', ['status', 'expiry_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('milk_batches', schema=None) as batch_op:
+        batch_op.drop_index('ix_milk_batches_status_expiry')
@@ -0,0 +1,56 @@
+"""Add unique (cow_id, date) to daily_milk_summary
+
+Revision ID: 3b7e5f1c9a20
+Revises: d66bd03740ab
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e5f1c9a20'
+down_revision = 'd66bd03740ab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    # Merge duplicate (cow_id, date) rows left by the old read-modify-write code
+    duplicates = conn.execute(sa.text(
+        "SELECT cow_id, date FROM daily_milk_summary GROUP BY cow_id, date HAVING COUNT(*) > 1"
+    )).fetchall()
+
+    for cow_id, summary_date in duplicates:
+        rows = conn.execute(sa.text(
+            "SELECT id, morning_volume, afternoon_volume, evening_volume FROM daily_milk_summary "
+            "WHERE cow_id = :cow_id AND date = :date ORDER BY id"
+        ), {'cow_id': cow_id, 'date': summary_date}).fetchall()
+
+        morning = sum(row.morning_volume or 0 for row in rows)
+        afternoon = sum(row.afternoon_volume or 0 for row in rows)
+        evening = sum(row.evening_volume or 0 for row in rows)
+
+        conn.execute(sa.text(
+            "UPDATE daily_milk_summary SET morning_volume = :morning, afternoon_volume = :afternoon, "
+            "evening_volume = :evening, total_volume = :total WHERE id = :id"
+        ), {
+            'morning': morning,
+            'afternoon': afternoon,
+            'evening': evening,
+            'total': morning + afternoon + evening,
+            'id': rows[0].id
+        })
+        for row in rows[1:]:
+            conn.execute(sa.text("DELETE FROM daily_milk_summary WHERE id = :id"), {'id': row.id})
+
+    with op.batch_alter_table('daily_milk_summary', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_daily_milk_summary_cow_date', ['cow_id', 'date'])
+
+
+def downgrade():
+    with op.batch_alter_table('daily_milk_summary', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_daily_milk_summary_cow_date', type_='unique')
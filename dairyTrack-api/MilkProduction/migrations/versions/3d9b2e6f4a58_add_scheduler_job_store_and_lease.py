@@ -0,0 +1,62 @@
+"""Add scheduler job store, leader lease and run history tables
+
+Revision ID: 3d9b2e6f4a58
+Revises: 2c4f7a9d1e36
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3d9b2e6f4a58'
+down_revision = '2c4f7a9d1e36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same layout as APScheduler's SQLAlchemyJobStore creates
+    op.create_table('scheduler_jobs',
+    sa.Column('id', sa.Unicode(length=191), nullable=False),
+    sa.Column('next_run_time', sa.Float(precision=25), nullable=True),
+    sa.Column('job_state', sa.LargeBinary(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('scheduler_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_scheduler_jobs_next_run_time', ['next_run_time'], unique=False)
+
+    op.create_table('scheduler_leases',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('holder', sa.String(length=100), nullable=True),
+    sa.Column('acquired_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    op.create_table('scheduler_job_runs',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('job_id', sa.String(length=100), nullable=False),
+    sa.Column('holder', sa.String(length=100), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('duration_seconds', sa.Float(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('scheduler_job_runs', schema=None) as batch_op:
+        batch_op.create_index('ix_scheduler_job_runs_job_started', ['job_id', 'started_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('scheduler_job_runs', schema=None) as batch_op:
+        batch_op.drop_index('ix_scheduler_job_runs_job_started')
+
+    op.drop_table('scheduler_job_runs')
+    op.drop_table('scheduler_leases')
+    with op.batch_alter_table('scheduler_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_scheduler_jobs_next_run_time')
+
+    op.drop_table('scheduler_jobs')
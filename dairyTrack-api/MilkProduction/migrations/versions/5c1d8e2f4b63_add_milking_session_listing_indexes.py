@@ -0,0 +1,30 @@
+"""Add milking session listing indexes
+
+Revision ID: 5c1d8e2f4b63
+Revises: 3b7e5f1c9a20
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d8e2f4b63'
+down_revision = '3b7e5f1c9a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('milking_sessions', schema=None) as batch_op:
+        batch_op.create_index('ix_milking_sessions_time_id', ['milking_time', 'id'], unique=False)
+        batch_op.create_index('ix_milking_sessions_cow_time', ['cow_id', 'milking_time'], unique=False)
+        batch_op.create_index('ix_milking_sessions_milker_time', ['milker_id', 'milking_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('milking_sessions', schema=None) as batch_op:
+        batch_op.drop_index('ix_milking_sessions_milker_time')
+        batch_op.drop_index('ix_milking_sessions_cow_time')
+        batch_op.drop_index('ix_milking_sessions_time_id')
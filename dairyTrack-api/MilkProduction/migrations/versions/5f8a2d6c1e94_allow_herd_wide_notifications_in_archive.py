@@ -0,0 +1,39 @@
+"""Allow herd-wide admin notifications in notification_archive
+
+Revision ID: 5f8a2d6c1e94
+Revises: 4e7c1a9b3f62
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f8a2d6c1e94'
+down_revision = '4e7c1a9b3f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Same column changes as 1b8e5f3c7d92 made to notifications
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.alter_column('cow_id',
+               existing_type=sa.Integer(),
+               nullable=True)
+        batch_op.alter_column('type',
+               existing_type=sa.String(length=20),
+               type_=sa.String(length=50),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_archive', schema=None) as batch_op:
+        batch_op.alter_column('type',
+               existing_type=sa.String(length=50),
+               type_=sa.String(length=20),
+               existing_nullable=False)
+        batch_op.alter_column('cow_id',
+               existing_type=sa.Integer(),
+               nullable=False)
@@ -0,0 +1,26 @@
+"""Add idempotency_request_hash to milking_sessions
+
+Revision ID: 6c2e8a4f9b17
+Revises: 5f8a2d6c1e94
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c2e8a4f9b17'
+down_revision = '5f8a2d6c1e94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('milking_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_request_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('milking_sessions', schema=None) as batch_op:
+        batch_op.drop_column('idempotency_request_hash')
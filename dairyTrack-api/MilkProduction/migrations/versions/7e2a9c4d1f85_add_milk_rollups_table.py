@@ -0,0 +1,40 @@
+"""Add milk_rollups table
+
+Revision ID: 7e2a9c4d1f85
+Revises: 5c1d8e2f4b63
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e2a9c4d1f85'
+down_revision = '5c1d8e2f4b63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backfill after upgrading with: flask summary rollups
+    op.create_table('milk_rollups',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('period_type', sa.String(length=10), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('cow_id', sa.Integer(), nullable=False),
+    sa.Column('morning_volume', sa.Float(), nullable=False),
+    sa.Column('afternoon_volume', sa.Float(), nullable=False),
+    sa.Column('evening_volume', sa.Float(), nullable=False),
+    sa.Column('total_volume', sa.Float(), nullable=False),
+    sa.Column('session_count', sa.Integer(), nullable=False),
+    sa.Column('day_count', sa.Integer(), nullable=False),
+    sa.Column('cow_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('period_type', 'period_start', 'cow_id', name='uq_milk_rollups_period_cow')
+    )
+
+
+def downgrade():
+    op.drop_table('milk_rollups')
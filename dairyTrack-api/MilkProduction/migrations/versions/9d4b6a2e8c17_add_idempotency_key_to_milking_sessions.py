@@ -0,0 +1,28 @@
+"""Add idempotency_key to milking_sessions
+
+Revision ID: 9d4b6a2e8c17
+Revises: 7e2a9c4d1f85
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4b6a2e8c17'
+down_revision = '7e2a9c4d1f85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('milking_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_milking_sessions_idempotency_key', ['idempotency_key'])
+
+
+def downgrade():
+    with op.batch_alter_table('milking_sessions', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_milking_sessions_idempotency_key', type_='unique')
+        batch_op.drop_column('idempotency_key')
@@ -0,0 +1,28 @@
+"""Add batch_number_sequences table
+
+Revision ID: b1f7c3e95a42
+Revises: 9d4b6a2e8c17
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b1f7c3e95a42'
+down_revision = '9d4b6a2e8c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('batch_number_sequences',
+    sa.Column('seq_date', sa.Date(), nullable=False),
+    sa.Column('last_value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('seq_date')
+    )
+
+
+def downgrade():
+    op.drop_table('batch_number_sequences')
@@ -0,0 +1,34 @@
+"""Add notification_rate_limits table
+
+Revision ID: c8e4f1a7b230
+Revises: b1f7c3e95a42
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e4f1a7b230'
+down_revision = 'b1f7c3e95a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_rate_limits',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('window_index', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('key', 'window_index')
+    )
+    with op.batch_alter_table('notification_rate_limits', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_rate_limits_window_index'), ['window_index'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notification_rate_limits', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_rate_limits_window_index'))
+
+    op.drop_table('notification_rate_limits')
@@ -0,0 +1,39 @@
+"""Add socket_presence table
+
+Revision ID: d5a2e7c9f314
+Revises: c8e4f1a7b230
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a2e7c9f314'
+down_revision = 'c8e4f1a7b230'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('socket_presence',
+    sa.Column('sid', sa.String(length=64), nullable=False),
+    sa.Column('user_id', sa.String(length=32), nullable=False),
+    sa.Column('role_id', sa.String(length=32), nullable=True),
+    sa.Column('worker_id', sa.String(length=100), nullable=False),
+    sa.Column('connected_at', sa.DateTime(), nullable=False),
+    sa.Column('last_seen', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('sid')
+    )
+    with op.batch_alter_table('socket_presence', schema=None) as batch_op:
+        batch_op.create_index('ix_socket_presence_user_seen', ['user_id', 'last_seen'], unique=False)
+        batch_op.create_index('ix_socket_presence_worker', ['worker_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('socket_presence', schema=None) as batch_op:
+        batch_op.drop_index('ix_socket_presence_worker')
+        batch_op.drop_index('ix_socket_presence_user_seen')
+
+    op.drop_table('socket_presence')
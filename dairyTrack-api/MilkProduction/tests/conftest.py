@@ -0,0 +1,43 @@
+import os
+import sys
+
+# Tests import the app package from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database.database import db
+from flask import Flask
+import app.models  # noqa: F401  (registers every table on db.metadata)
+import pytest
+
+@pytest.fixture
+def make_app(tmp_path):
+    """
+    Build bare Flask apps (no blueprints, sockets or background workers) on one
+    SQLite file, like several worker processes sharing a database. The tables
+    are created with the first app.
+    """
+    database_uri = f"sqlite:///{tmp_path / 'dairytrack.db'}"
+    apps = []
+
+    def build():
+        flask_app = Flask(__name__)
+        flask_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+        flask_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(flask_app)
+        if not apps:
+            with flask_app.app_context():
+                db.create_all()
+        apps.append(flask_app)
+        return flask_app
+
+    yield build
+    for flask_app in apps:
+        with flask_app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+@pytest.fixture
+def flask_app(make_app):
+    flask_app = make_app()
+    with flask_app.app_context():
+        yield flask_app
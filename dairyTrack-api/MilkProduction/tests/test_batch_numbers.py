@@ -0,0 +1,42 @@
+from app.services.batch_numbers import BatchNumberAllocator, format_batch_number, sequence_table
+from app.database.database import db
+from datetime import date, datetime
+from sqlalchemy import select
+
+PRODUCED = datetime(2026, 10, 18, 6, 30)
+
+def test_format_sorts_by_production_time():
+    assert format_batch_number(PRODUCED, 7) == 'BATCH-20261018063000-000007'
+    assert format_batch_number(PRODUCED, 999) < format_batch_number(datetime(2026, 10, 18, 6, 31), 1)
+
+def test_allocators_in_different_workers_never_repeat_numbers(make_app):
+    workers = [(make_app(), BatchNumberAllocator(block_size=3)) for _ in range(2)]
+    numbers = []
+    for index in range(10):
+        flask_app, allocator = workers[index % 2]
+        with flask_app.app_context():
+            numbers.append(allocator.next(PRODUCED))
+
+    assert len(set(numbers)) == 10
+    # Each worker serves its numbers in order from its own reserved blocks
+    assert numbers[:4] == [format_batch_number(PRODUCED, sequence) for sequence in (1, 4, 2, 5)]
+
+    flask_app, _ = workers[0]
+    with flask_app.app_context():
+        # Four blocks of three were reserved, two of them by each worker
+        assert db.session.execute(select(sequence_table.c.last_value)).scalar_one() == 12
+
+def test_allocate_keeps_order_and_sequences_per_day(flask_app):
+    allocator = BatchNumberAllocator(block_size=2)
+    next_day = datetime(2026, 10, 19, 5, 0)
+    numbers = allocator.allocate([PRODUCED, next_day, PRODUCED, PRODUCED])
+
+    assert numbers == [
+        format_batch_number(PRODUCED, 1),
+        format_batch_number(next_day, 1),
+        format_batch_number(PRODUCED, 2),
+        format_batch_number(PRODUCED, 3)
+    ]
+    sequences = dict(db.session.execute(select(sequence_table.c.seq_date, sequence_table.c.last_value)).all())
+    # A request larger than the block reserves exactly what it needs
+    assert sequences == {date(2026, 10, 18): 3, date(2026, 10, 19): 2}
@@ -0,0 +1,92 @@
+from app.models.cows import Cow
+from app.models.milking_sessions import MilkingSession
+from app.models.roles import Role
+from app.models.users import User
+from app.database.database import db
+from app.routes.milk_production import milk_production_bp
+from app.services.idempotency import (
+    IDEMPOTENCY_HEADER, REPLAYED_HEADER, IdempotencyCache, request_fingerprint, session_idempotency_cache
+)
+from datetime import date
+import pytest
+
+def test_fingerprint_ignores_key_and_field_order():
+    body = {'cow_id': 1, 'milker_id': 2, 'volume': 7.5, 'milking_time': '2026-10-18T06:00:00'}
+    reordered = dict(reversed(list(body.items())), idempotency_key='abc')
+    assert request_fingerprint(body) == request_fingerprint(reordered)
+    assert request_fingerprint(body) != request_fingerprint(dict(body, volume=8))
+
+def test_cache_expires_evicts_and_discards(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('app.services.idempotency.time.monotonic', lambda: now[0])
+    cache = IdempotencyCache(ttl_seconds=10, max_entries=2)
+    cache.set('a', {'id': 1}, 201, 'hash-a')
+    cache.set('b', {'id': 2}, 201)
+    assert cache.get('a') == ({'id': 1}, 201, 'hash-a')
+
+    cache.set('c', {'id': 3}, 201)
+    # 'b' was the least recently used
+    assert cache.get('b') is None
+    cache.discard('c')
+    assert cache.get('c') is None
+
+    now[0] += 11
+    assert cache.get('a') is None
+
+@pytest.fixture
+def client(flask_app):
+    flask_app.register_blueprint(milk_production_bp, url_prefix='/milk-production')
+    role = Role(name='admin')
+    db.session.add(role)
+    db.session.flush()
+    db.session.add_all([
+        User(name='Milker', username='milker', email='milker@example.com', password='x', role_id=role.id),
+        Cow(name='Bessie', birth=date(2020, 1, 1), breed='Holstein', gender='Female')
+    ])
+    db.session.commit()
+    session_idempotency_cache.clear()
+    yield flask_app.test_client()
+    session_idempotency_cache.clear()
+
+SESSION = {'cow_id': 1, 'milker_id': 1, 'volume': 7.5, 'milking_time': '2026-10-18T06:00:00'}
+
+def post_session(client, key, body=SESSION):
+    return client.post('/milk-production/milking-sessions', json=body, headers={IDEMPOTENCY_HEADER: key})
+
+@pytest.mark.parametrize('cached', [True, False])
+def test_retry_replays_and_different_body_is_rejected(client, cached):
+    created = post_session(client, 'session-1')
+    assert created.status_code == 201
+    if not cached:
+        # Another worker: only the database knows the key
+        session_idempotency_cache.clear()
+
+    replay = post_session(client, 'session-1')
+    assert replay.status_code == 201
+    assert replay.headers[REPLAYED_HEADER] == 'true'
+    assert replay.get_json()['id'] == created.get_json()['id']
+
+    conflict = post_session(client, 'session-1', dict(SESSION, volume=9))
+    assert conflict.status_code == 422
+
+def test_bulk_rejects_reused_key_with_different_fields(client):
+    assert post_session(client, 'session-1').status_code == 201
+    response = client.post('/milk-production/milking-sessions/bulk', json={'sessions': [
+        dict(SESSION, idempotency_key='session-1'),
+        dict(SESSION, idempotency_key='session-1', volume=9),
+        dict(SESSION, idempotency_key='session-2'),
+        dict(SESSION, idempotency_key='session-2', volume=9)
+    ]})
+    body = response.get_json()
+    assert response.status_code == 207
+    assert [result['success'] for result in body['results']] == [True, False, True, False]
+    assert (body['created'], body['replayed'], body['failed']) == (1, 1, 2)
+
+def test_deleted_session_frees_its_key(client):
+    created = post_session(client, 'session-1').get_json()
+    assert client.delete(f"/milk-production/milking-sessions/{created['id']}").status_code == 200
+
+    recreated = post_session(client, 'session-1')
+    assert recreated.status_code == 201
+    assert REPLAYED_HEADER not in recreated.headers
+    assert db.session.query(MilkingSession).filter_by(idempotency_key='session-1').count() == 1
@@ -0,0 +1,85 @@
+from app.database.database import db
+from app.services.job_scheduler import (
+    RUN_SUCCESS, JobScheduler, JobSchedulerConfig, lease_table, runs_table
+)
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+import pytest
+
+@pytest.fixture
+def workers(make_app):
+    """Two schedulers with their own app and worker id on the same database"""
+    schedulers = []
+    for worker_id in ('host-a:1', 'host-b:2'):
+        scheduler = JobScheduler()
+        scheduler.worker_id = worker_id
+        scheduler.init_app(make_app())
+        schedulers.append(scheduler)
+    yield schedulers
+    for scheduler in schedulers:
+        scheduler.stop()
+
+def acquire(scheduler):
+    with scheduler.app.app_context():
+        return scheduler._acquire_lease()
+
+def lease_holder(scheduler):
+    with scheduler.app.app_context():
+        return db.session.execute(
+            select(lease_table.c.holder).where(lease_table.c.name == JobSchedulerConfig.LEASE_NAME)
+        ).scalar_one()
+
+def test_only_one_worker_holds_the_lease(workers):
+    first, second = workers
+    assert acquire(first)
+    assert not acquire(second)
+    # Renewing keeps it with the holder
+    assert acquire(first)
+    assert not acquire(second)
+    assert lease_holder(second) == 'host-a:1'
+
+def test_lease_passes_over_after_stop(workers):
+    first, second = workers
+    with first.app.app_context():
+        first._set_leader(first._acquire_lease())
+    assert first.is_leader()
+    assert not acquire(second)
+
+    first.stop()
+    assert not first.is_leader()
+    assert acquire(second)
+    assert not acquire(first)
+    assert lease_holder(first) == 'host-b:2'
+
+def test_lease_passes_over_once_expired(workers):
+    first, second = workers
+    assert acquire(first)
+    # The holder stopped renewing without releasing (e.g. the process was killed)
+    with first.app.app_context():
+        db.session.execute(
+            update(lease_table).values(expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        db.session.commit()
+
+    assert acquire(second)
+    assert not acquire(first)
+
+def test_run_records_the_job_run_in_the_lease_holder_only(workers):
+    first, second = workers
+    calls = []
+    for scheduler in workers:
+        scheduler.register('count_job', lambda worker=scheduler.worker_id: calls.append(worker), 'interval', hours=1)
+
+    assert acquire(first)
+    second.run('count_job')
+    first.run('count_job')
+
+    assert calls == ['host-a:1']
+    with first.app.app_context():
+        runs = db.session.execute(select(runs_table)).mappings().all()
+    assert len(runs) == 1
+    assert runs[0]['job_id'] == 'count_job'
+    assert runs[0]['holder'] == 'host-a:1'
+    assert runs[0]['status'] == RUN_SUCCESS
+    assert runs[0]['finished_at'] is not None
+    assert second._stats['skipped_runs'] == 1
@@ -0,0 +1,31 @@
+from app.services.milk_summary import removal_statement, summary_table
+from datetime import date
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.dialects import mysql
+import re
+
+def test_removal_assigns_total_before_periods_on_mysql():
+    sql = str(removal_statement('mysql').compile(dialect=mysql.dialect()))
+    assignments = re.findall(r'(\w+_volume)=', sql.split(' SET ', 1)[1].split(' WHERE ', 1)[0])
+    # MySQL reads already-assigned values in later SET clauses: the total must come
+    # first so it is computed from the old period volumes
+    assert assignments == ['total_volume', 'morning_volume', 'afternoon_volume', 'evening_volume']
+    total_expression = sql.split('total_volume=', 1)[1].split(', morning_volume=', 1)[0]
+    assert total_expression.count('greatest(') == 3
+
+def test_removal_clamps_periods_and_recomputes_total():
+    engine = create_engine('sqlite://')
+    summary_table.create(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(summary_table).values(
+            cow_id=1, date=date(2026, 10, 18), morning_volume=10, afternoon_volume=3,
+            evening_volume=0, total_volume=13
+        ))
+        connection.execute(removal_statement('sqlite'), [{
+            'b_cow_id': 1, 'b_date': date(2026, 10, 18),
+            'b_morning_volume': -5, 'b_afternoon_volume': -4, 'b_evening_volume': 0
+        }])
+        row = connection.execute(select(summary_table)).one()
+
+    assert (row.morning_volume, row.afternoon_volume, row.evening_volume) == (5, 0, 0)
+    assert row.total_volume == 5
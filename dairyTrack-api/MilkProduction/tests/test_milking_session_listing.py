@@ -0,0 +1,19 @@
+from app.routes.milk_production import milk_production_bp
+import pytest
+
+@pytest.fixture
+def client(flask_app):
+    flask_app.register_blueprint(milk_production_bp, url_prefix='/milk-production')
+    return flask_app.test_client()
+
+@pytest.mark.parametrize('query', ['cow_id=abc', 'milker_id=1.5', 'cow_id=1&milker_id=x'])
+def test_bad_id_filters_are_rejected(client, query):
+    for path in ('/milk-production/milking-sessions', '/milk-production/export/excel'):
+        response = client.get(f'{path}?{query}')
+        assert response.status_code == 400
+        assert 'must be an integer' in response.get_json()['error']
+
+def test_empty_id_filters_are_ignored(client):
+    response = client.get('/milk-production/milking-sessions?cow_id=&milker_id=')
+    assert response.status_code == 200
+    assert response.get_json() == []
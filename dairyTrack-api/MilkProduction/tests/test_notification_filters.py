@@ -0,0 +1,35 @@
+from app.database.database import db
+from app.models.notification import Notification
+from app.routes.notification import notification_bp
+from datetime import datetime, timedelta, timezone
+import pytest
+
+# 09:00 in Asia/Jakarta, as a client would send it
+BEFORE = '2026-10-18T09:00:00+07:00'
+# The same instant in the naive server-local time created_at is stored in
+BEFORE_LOCAL = datetime(2026, 10, 18, 2, 0, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+@pytest.fixture
+def client(flask_app):
+    flask_app.register_blueprint(notification_bp, url_prefix='/notification')
+    for created_at in (BEFORE_LOCAL - timedelta(minutes=1), BEFORE_LOCAL + timedelta(minutes=1)):
+        db.session.add(Notification(user_id=1, message='Produksi susu rendah', type='low_production',
+                                    is_read=False, created_at=created_at))
+    db.session.commit()
+    return flask_app.test_client()
+
+def test_aware_before_is_compared_in_server_local_time(client):
+    response = client.put('/notification/read-all', json={'user_id': 1, 'before': BEFORE})
+    assert response.status_code == 200
+    assert response.get_json()['marked_count'] == 1
+    assert db.session.query(Notification).filter_by(is_read=False).one().created_at > BEFORE_LOCAL
+
+@pytest.mark.parametrize('body', [
+    {'user_id': 1, 'up_to_id': True},
+    {'user_id': 1, 'ids': [True]},
+    {'user_id': True, 'up_to_id': 2}
+])
+def test_booleans_are_not_accepted_as_ids(client, body):
+    assert client.put('/notification/read-all', json=body).status_code == 400
+    assert client.delete('/notification/bulk', json=body).status_code == 400
+    assert db.session.query(Notification).filter_by(is_read=False).count() == 2
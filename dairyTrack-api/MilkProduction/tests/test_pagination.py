@@ -0,0 +1,22 @@
+from app.utils.pagination import decode_cursor, encode_cursor, parse_id
+from datetime import datetime
+import pytest
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 10, 18, 7, 30)
+    assert decode_cursor(encode_cursor(created_at, 42), datetime, int) == [created_at, 42]
+
+@pytest.mark.parametrize('cursor', ['not-base64!', 'WzEsMl0', 'W251bGwsIG51bGxd', 'WyJ4IiwgWzFdXQ', 'e30'])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, datetime, int)
+
+def test_parse_id_treats_empty_as_absent():
+    assert parse_id(None, 'cow_id') is None
+    assert parse_id('', 'cow_id') is None
+    assert parse_id('12', 'cow_id') == 12
+
+@pytest.mark.parametrize('value', ['abc', '1.5', '1; DROP'])
+def test_parse_id_rejects_non_integers(value):
+    with pytest.raises(ValueError, match='cow_id must be an integer'):
+        parse_id(value, 'cow_id')
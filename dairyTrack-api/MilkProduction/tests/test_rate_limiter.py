@@ -0,0 +1,58 @@
+from app.database.database import db
+from app.services.rate_limiter import (
+    DatabaseRateLimitBackend, MemoryRateLimitBackend, NotificationRateLimiter, rate_limit_table,
+    sliding_window_estimate
+)
+from sqlalchemy import select
+
+WINDOW = 3600
+# Start of a fixed window, so the previous window no longer overlaps at all
+WINDOW_START = 1000 * WINDOW
+
+def test_sliding_window_weights_previous_window_by_overlap():
+    assert sliding_window_estimate(10, 2, WINDOW_START, WINDOW) == 12
+    assert sliding_window_estimate(10, 2, WINDOW_START + WINDOW / 4, WINDOW) == 9.5
+    assert sliding_window_estimate(10, 2, WINDOW_START + WINDOW / 2, WINDOW) == 7
+
+def test_memory_backend_allows_up_to_limit_and_carries_over():
+    backend = MemoryRateLimitBackend()
+    assert [backend.hit('1', 3, WINDOW, WINDOW_START + 10) for _ in range(4)] == [True, True, True, False]
+    # Other keys have their own quota
+    assert backend.hit('2', 3, WINDOW, WINDOW_START + 10)
+    # Halfway through the next window, 1.5 of the 3 previous hits still count
+    later = WINDOW_START + 1.5 * WINDOW
+    assert [backend.hit('1', 3, WINDOW, later) for _ in range(3)] == [True, True, False]
+
+def test_memory_backend_evicts_least_recently_used_keys():
+    backend = MemoryRateLimitBackend(max_keys=2)
+    for key in ('1', '2', '1', '3'):
+        backend.hit(key, 1, WINDOW, WINDOW_START)
+    assert backend.size() == 2
+    # '2' was evicted, so it starts a fresh quota; '3' is still tracked
+    assert backend.hit('2', 1, WINDOW, WINDOW_START)
+    assert not backend.hit('3', 1, WINDOW, WINDOW_START)
+
+def test_database_backend_shares_quota_between_workers(make_app):
+    workers = [(make_app(), NotificationRateLimiter(limit=3, backend=DatabaseRateLimitBackend())) for _ in range(2)]
+    results = []
+    for index in range(4):
+        flask_app, limiter = workers[index % 2]
+        with flask_app.app_context():
+            results.append(limiter.is_rate_limited(7))
+            db.session.commit()
+    assert results == [False, False, False, True]
+
+    flask_app, _ = workers[0]
+    with flask_app.app_context():
+        assert db.session.execute(select(rate_limit_table.c.count)).scalar_one() == 3
+
+def test_database_backend_hit_rolls_back_with_transaction(flask_app):
+    limiter = NotificationRateLimiter(limit=1, backend=DatabaseRateLimitBackend())
+    assert not limiter.is_rate_limited(7)
+    db.session.rollback()
+    # The notification was not created, so its hit does not count
+    assert not limiter.is_rate_limited(7)
+    db.session.commit()
+    assert limiter.is_rate_limited(7)
+    assert limiter.stats()['suppressed_total'] == 1
+    assert limiter.stats()['top_suppressed_users'] == [{'user_id': 7, 'suppressed': 1}]
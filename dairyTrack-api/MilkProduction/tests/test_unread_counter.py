@@ -0,0 +1,108 @@
+from app.database.database import db
+from app.models.notification import Notification
+from app.services.notification import upsert_production_notifications
+from app.services.unread_counter import UNREAD_COUNTED, unread_counters
+from datetime import date
+from sqlalchemy import update
+import pytest
+
+@pytest.fixture
+def counters(flask_app):
+    unread_counters.invalidate()
+    yield unread_counters
+    unread_counters.invalidate()
+
+def notify(user_id, is_read=False):
+    notification = Notification(user_id=user_id, message='Produksi susu rendah', type='low_production',
+                                is_read=is_read)
+    db.session.add(notification)
+    return notification
+
+def cached_hit(counters, user_id):
+    """The user's count, asserting it was served from the cache"""
+    hits = counters.stats()['hits']
+    count = counters.get(user_id)
+    assert counters.stats()['hits'] == hits + 1
+    return count
+
+def test_committed_writes_adjust_cached_count(counters):
+    first = notify(1)
+    notify(1, is_read=True)
+    db.session.commit()
+    assert counters.get(1) == 1
+    assert counters.total() == 1
+
+    notify(1)
+    notify(2)
+    db.session.commit()
+    assert cached_hit(counters, 1) == 2
+    assert counters.get(2) == 1
+
+    first.is_read = True
+    db.session.commit()
+    assert cached_hit(counters, 1) == 1
+    assert counters.total() == 2
+
+def test_rolled_back_writes_leave_count_unchanged(counters):
+    notify(1)
+    db.session.commit()
+    assert counters.get(1) == 1
+
+    notify(1)
+    db.session.flush()
+    db.session.rollback()
+    assert cached_hit(counters, 1) == 1
+
+def test_rolled_back_savepoint_drops_the_users_count(counters):
+    notify(1)
+    db.session.commit()
+    assert counters.get(1) == 1
+
+    with pytest.raises(RuntimeError):
+        with db.session.begin_nested():
+            notify(1)
+            db.session.flush()
+            raise RuntimeError('insert failed')
+    db.session.commit()
+    # Re-read from the database instead of trusting the staged delta
+    misses = counters.stats()['misses']
+    assert counters.get(1) == 1
+    assert counters.stats()['misses'] == misses + 1
+
+def test_bulk_writes_without_deltas_invalidate_the_cache(counters):
+    notify(1)
+    notify(2)
+    db.session.commit()
+    assert counters.get(1) == 1
+    assert counters.get(2) == 1
+
+    db.session.execute(update(Notification).where(Notification.user_id == 1).values(is_read=True))
+    db.session.commit()
+    assert counters.stats()['cached_users'] == 0
+    assert counters.get(1) == 0
+    assert counters.get(2) == 1
+
+    # Writes that stage their own deltas keep the cache
+    db.session.execute(
+        update(Notification).where(Notification.user_id == 2).values(is_read=True),
+        execution_options={UNREAD_COUNTED: True}
+    )
+    counters.stage(db.session, {2: -1})
+    db.session.commit()
+    assert cached_hit(counters, 2) == 0
+
+def test_production_upsert_invalidates_only_updated_users(counters):
+    notify(1).cow_id = 5
+    notify(3).cow_id = 5
+    db.session.commit()
+    assert counters.get(1) == 1
+    assert counters.get(3) == 1
+
+    # User 1's notification for cow 5 is updated; user 3 has one for the same
+    # cow and type but is not among the recipients
+    upsert_production_notifications([(1, 5, 'low_production', 'Produksi susu rendah')], date.today())
+    db.session.commit()
+    misses = counters.stats()['misses']
+    assert counters.get(1) == 1
+    assert counters.stats()['misses'] == misses + 1
+    assert cached_hit(counters, 3) == 1
@@ -401,7 +401,8 @@ ALTER TABLE `cows`
 --
 ALTER TABLE `daily_milk_summary`
   ADD PRIMARY KEY (`id`),
-  ADD KEY `cow_id` (`cow_id`);
+  ADD KEY `cow_id` (`cow_id`),
+  ADD UNIQUE KEY `uq_daily_milk_summary_cow_date` (`cow_id`,`date`);
 
 --
 -- Indexes for table `galleries`